@@ -0,0 +1,155 @@
+# AFSK (Bell 202, 1200 baud) AX.25 ID frames, shared by fox.py on the badge and the host tools
+# copy this next to fox.py on the badge
+
+'''
+    The fox can identify with one AX.25 UI frame instead of Morse, the way
+    APRS stations send packets: the frame is sent as 1200 baud Bell 202 AFSK,
+    1200 Hz for a mark and 2200 Hz for a space, which a TNC, direwolf or a
+    phone app on the hunters' side decodes. A 31 character callmessage
+    takes about half a second instead of some 30 seconds of 12 WPM Morse.
+
+    The frame (destination and source address, control 0x03 for UI, PID
+    0xF0 for no layer 3, the callmessage as the information field and the
+    CRC-16 frame check sequence) is sent bytes low bit first with a 0
+    stuffed after every five 1s, between 0x7E flags, and NRZI coded: a 0
+    changes the tone, a 1 keeps it.
+
+    A frame is compiled once into a tone schedule: an array of alternating
+    frequency and duration in microseconds, one entry per run of bits on
+    the same tone, so playing it is one PWM frequency change per run. The
+    run boundaries are the rounded bit boundaries of the whole frame, so
+    the 833.3 us bits don't drift. The tone switches without restarting
+    the PWM, so the phase is continuous across bits like a real modem's.
+'''
+
+from array import array
+
+BAUD = 1200
+MARK = 1200
+SPACE = 2200
+FLAG = 0x7E
+
+
+def address_callsign(message):
+    '''
+    the AX.25 source address for a callmessage: its first word, and of a
+    portable call like VE6MOG/W4 the longest part. at most 6 letters or digits
+    '''
+    word = message.split()[0] if message.split() else ""
+    parts = [part for part in word.upper().split('/') if part]
+    call = max(parts, key=len) if parts else ""
+    return "".join(c for c in call if c.isalpha() or c.isdigit())[:6]
+
+
+def encode_address(callsign, ssid=0, last=False, command=False):
+    ''' one 7 byte address field: the callsign shifted left one bit, space padded, then the SSID byte '''
+    call = callsign.upper()
+    if not 1 <= len(call) <= 6:
+        raise ValueError(f"AX.25 callsigns are 1 to 6 characters: '{callsign}'")
+    if not 0 <= ssid <= 15:
+        raise ValueError(f"AX.25 SSIDs are 0 to 15: {ssid}")
+    field = bytearray((ord(c) << 1) for c in call + " " * (6 - len(call)))
+    field.append((0x80 if command else 0) | 0x60 | (ssid << 1) | (1 if last else 0))
+    return bytes(field)
+
+
+def split_ssid(address):
+    ''' "VE6MOG-9" -> ("VE6MOG", 9) '''
+    call, _, ssid = address.partition('-')
+    return call, int(ssid) if ssid else 0
+
+
+def fcs(data):
+    ''' the AX.25 frame check sequence, CRC-16/X.25 (reflected 0x1021, initial and final 0xFFFF) '''
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0x8408
+            else:
+                crc >>= 1
+    return crc ^ 0xFFFF
+
+
+def ui_frame(source, info, destination="ID", path=()):
+    '''
+    an AX.25 UI frame without flags, FCS included. addresses may carry an SSID
+    ("VE6MOG-9"), path is a list of digipeaters such as ("WIDE1-1",)
+    '''
+    addresses = [destination, source] + list(path)
+    frame = bytearray()
+    for i, address in enumerate(addresses):
+        call, ssid = split_ssid(address)
+        frame.extend(encode_address(call, ssid, last=i == len(addresses) - 1, command=i == 0))
+    frame.append(0x03)		# UI frame
+    frame.append(0xF0)		# no layer 3 protocol
+    frame.extend(info.encode() if isinstance(info, str) else info)
+    check = fcs(frame)
+    frame.append(check & 0xFF)
+    frame.append(check >> 8)
+    return bytes(frame)
+
+
+def frame_bits(frame, preamble=16, postamble=3):
+    ''' the bits on the air before NRZI: preamble flags, the bit stuffed frame low bit first, postamble flags '''
+    bits = bytearray()
+    flag = [(FLAG >> i) & 1 for i in range(8)]
+    for _ in range(preamble):
+        bits.extend(flag)
+    ones = 0
+    for byte in frame:
+        for i in range(8):
+            bit = (byte >> i) & 1
+            bits.append(bit)
+            if bit:
+                ones += 1
+                if ones == 5:
+                    bits.append(0)
+                    ones = 0
+            else:
+                ones = 0
+    for _ in range(postamble):
+        bits.extend(flag)
+    return bits
+
+
+def compile_afsk(frame, preamble=16, postamble=3, baud=BAUD, mark=MARK, space=SPACE):
+    ''' the tone schedule for a frame from ui_frame, see above. the line idles on mark, so the first flag's 0 starts it on space '''
+    schedule = array('L')
+    frequency = mark
+    edge_us = 0			# end of the previous run
+    bits = frame_bits(frame, preamble, postamble)
+    for n, bit in enumerate(bits):
+        if bit:
+            continue
+        if n:
+            end_us = (n * 1000000 + baud // 2) // baud
+            schedule.append(frequency)
+            schedule.append(end_us - edge_us)
+            edge_us = end_us
+        frequency = space if frequency == mark else mark
+    end_us = (len(bits) * 1000000 + baud // 2) // baud
+    schedule.append(frequency)
+    schedule.append(end_us - edge_us)
+    return schedule
+
+
+def schedule_us(schedule):
+    ''' the total length of a tone schedule in microseconds '''
+    total = 0
+    for i in range(1, len(schedule), 2):
+        total += schedule[i]
+    return total
+
+
+_cache = {}
+
+def afsk_schedule(message, source=None, destination="ID", path=(), preamble=16, postamble=3):
+    ''' the tone schedule of a UI frame carrying message, from address_callsign(message) unless source is given; compiled once '''
+    key = (message, source, destination, tuple(path), preamble, postamble)
+    schedule = _cache.get(key)
+    if schedule is None:
+        frame = ui_frame(source or address_callsign(message), message, destination, path)
+        schedule = _cache[key] = compile_afsk(frame, preamble, postamble)
+    return schedule
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Decodes the fox's AFSK ID frames (1200 baud Bell 202 AX.25, see afsk.py)
+from audio on the host, to check what hunters' TNCs will make of them.
+
+    python3 render.py --afsk "VE6MOG/W4 DECOY" -o packet.wav
+    python3 afsk_decode.py packet.wav
+    python3 afsk_decode.py --selftest
+
+Each sample is correlated with the mark and space tones over a tapered,
+one bit long window and the stronger one is the tone. A bit clock locked
+to the tone changes samples it in the middle of every bit, NRZI decoding
+turns tone changes into 0s and the rest into 1s, and frames are cut at
+the 0x7E flags, unstuffed, and kept only when their frame check sequence
+matches.
+
+--selftest encodes frames with afsk.py, renders them the way the badge
+sends them (render.py), with noise, bit timing jitter and phase restarts
+added, and checks every frame decodes back unchanged.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from afsk import BAUD, FLAG, MARK, SPACE, address_callsign, afsk_schedule, fcs, schedule_us, ui_frame
+from morse import morse_schedule, schedule_us as morse_schedule_us
+from render import read_wav, render_events
+
+_FLAG_BITS = bytes((FLAG >> i) & 1 for i in range(8))
+
+
+def tones(samples, rate, baud=BAUD, mark=MARK, space=SPACE):
+    """ per sample, whether the mark tone is stronger than the space tone over the bit around it """
+    samples = np.asarray(samples, dtype=np.float64)
+    width = max(1, int(round(rate / baud)))
+    t = np.arange(len(samples)) / rate
+    window = np.hanning(width + 2)[1:-1]		# tapered, so the neighbouring bits count for less
+    energy = []
+    for frequency in (mark, space):
+        mixed = samples * np.exp(-2j * np.pi * frequency * t)
+        energy.append(np.abs(np.convolve(mixed, window, mode="same")))
+    return energy[0] > energy[1]
+
+
+def recover_bits(is_mark, rate, baud=BAUD, gain=0.3):
+    """
+    samples the tone in the middle of every bit, the bit clock pulled towards the tone
+    changes, and NRZI decodes it: a change of tone is a 0, the same tone a 1
+    """
+    per_bit = rate / baud
+    bits = bytearray()
+    phase = 0.0			# samples since the start of the current bit
+    sampled = False
+    previous = last = bool(is_mark[0]) if len(is_mark) else True
+    for m in is_mark.tolist():
+        if m != previous:
+            # a tone change marks a bit boundary, where the phase should be 0
+            error = phase if phase < per_bit / 2 else phase - per_bit
+            phase -= gain * error
+            previous = m
+        phase += 1
+        if not sampled and phase >= per_bit / 2:
+            bits.append(1 if m == last else 0)
+            last = m
+            sampled = True
+        if phase >= per_bit:
+            phase -= per_bit
+            sampled = False
+    return bytes(bits)
+
+
+def hdlc_frames(bits):
+    """ the unstuffed frames between flags, as bytes; fragments that aren't whole bytes are dropped """
+    frames = []
+    start = bits.find(_FLAG_BITS)
+    while start >= 0:
+        start += 8
+        end = bits.find(_FLAG_BITS, start)
+        if end < 0:
+            break
+        data = bytearray()
+        ones = 0
+        for bit in bits[start:end]:
+            if ones == 5:
+                ones = 0
+                if not bit:
+                    continue		# stuffed 0
+            data.append(bit)
+            ones = ones + 1 if bit else 0
+        if data and len(data) % 8 == 0:
+            frames.append(bytes(sum(data[i + j] << j for j in range(8)) for i in range(0, len(data), 8)))
+        start = end
+    return frames
+
+
+def check_frame(frame):
+    """ the frame without its FCS when the FCS is right, else None """
+    if len(frame) < 18:
+        return None
+    body, check = frame[:-2], frame[-2] | (frame[-1] << 8)
+    return body if fcs(body) == check else None
+
+
+def parse_frame(body):
+    """ (destination, source, path, control, pid, info) of a frame from check_frame """
+    addresses = []
+    pos = 0
+    while pos + 7 <= len(body):
+        call = "".join(chr(b >> 1) for b in body[pos:pos + 6]).strip()
+        ssid = (body[pos + 6] >> 1) & 0x0F
+        addresses.append(f"{call}-{ssid}" if ssid else call)
+        pos += 7
+        if body[pos - 1] & 1:
+            break
+    if len(addresses) < 2 or pos + 2 > len(body):
+        raise ValueError("not an AX.25 frame")
+    return addresses[0], addresses[1], addresses[2:], body[pos], body[pos + 1], body[pos + 2:]
+
+
+def decode(samples, rate):
+    """ every frame in the audio with a good FCS, without the FCS """
+    bits = recover_bits(tones(samples, rate), rate)
+    return [body for body in map(check_frame, hdlc_frames(bits)) if body is not None]
+
+
+def schedule_audio(schedule, rate, jitter_us=0, restart=False, noise=0.0, seed=0):
+    """ a tone schedule rendered like the badge plays it, optionally with late edges, phase restarts and noise """
+    rng = np.random.default_rng(seed)
+    frequencies = np.asarray(schedule[0::2], dtype=np.float64)
+    durations = np.asarray(schedule[1::2], dtype=np.float64)
+    if jitter_us:
+        # each edge is up to jitter_us late, on the absolute timeline so lateness doesn't add up
+        edges = np.cumsum(durations) + rng.uniform(0, jitter_us, len(durations))
+        edges[-1] = np.sum(durations)
+        durations = np.diff(np.concatenate(([0.0], edges)))
+    # some silence either side, like the PTT lead in and the gap before the song
+    frequencies = np.concatenate(([0], frequencies, [0]))
+    durations = np.concatenate(([50000], durations, [50000])) / 1e6
+    samples = render_events(frequencies, durations, rate=rate, continuous=not restart)
+    if noise:
+        samples = samples + rng.normal(0, noise, len(samples)).astype(np.float32)
+    return samples
+
+
+def selftest():
+    messages = [
+        ("VE6MOG/W4 DECOY DECOY VE6MOG/W4", {}),
+        ("N0CALL", {"destination": "APRS", "path": ("WIDE1-1",)}),
+        ("~~~~ stuffed ~~~~", {"source": "K1ABC-7"}),		# 0x7E in the data, runs of six 1s
+    ]
+    conditions = [
+        ("22050 Hz", {"rate": 22050}),
+        ("8000 Hz", {"rate": 8000}),
+        ("44100 Hz, 30 us jitter", {"rate": 44100, "jitter_us": 30}),
+        ("22050 Hz, phase restarts", {"rate": 22050, "restart": True}),
+        ("22050 Hz, noise at -6 dB", {"rate": 22050, "noise": 0.25}),
+    ]
+    failed = 0
+    for message, frame in messages:
+        source = frame.get("source") or address_callsign(message)
+        expected = ui_frame(source, message, frame.get("destination", "ID"), frame.get("path", ()))[:-2]
+        schedule = afsk_schedule(message, **frame)
+        for name, condition in conditions:
+            rate = condition["rate"]
+            options = {k: v for k, v in condition.items() if k != "rate"}
+            frames = decode(schedule_audio(schedule, rate, **options), rate)
+            ok = frames == [expected]
+            failed += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {message!r} {name}: {len(frames)} frames decoded")
+        destination, source, path, control, pid, info = parse_frame(expected)
+        print(f"     {source}>{destination}{''.join(',' + p for p in path)}: {info!r}")
+
+    message = messages[0][0]
+    afsk_ms = schedule_us(afsk_schedule(message)) / 1000
+    morse_ms = morse_schedule_us(morse_schedule(message, 12)) / 1000
+    print(f"ID airtime for {message!r}: AFSK {afsk_ms:.0f} ms, 12 WPM Morse {morse_ms:.0f} ms")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("wavs", nargs="*", metavar="WAV", help="16 bit WAV files to decode")
+    parser.add_argument("--selftest", action="store_true", help="encode, render and decode frames, exit 1 on a mismatch")
+    args = parser.parse_args()
+
+    if args.selftest:
+        failed = selftest()
+        print("all frames decoded" if not failed else f"{failed} FAILED")
+        sys.exit(1 if failed else 0)
+    if not args.wavs:
+        parser.print_usage()
+        sys.exit(1)
+
+    found = 0
+    for path in args.wavs:
+        samples, rate = read_wav(path)
+        for body in decode(samples, rate):
+            destination, source, path_, control, pid, info = parse_frame(body)
+            print(f"{path}: {source}>{destination}{''.join(',' + p for p in path_)}: "
+                  f"{info.decode('ascii', 'replace')}")
+            found += 1
+    sys.exit(0 if found else 1)
+
+
+if __name__ == "__main__":
+    main()
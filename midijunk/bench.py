@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Benchmark and regression suite for the conversion and playback paths.
+
+    python3 bench.py                   # run, compare with bench_baseline.json, exit 1 on a timing regression
+    python3 bench.py --save            # run and record the results as the new baseline
+    python3 bench.py --sizes 100,1000 --minutes 10 --threshold 0.3 -o results.json
+
+Conversion: generate_midi_name_dict, rttl_to_midi_tuples and
+make_circuitpython_snippet (tuple lists and packed bytes) over generated
+corpora of each --sizes (bench_rtttl.make_corpus), best of --repeat runs,
+in calls or tunes per second.
+
+Playback: fox.py runs in the emulator (emulate.py) for --minutes of
+virtual time, through every song of the rotation, and the note and Morse ID
+onset errors, note length errors and airtime overrun against what the
+firmware meant to play are recorded, with the peripheral calls per note
+and how fast the emulation itself runs. A second run with low_power_idle
+records the longest time from the modem's wake up to key up and how many
+cycles fell outside fox.py's bound on it. The virtual clock makes the timing
+figures exact and repeatable: any change in them comes from the firmware.
+
+A timing error or call count rising more than --timing-threshold (5%)
+above its baseline (plus a small slack, so a baseline of zero isn't a hair
+trigger) is a regression and fails the run. A throughput falling more than
+--threshold (25%) below its baseline is only reported: throughput depends on
+the machine and how busy it is, so the committed baseline can't gate it.
+--strict fails on those too, for a machine with a baseline of its own.
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+from bench_rtttl import make_corpus
+from emulate import analyze, run_firmware
+from rtttl import generate_midi_name_dict, make_circuitpython_snippet, rttl_to_midi_tuples
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, "bench_baseline.json")
+
+# units, and the slack a lower-is-better figure gets on top of --threshold
+TIMING_SLACK = {"ms": 0.01, "calls/note": 0.01, "cycles": 0}
+
+
+def best_rates(cases, repeat, min_time=0.25):
+    """
+    {name: count per second} for (name, run, count) cases, from the fastest of repeat timings of
+    run(). the cases take turns, so a stretch of the machine being busy doesn't land on every
+    timing of one case, and each timing calls run() often enough to take min_time. the garbage
+    collector is held off while timing
+    """
+    rounds = {}
+    for name, run, count in cases:
+        start = time.perf_counter()
+        run()
+        rounds[name] = max(1, math.ceil(min_time / max(time.perf_counter() - start, 1e-9)))
+    best = {}
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            for name, run, count in cases:
+                start = time.perf_counter()
+                for _ in range(rounds[name]):
+                    run()
+                elapsed = (time.perf_counter() - start) / rounds[name]
+                best[name] = min(best.get(name, elapsed), elapsed)
+    finally:
+        gc.enable()
+    return {name: count / best[name] for name, run, count in cases}
+
+
+def conversion_metrics(sizes, repeat, seed):
+    cases = [("name_dict", generate_midi_name_dict, 1)]
+    for size in sizes:
+        corpus = make_corpus(size, seed=seed)
+        cases += [
+            (f"parse_{size}", lambda corpus=corpus: [rttl_to_midi_tuples(t) for t in corpus], size),
+            (f"snippet_{size}", lambda corpus=corpus: [make_circuitpython_snippet(t) for t in corpus], size),
+            (f"snippet_packed_{size}",
+             lambda corpus=corpus: [make_circuitpython_snippet(t, packed=True) for t in corpus], size),
+        ]
+    rates = best_rates(cases, repeat)
+    return {name: (rate, "calls/s" if name == "name_dict" else "tunes/s", "higher") for name, rate in rates.items()}
+
+
+def playback_metrics(minutes, repeat, firmware=os.path.join(HERE, "fox.py")):
+    """ timing figures of one emulated run, the emulation speed from the fastest of repeat runs """
+    seconds = minutes * 60
+    walls = []
+    for _ in range(repeat):
+        namespace, trace, output, wall = run_firmware(firmware, int(seconds * 1e9))
+        walls.append(wall)
+    cycles, summary = analyze(namespace, trace)
+    played = {c["song"] for c in cycles if "onset_error_ms" in c}
+    missing = [song for song in namespace.get("songs", []) if song not in played]
+    if missing:
+        print(f"playback: {', '.join(missing)} not played in {minutes:g} minutes, use more --minutes",
+              file=sys.stderr)
+    return {
+        "playback_onset_error_max": (summary.get("max_onset_error_ms", 0.0), "ms", "lower"),
+        "playback_onset_error_mean": (summary.get("mean_onset_error_ms", 0.0), "ms", "lower"),
+        "playback_length_error_max": (summary.get("max_length_error_ms", 0.0), "ms", "lower"),
+        "playback_airtime_overrun": (max(0.0, summary.get("max_airtime_overrun_ms", 0.0)), "ms", "lower"),
+        "morse_id_onset_error_max": (summary.get("max_id_onset_error_ms", 0.0), "ms", "lower"),
+        "playback_calls_per_note": (summary.get("peripheral_calls_per_tone", 0.0), "calls/note", "lower"),
+        "emulation_speed": (seconds / min(walls), "x real time", "higher"),
+    }
+
+
+def low_power_metrics(minutes, firmware=os.path.join(HERE, "fox.py")):
+    """ wake up timing of one emulated run with low_power_idle """
+    namespace, trace, output, wall = run_firmware(firmware, int(minutes * 60e9), ["low_power_idle=True"])
+    cycles, summary = analyze(namespace, trace)
+    if "wake_to_key_up_ms" not in summary:
+        print(f"low power: no light sleep in {minutes:g} minutes, use more --minutes", file=sys.stderr)
+    return {
+        "low_power_wake_to_key_up_max": (summary.get("wake_to_key_up_ms", {}).get("max", 0.0), "ms", "lower"),
+        "low_power_wake_bound_violations": (summary.get("wake_bound_violations", 0), "cycles", "lower"),
+        "low_power_onset_error_max": (summary.get("max_onset_error_ms", 0.0), "ms", "lower"),
+    }
+
+
+def regressed(value, baseline, unit, better, threshold, timing_threshold):
+    if better == "higher":
+        return value < baseline * (1 - threshold)
+    return value > baseline * (1 + timing_threshold) + TIMING_SLACK.get(unit, 0.0)
+
+
+def compare(metrics, baseline, threshold, timing_threshold):
+    """
+    prints every metric against its baseline; returns the names of the regressed timing
+    figures and of the regressed throughputs
+    """
+    failures = []
+    slower = []
+    print(f"{'metric':<28} {'value':>12} {'baseline':>12} {'change':>8}  unit")
+    for name, (value, unit, better) in metrics.items():
+        old = baseline.get(name, {}).get("value")
+        if old is None:
+            print(f"{name:<28} {value:>12.4g} {'-':>12} {'':>8}  {unit}")
+            continue
+        change = f"{(value - old) / old:+.1%}" if old else ""
+        status = ""
+        if regressed(value, old, unit, better, threshold, timing_threshold):
+            if better == "higher":
+                slower.append(name)
+                status = "  SLOWER"
+            else:
+                failures.append(name)
+                status = "  REGRESSED"
+        print(f"{name:<28} {value:>12.4g} {old:>12.4g} {change:>8}  {unit}{status}")
+    return failures, slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma separated corpus sizes in tunes")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs, the best one counts")
+    parser.add_argument("--minutes", type=float, default=20, help="virtual minutes of emulated playback")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed throughput regression, 0.25 for 25%%")
+    parser.add_argument("--timing-threshold", type=float, default=0.05,
+                        help="allowed rise in timing errors and calls per note, 0.05 for 5%%")
+    parser.add_argument("--strict", action="store_true", help="also fail on a throughput below --threshold")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="write the results as the baseline instead of comparing")
+    parser.add_argument("-o", "--output", help="also write the results as JSON here")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    metrics = conversion_metrics(sizes, args.repeat, args.seed)
+    metrics.update(playback_metrics(args.minutes, args.repeat))
+    metrics.update(low_power_metrics(args.minutes))
+    results = {
+        "machine": f"{platform.machine()} {platform.python_implementation()} {platform.python_version()}",
+        "settings": {"sizes": sizes, "repeat": args.repeat, "minutes": args.minutes, "seed": args.seed},
+        "metrics": {name: {"value": value, "unit": unit, "better": better}
+                    for name, (value, unit, better) in metrics.items()},
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=1)
+            f.write("\n")
+        for name, (value, unit, better) in metrics.items():
+            print(f"{name:<28} {value:>12.4g}  {unit}")
+        print(f"baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        raise SystemExit(f"no baseline at {args.baseline}, record one with --save")
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != results["settings"]:
+        print(f"note: baseline recorded with {baseline.get('settings')}", file=sys.stderr)
+    failures, slower = compare(metrics, baseline["metrics"], args.threshold, args.timing_threshold)
+    if slower:
+        print(f"warning: {len(slower)} below the baseline throughput: {', '.join(slower)} "
+              f"(baseline: {baseline.get('machine', 'unknown machine')})", file=sys.stderr)
+        if args.strict:
+            failures += slower
+    if failures:
+        print(f"{len(failures)} regressed: {', '.join(failures)}")
+        sys.exit(1)
+    print(f"no timing regressions past {args.timing_threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Benchmark for rtttl.rttl_to_midi_tuples against the original split/re.match
+implementation, on a large generated ringtone corpus.
+
+    python3 bench_rtttl.py                 # 20000 tunes
+    python3 bench_rtttl.py --tunes 50000 --repeat 5
+
+Every tune (and a set of malformed ones) is also checked to give identical
+output, or an identical error message, from both implementations.
+
+The encoder, midi_tuples_to_rttl, is checked too: every corpus tune and a set
+of random melodies (any note, any length up to 255) must parse back into the
+same events, no other d=/o= choice may give a shorter string, and its speed
+and the size of its output against the corpus are reported.
+"""
+import argparse
+import random
+import re
+import time
+
+from rtttl import (DURATION_MAP, generate_midi_name_dict, midi_tuples_to_rttl, rttl_to_midi_tuples,
+                   split_melody)
+
+
+def legacy_rttl_to_midi_tuples(rttl_string, name_to_midi=None):
+    """ the parser as it was before the single-pass scanner, kept as the reference """
+    if name_to_midi is None:
+        name_to_midi = generate_midi_name_dict()
+
+    parts = rttl_string.strip().split(':', 2)
+    if len(parts) < 3:
+        raise ValueError("RTTTL string missing required ':' parts")
+
+    tune_name = parts[0].strip()
+    defs_part = parts[1].strip()
+    notes_str = parts[2].strip()
+
+    default_duration = 4
+    default_octave = 5
+    tempo = 120
+
+    match_d = re.search(r'd\s*=\s*(\d+)', defs_part)
+    match_o = re.search(r'o\s*=\s*(\d+)', defs_part)
+    match_b = re.search(r'b\s*=\s*(\d+)', defs_part)
+
+    if match_d:
+        default_duration = int(match_d.group(1))
+    if match_o:
+        default_octave = int(match_o.group(1))
+    if match_b:
+        tempo = int(match_b.group(1))
+
+    duration_map = {1: 32, 2: 16, 4: 8, 8: 4, 16: 2, 32: 1}
+    default_dur_32 = duration_map.get(default_duration, 8)
+
+    tokens = [x.strip().lower() for x in notes_str.split(',')]
+    result = []
+
+    for token in tokens:
+        m = re.match(r'^(\d*)'
+                     r'([a-gp])'
+                     r'(#|b)?'
+                     r'(\d*)'
+                     r'(\.)?',
+                     token, re.IGNORECASE)
+
+        if not m:
+            raise ValueError(f"Unrecognized token: {token}")
+
+        dur_str, note_char, accidental, octave_str, dot_str = m.groups()
+
+        if dur_str:
+            base_dur_32 = duration_map.get(int(dur_str), 8)
+        else:
+            base_dur_32 = default_dur_32
+
+        if dot_str == '.':
+            base_dur_32 = int(base_dur_32 * 1.5)
+
+        octave = int(octave_str) if octave_str else default_octave
+
+        if note_char == 'p':
+            midi_note = 0
+        else:
+            full_note_name = note_char
+            if accidental:
+                full_note_name += accidental
+            full_note_name += str(octave)
+
+            if full_note_name not in name_to_midi:
+                raise ValueError(f"Note name not found in dictionary: {full_note_name}")
+            midi_note = name_to_midi[full_note_name]
+
+        result.append((midi_note, base_dur_32))
+
+    return result, tune_name, default_duration, default_octave, tempo
+
+
+def make_corpus(count, seed=1234, min_notes=20, max_notes=120):
+    """ a reproducible corpus of well-formed RTTTL tunes in the usual collection style """
+    rng = random.Random(seed)
+    letters = "cdefgab"
+    durations = ["", "", "", "1", "2", "4", "8", "16", "32"]
+    corpus = []
+    for n in range(count):
+        d = rng.choice((4, 8, 16))
+        o = rng.choice((4, 5, 6))
+        b = rng.choice((63, 90, 100, 112, 125, 140, 160, 180, 200))
+        notes = []
+        for _ in range(rng.randint(min_notes, max_notes)):
+            dur = rng.choice(durations)
+            if rng.random() < 0.1:
+                notes.append(f"{dur}p")
+                continue
+            letter = rng.choice(letters)
+            acc = ""
+            if rng.random() < 0.2:
+                acc = "#" if letter in "cdfga" else ""
+            octave = rng.choice(("", "", "4", "5", "6", "7"))
+            dot = "." if rng.random() < 0.1 else ""
+            notes.append(f"{dur}{letter}{acc}{octave}{dot}")
+        sep = ", " if n % 3 == 0 else ","
+        corpus.append(f"Tune{n}:d={d},o={o},b={b}:" + sep.join(notes))
+    return corpus
+
+
+# malformed and edge-case tunes that must fail (or pass) exactly like before
+EDGE_CASES = [
+    "Bad:d=4,o=5,b=120:16g,xx,8a",
+    "Trailing:d=4,o=5,b=120:16g,8a,",
+    "Empty:d=4,o=5,b=120:",
+    "Spaces:d=4,o=5,b=120:  16G ,  8A#6. , P ",
+    "Garbage:d=4,o=5,b=120:16g#6.junk,8a",
+    "Flats:d=4,o=5,b=120:db,eb6,gb4,ab7,bb,cb,fb",
+    "Sharps:d=4,o=5,b=120:e#,b#",
+    "High:d=4,o=9,b=120:c,g,g#",
+    "Octave10:d=4,o=5,b=120:c10",
+    "Odd:d=3,o=05,b=77:3c,64d,32e.,1f.",
+    "NoDefaults::c,d,e",
+    "missing parts",
+]
+
+
+def check_equivalence(corpus):
+    mismatches = 0
+    for tune in list(corpus) + EDGE_CASES:
+        outcomes = []
+        for parse in (legacy_rttl_to_midi_tuples, rttl_to_midi_tuples):
+            try:
+                outcomes.append(parse(tune))
+            except ValueError as e:
+                outcomes.append(f"ValueError: {e}")
+        if outcomes[0] != outcomes[1]:
+            mismatches += 1
+            print(f"MISMATCH for {tune!r}:\n  legacy: {outcomes[0]}\n  new:    {outcomes[1]}")
+    return mismatches
+
+
+def random_melodies(count, seed=1234):
+    """ melodies with any note and any length, most of which no single token holds """
+    rng = random.Random(seed)
+    melodies = []
+    for _ in range(count):
+        melody = [(rng.choice((0, rng.randint(12, 127))), rng.randint(1, 255))
+                  for _ in range(rng.randint(1, 60))]
+        melodies.append((melody, rng.choice((63, 112, 125, 200))))
+    return melodies
+
+
+def check_encoder(corpus, melodies):
+    """ round trips through midi_tuples_to_rttl, and its d=/o= choice against every other one """
+    mismatches = 0
+    longer = 0
+    cases = [(parsed, b) for parsed, name, d, o, b in map(rttl_to_midi_tuples, corpus)] + melodies
+    for parsed, tempo in cases:
+        encoded = midi_tuples_to_rttl(parsed, "t", tempo)
+        if rttl_to_midi_tuples(encoded)[0] != split_melody(parsed):
+            mismatches += 1
+            print(f"ROUND TRIP MISMATCH for {parsed!r}:\n  {encoded}")
+    for parsed, tempo in cases[::50]:
+        encoded = midi_tuples_to_rttl(parsed, "t", tempo)
+        if len(encoded) > shortest_by_search(parsed, tempo):
+            longer += 1
+            print(f"NOT SHORTEST for {parsed!r}:\n  {encoded}")
+    return mismatches, longer
+
+
+def shortest_by_search(parsed, tempo):
+    """ the length of the shortest encoding, trying every d= and o= and every way to write each token """
+    forms = {}
+    for d, ticks in DURATION_MAP.items():
+        forms.setdefault(ticks, []).append((str(d), ""))
+        forms.setdefault(ticks + (ticks >> 1), []).append((str(d), "."))
+    events = split_melody(parsed)
+    best = None
+    for default_d in DURATION_MAP:
+        for default_o in range(10):
+            length = len(f"t:d={default_d},o={default_o},b={tempo}:") + len(events) - 1
+            for note, ticks in events:
+                length += 1 + min(len("" if d == str(default_d) else d) + len(dot) for d, dot in forms[ticks])
+                if note:
+                    length += (note % 12) in (1, 3, 6, 8, 10)
+                    length += len(str(note // 12 - 1)) if note // 12 - 1 != default_o else 0
+            best = length if best is None else min(best, length)
+    return best
+
+
+def time_parser(parse, corpus, repeat, name_to_midi=None):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for tune in corpus:
+            parse(tune, name_to_midi)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tunes", type=int, default=20000, help="number of tunes in the corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs, best one is reported")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.tunes, seed=args.seed)
+    notes = sum(tune.count(',') + 1 for tune in corpus)
+    print(f"corpus: {len(corpus)} tunes, {notes} notes")
+
+    mismatches = check_equivalence(corpus)
+    if mismatches:
+        print(f"{mismatches} tunes differ between implementations")
+        raise SystemExit(1)
+    print("outputs and error messages identical")
+
+    # the legacy parser gets its name map up front, as make_circuitpython_snippet always did
+    name_to_midi = generate_midi_name_dict()
+    legacy = time_parser(legacy_rttl_to_midi_tuples, corpus, args.repeat, name_to_midi)
+    current = time_parser(rttl_to_midi_tuples, corpus, args.repeat)
+
+    for label, elapsed in (("legacy", legacy), ("scanner", current)):
+        print(f"{label:>8}: {elapsed:7.3f} s  {len(corpus) / elapsed:10.0f} tunes/s  "
+              f"{notes / elapsed:12.0f} notes/s")
+    print(f" speedup: {legacy / current:.2f}x")
+
+    mismatches, longer = check_encoder(corpus, random_melodies(len(corpus) // 10 or 1, seed=args.seed))
+    if mismatches or longer:
+        print(f"encoder: {mismatches} round trip mismatches, {longer} tunes not the shortest")
+        raise SystemExit(1)
+    print("encoder: every tune round trips, and no d=/o= choice is shorter")
+    parsed = [rttl_to_midi_tuples(tune) for tune in corpus]
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        encoded = [midi_tuples_to_rttl(events, name, b) for events, name, d, o, b in parsed]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    source_bytes = sum(len(tune) for tune in corpus)
+    encoded_bytes = sum(len(tune) for tune in encoded)
+    print(f" encoder: {best:7.3f} s  {len(corpus) / best:10.0f} tunes/s  {notes / best:12.0f} notes/s, "
+          f"{source_bytes} bytes of RTTTL rewritten in {encoded_bytes} ({encoded_bytes / source_bytes:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,599 @@
+#!/usr/bin/env python3
+"""
+Runs fox.py on a Linux host: the CircuitPython modules come from hostboard/,
+and time is virtual, so every delay fast-forwards and an hour of transmit
+cycles replays in about a second.
+
+    python3 emulate.py --hours 1 -o trace.json
+    python3 emulate.py --minutes 10 --set transmit_delay=5000 --console 95=stop
+    python3 emulate.py --hours 1 --events -o full_trace.json
+    python3 emulate.py --selftest
+
+Every PTT edge, PWM change and UART write is recorded with its timestamp,
+and peripheral calls take the modelled time in hostboard/hostclock.py
+(change with --cost pwm_init=500). The trace comes out as JSON with, per
+transmit cycle, the airtime, the note timing error against the schedule the
+firmware meant to play, and the peripheral churn; with low_power_idle also
+the time in light sleep and from the modem's wake up to key up.
+
+--selftest runs sa868.py against the stand-in modem instead and checks
+the replies, retry counts, backoff and SA868Error for dropped commands,
+failure codes, a modem without power and a PD power down.
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import math
+import os
+import re
+import selectors
+import sys
+import time
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HOSTBOARD = os.path.join(HERE, "hostboard")
+
+# the modules fox.py pulls in, which have to be imported fresh under the virtual clock
+FIRMWARE_MODULES = ("board", "busio", "digitalio", "pwmio", "supervisor", "alarm", "sa868", "morse", "afsk", "tdma", "songs")
+
+
+class VirtualSelector(selectors.DefaultSelector):
+    """ a selector that, instead of blocking, moves the virtual clock on to the next timer """
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        from hostclock import EmulationFinished
+        if not self.clock.finished:
+            if timeout is None:
+                # nothing scheduled and nothing can ever arrive: the firmware has stopped
+                self.clock.finished = True
+                raise EmulationFinished
+            self.clock.sleep(timeout)
+        # nothing real is registered besides the loop's own wake up pipe, which only
+        # other threads use, so there is never anything to poll
+        return []
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock):
+        super().__init__(VirtualSelector(clock))
+        self.clock = clock
+
+    def time(self):
+        return self.clock.monotonic()
+
+
+class VirtualPolicy(asyncio.DefaultEventLoopPolicy):
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def new_event_loop(self):
+        return VirtualEventLoop(self.clock)
+
+
+def virtual_time_module(clock):
+    """ a copy of the time module whose clocks and sleep are the virtual ones """
+    module = types.ModuleType("time")
+    module.__dict__.update(time.__dict__)
+    module.sleep = clock.sleep
+    module.monotonic = clock.monotonic
+    module.monotonic_ns = clock.monotonic_ns
+    module.time = clock.time
+    module.time_ns = lambda: clock.time() * 1000000000
+    return module
+
+
+def virtual_gc_module():
+    """
+    a copy of the gc module whose collect() takes the modelled gc_collect time. the host's own
+    heap has nothing to do with the badge's, so nothing is actually collected: a full collection
+    of the host process costs milliseconds of real time on every transmission
+    """
+    import hostclock
+    module = types.ModuleType("gc")
+    module.__dict__.update(gc.__dict__)
+
+    def collect(*args):
+        hostclock.record("gc_collect")
+        return 0
+
+    module.collect = collect
+    return module
+
+
+def apply_settings(source, settings):
+    """ replace top level `name = ...` configuration lines, e.g. transmit_delay=5000 """
+    for setting in settings:
+        name, _, value = setting.partition("=")
+        name = name.strip()
+        pattern = re.compile(rf"^{re.escape(name)}\s*=.*$", re.MULTILINE)
+        source, count = pattern.subn(lambda m: f"{name} = {value.strip()}", source, count=1)
+        if not count:
+            raise SystemExit(f"--set: no top level '{name} = ...' in the firmware")
+    return source
+
+
+def pin_name(source, variable):
+    m = re.search(rf"^{variable}\s*=\s*board\.(\w+)", source, re.MULTILINE)
+    return m.group(1) if m else None
+
+
+@contextlib.contextmanager
+def virtual_board(firmware_dir=HERE, limit_ns=None, console_script=(), costs=None):
+    """
+    The hostboard stand-ins and firmware_dir importable, and time, gc, stdin and the asyncio
+    event loop all on a fresh virtual clock, for the duration of the with block.
+    Yields (clock, trace).
+    """
+    sys.path[:0] = [HOSTBOARD, os.path.abspath(firmware_dir)]
+    import hostclock
+
+    clock = hostclock.VirtualClock(limit_ns)
+    trace = hostclock.Trace()
+    hostclock.install(clock, trace, costs)
+    hostclock.console = hostclock.ConsoleInput(console_script)
+
+    saved_time = sys.modules["time"]
+    saved_gc = sys.modules["gc"]
+    saved_stdin = sys.stdin
+    saved_policy = asyncio.get_event_loop_policy()
+    for name in FIRMWARE_MODULES:
+        sys.modules.pop(name, None)
+    sys.modules["time"] = virtual_time_module(clock)
+    sys.modules["gc"] = virtual_gc_module()
+    sys.stdin = hostclock.console
+    asyncio.set_event_loop_policy(VirtualPolicy(clock))
+    try:
+        yield clock, trace
+    finally:
+        sys.modules["time"] = saved_time
+        sys.modules["gc"] = saved_gc
+        sys.stdin = saved_stdin
+        asyncio.set_event_loop_policy(saved_policy)
+        for name in FIRMWARE_MODULES:
+            sys.modules.pop(name, None)
+        del sys.path[:2]
+
+
+def run_firmware(path, limit_ns, settings=(), console_script=(), costs=None, echo=False):
+    """
+    Runs the firmware until the virtual clock reaches limit_ns.
+    Returns (namespace, trace, console output, wall clock seconds).
+    """
+    with open(path) as f:
+        source = apply_settings(f.read(), settings)
+    code = compile(source, path, "exec")
+
+    output = []
+    with virtual_board(os.path.dirname(os.path.abspath(path)), limit_ns, console_script, costs) as (clock, trace):
+        import hostclock
+
+        def console_print(*args, sep=" ", end="\n", file=None, flush=False):
+            text = sep.join(str(a) for a in args) + end
+            output.append((clock.now_ns, text))
+            hostclock.record("console", chars=len(text))
+            clock.advance(hostclock.COSTS["console_char"] * 1000 * len(text))
+            if echo:
+                sys.stdout.write(text)
+
+        namespace = {"__name__": "__main__", "__file__": path, "print": console_print}
+        started = time.perf_counter()
+        try:
+            exec(code, namespace)
+        except hostclock.EmulationFinished:
+            pass
+        finally:
+            wall = time.perf_counter() - started
+
+    namespace["__source__"] = source
+    return namespace, trace, output, wall
+
+
+def sound_intervals(events, mic):
+    """ (start, end, frequency) of every stretch the MIC pin PWM was sounding """
+    intervals = []
+    frequency = 0
+    duty = 0
+    alive = False
+    start = None
+    for t, kind, details in events:
+        if details.get("pin") != mic or not kind.startswith("pwm_"):
+            continue
+        if kind == "pwm_init":
+            alive, frequency, duty = True, details["frequency"], details["duty"]
+        elif kind == "pwm_deinit":
+            alive = False
+        elif kind == "pwm_duty":
+            duty = details["duty"]
+        elif kind == "pwm_frequency":
+            if start is not None and details["frequency"] != frequency:
+                intervals.append((start, t, frequency))
+                start = t
+            frequency = details["frequency"]
+        sounding = alive and duty > 0
+        if sounding and start is None:
+            start = t
+        elif not sounding and start is not None:
+            intervals.append((start, t, frequency))
+            start = None
+    return intervals
+
+
+def flatten_table(table, phrase_tables, phrase):
+    """ a song table with its phrase references replaced by the phrases' own entries """
+    flat = []
+    for i in range(0, len(table) - 1, 2):
+        if table[i] == phrase:
+            flat.extend(phrase_tables[table[i + 1]])
+        else:
+            flat.extend(table[i:i + 2])
+    return flat
+
+
+def expected_tones(namespace, song):
+    """
+    the tones fox.py meant to send in a transmission, as (onset, duration, frequency)
+    in ns from key up: ptt_lead_in, the ID (Morse or AFSK), id_song_gap, the song table.
+    returns (tones, end of the transmission, how many of the tones are the ID)
+    """
+    try:
+        if namespace.get("id_mode") == "afsk":
+            schedule = namespace["id_schedule"]()
+            tone = None
+        else:
+            schedule = namespace["morse_schedule"](namespace["callmessage"], namespace["morse_wpm"],
+                                                   namespace["morse_farnsworth_wpm"])
+            tone = namespace["morse_tone"]
+    except KeyError:
+        return None
+    # the song is resolved the way fox.py does it, with the firmware's directory importable again
+    sys.path.insert(0, os.path.dirname(os.path.abspath(namespace["__file__"])))
+    try:
+        table, phrase_tables = namespace["song_table"](song)
+    except (KeyError, ImportError, OSError):
+        return None
+    finally:
+        del sys.path[0]
+        sys.modules.pop("songs", None)
+    table = flatten_table(table, phrase_tables, namespace.get("PHRASE"))
+
+    lead_in = namespace.get("ptt_lead_in", 750)
+    gap = namespace.get("id_song_gap", 750)
+    tones = []
+    t = lead_in * 1000000
+    if tone is None:
+        # AFSK: back to back tones, the frequency and the length of each
+        for i in range(0, len(schedule), 2):
+            tones.append((t, schedule[i + 1] * 1000, schedule[i]))
+            t += schedule[i + 1] * 1000
+    else:
+        for i in range(0, len(schedule), 2):
+            if schedule[i]:
+                tones.append((t, schedule[i] * 1000, tone))
+            t += (schedule[i] + schedule[i + 1]) * 1000
+    id_tones = len(tones)
+    t += gap * 1000000
+    for i in range(0, len(table) - 1, 2):
+        duration = table[i + 1] * 1000000
+        if table[i]:
+            tones.append((t, duration, table[i]))
+        t += duration
+    return tones, t, id_tones
+
+
+def transmissions(events, ptt):
+    """ (key up, key down) times of every transmission, PTT is active low """
+    spans = []
+    start = None
+    for t, kind, details in events:
+        if kind != "pin" or details.get("pin") != ptt:
+            continue
+        if not details["value"] and start is None:
+            start = t
+        elif details["value"] and start is not None:
+            spans.append((start, t))
+            start = None
+    return spans
+
+
+def light_sleeps(events, pd):
+    """ (start, end) of every light sleep, and the times the PD pin went high """
+    sleeps = []
+    rises = []
+    start = None
+    for t, kind, details in events:
+        if kind == "light_sleep":
+            start = t
+        elif kind == "light_sleep_wake" and start is not None:
+            sleeps.append((start, t))
+            start = None
+        elif kind == "pin" and details.get("pin") == pd and details["value"]:
+            rises.append(t)
+    return sleeps, rises
+
+
+def analyze(namespace, trace):
+    source = namespace["__source__"]
+    ptt = pin_name(source, "PTT_Pin")
+    mic = pin_name(source, "MIC_Pin")
+    events = trace.events
+    spans = transmissions(events, ptt)
+    sleeps, rises = light_sleeps(events, pin_name(source, "PD_Pin"))
+    tones = sound_intervals(events, mic)
+    songs = namespace.get("songs") or []
+    plan = namespace.get("tdma_plan")
+    wall_clock = namespace.get("wall_clock")
+
+    cycles = []
+    event_index = 0
+    tone_index = 0
+    for n, (start, end) in enumerate(spans):
+        next_start = spans[n + 1][0] if n + 1 < len(spans) else math.inf
+        churn = {}
+        while event_index < len(events) and events[event_index][0] < next_start:
+            kind = events[event_index][1]
+            if events[event_index][0] >= start and kind != "console":
+                churn[kind] = churn.get(kind, 0) + 1
+            event_index += 1
+
+        sent = []
+        while tone_index < len(tones) and tones[tone_index][0] < end:
+            if tones[tone_index][0] >= start:
+                sent.append(tones[tone_index])
+            tone_index += 1
+
+        cycle = {
+            "cycle": n,
+            "key_up_s": start / 1e9,
+            "airtime_ms": (end - start) / 1e6,
+            "tones": len(sent),
+            "churn": churn,
+        }
+        previous_end = spans[n - 1][1] if n else 0
+        slept = [(s, e) for s, e in sleeps if previous_end <= s and e <= start]
+        if slept:
+            # low power idle: time in light sleep before this transmission, and from PD going
+            # back up (the modem waking) to key up
+            cycle["light_sleep_s"] = sum(e - s for s, e in slept) / 1e9
+            cycle["wake_to_key_up_ms"] = (start - max(t for t in rises if t <= start)) / 1e6
+        if sent:
+            # keyed before the first tone, and keyed but silent over the whole transmission
+            cycle["lead_in_ms"] = (sent[0][0] - start) / 1e6
+            cycle["keyed_silent_ms"] = ((end - start) - sum(e - s for s, e, f in sent)) / 1e6
+        if plan and wall_clock:
+            # TDMA: the slot the key up falls in, and how far off its start it was
+            wall_ms = wall_clock.origin_ms + (start - wall_clock.origin_ns) / 1e6
+            frame = plan.frame_at(int(wall_ms))
+            fox = namespace.get("fox_index", 0)
+            cycle["frame"] = frame
+            cycle["slot_error_ms"] = wall_ms - plan.slot_start(frame, fox)
+        if songs:
+            song = songs[plan.song(frame, fox) if plan and wall_clock else n % len(songs)]
+            cycle["song"] = song
+            expected = expected_tones(namespace, song)
+            if expected:
+                planned, planned_end, id_tones = expected
+                errors = [(s - start) - onset for (s, e, f), (onset, d, pf) in zip(sent, planned)]
+                lengths = [(e - s) - d for (s, e, f), (onset, d, pf) in zip(sent, planned)]
+                cycle["planned_airtime_ms"] = planned_end / 1e6
+                cycle["planned_tones"] = len(planned)
+                cycle["frequency_mismatches"] = sum(f != pf for (s, e, f), (o, d, pf) in zip(sent, planned))
+                if errors:
+                    cycle["onset_error_ms"] = {
+                        "max": max(abs(e) for e in errors) / 1e6,
+                        "mean": sum(abs(e) for e in errors) / len(errors) / 1e6,
+                        "final": errors[-1] / 1e6,
+                    }
+                    if id_tones:
+                        cycle["id_onset_error_ms"] = max(abs(e) for e in errors[:id_tones]) / 1e6
+                    cycle["length_error_ms"] = {
+                        "max": max(abs(e) for e in lengths) / 1e6,
+                        "mean": sum(abs(e) for e in lengths) / len(lengths) / 1e6,
+                    }
+        cycle["peripheral_calls_per_tone"] = (sum(churn.values()) / len(sent)) if sent else 0
+        cycles.append(cycle)
+
+    summary = {
+        "transmissions": len(cycles),
+        "airtime_s": sum(c["airtime_ms"] for c in cycles) / 1e3,
+        "tones": sum(c["tones"] for c in cycles),
+        "event_counts": dict(trace.counts),
+    }
+    timed = [c for c in cycles if "onset_error_ms" in c]
+    if timed:
+        summary["max_onset_error_ms"] = max(c["onset_error_ms"]["max"] for c in timed)
+        summary["mean_onset_error_ms"] = sum(c["onset_error_ms"]["mean"] for c in timed) / len(timed)
+        summary["max_airtime_overrun_ms"] = max(c["airtime_ms"] - c["planned_airtime_ms"] for c in timed)
+        summary["max_length_error_ms"] = max(c["length_error_ms"]["max"] for c in timed)
+        ids = [c["id_onset_error_ms"] for c in timed if "id_onset_error_ms" in c]
+        if ids:
+            summary["max_id_onset_error_ms"] = max(ids)
+    slot_errors = [c["slot_error_ms"] for c in cycles if "slot_error_ms" in c]
+    if slot_errors:
+        summary["slot_error_ms"] = {"min": min(slot_errors), "max": max(slot_errors)}
+    if sleeps:
+        summary["light_sleep_s"] = sum(e - s for s, e in sleeps) / 1e9
+        wakes = [c["wake_to_key_up_ms"] for c in cycles if "wake_to_key_up_ms" in c]
+        if wakes:
+            summary["wake_to_key_up_ms"] = {"min": min(wakes), "max": max(wakes)}
+            # fox.py's bound on it, from PD going up: the modem's wake up time at least, and
+            # that plus the margin at most, for a sleep that ends on time
+            low = namespace.get("modem_wake_ms", 0)
+            high = low + namespace.get("sleep_wake_margin", 0)
+            summary["wake_bound_ms"] = {"min": low, "max": high}
+            summary["wake_bound_violations"] = sum(not low <= w <= high for w in wakes)
+    lead_ins = [c["lead_in_ms"] for c in cycles if "lead_in_ms" in c]
+    if lead_ins:
+        summary["lead_in_ms"] = {"min": min(lead_ins), "max": max(lead_ins)}
+        summary["keyed_silent_s"] = sum(c.get("keyed_silent_ms", 0) for c in cycles) / 1e3
+    if cycles:
+        summary["peripheral_calls_per_tone"] = (sum(sum(c["churn"].values()) for c in cycles)
+                                                / max(1, summary["tones"]))
+    return cycles, summary
+
+
+def sa868_selftest():
+    """
+    Drives sa868.SA868 against the hostboard UART on the virtual clock, where every wait is
+    exact: a reply, dropped commands, failure codes, an unpowered modem and a PD power down.
+    Checks the result or SA868Error, how often each command was sent and the doubling backoff
+    between the attempts. Returns the number of failed checks.
+    """
+    failed = 0
+
+    def check(name, ok, detail=""):
+        nonlocal failed
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{': ' + detail if detail else ''}")
+
+    with virtual_board() as (clock, trace):
+        import board
+        import busio
+        import digitalio
+        from sa868 import SA868, SA868Error
+
+        uart = busio.UART(board.TX, board.RX)
+        pd = digitalio.DigitalInOut(board.D4)
+        pd.switch_to_output(True)
+        latency = uart.responder.latency
+        modem = SA868(uart, pd=pd)
+
+        def attempt(coroutine):
+            """ (result or the SA868Error, times the command was written, seconds since) """
+            written = len(uart.written)
+            started = clock.monotonic()
+            try:
+                result = asyncio.run(coroutine)
+            except SA868Error as e:
+                result = e
+            return result, [t - started for t, data in uart.written[written:]], clock.monotonic() - started
+
+        def gaps(sends):
+            return [round(b - a, 3) for a, b in zip(sends, sends[1:])]
+
+        def near(values, expected, slack=2 * SA868.POLL):
+            return len(values) == len(expected) and all(abs(v - e) <= slack for v, e in zip(values, expected))
+
+        result, sends, took = attempt(modem.connect())
+        check("reply", result == 0 and len(sends) == 1 and near([took], [latency]),
+              f"{result!r}, sent {len(sends)}x, {took * 1000:.1f} ms")
+
+        uart.drop = 2
+        result, sends, took = attempt(modem.connect())
+        expected = [modem.timeout + modem.backoff, modem.timeout + 2 * modem.backoff]
+        check("two dropped, third answered", result == 0 and near(gaps(sends), expected),
+              f"{result!r}, sent {len(sends)}x, {gaps(sends)} s apart")
+
+        uart.fail["DMOSETVOLUME"] = 1
+        result, sends, took = attempt(modem.set_volume(5))
+        expected = [latency + modem.backoff * (1 << n) for n in range(modem.retries)]
+        check("failure code", isinstance(result, SA868Error) and result.code == 1
+              and len(sends) == modem.retries + 1 and near(gaps(sends), expected),
+              f"{result}, sent {len(sends)}x, {gaps(sends)} s apart")
+        del uart.fail["DMOSETVOLUME"]
+
+        uart.powered = False
+        result, sends, took = attempt(modem.connect(retries=2))
+        expected = [modem.timeout + modem.backoff, modem.timeout + 2 * modem.backoff]
+        check("no answer", isinstance(result, SA868Error) and result.code is None
+              and near(gaps(sends), expected) and near([took], [3 * modem.timeout + 3 * modem.backoff]),
+              f"{result}, sent {len(sends)}x, {took:.3f} s")
+        uart.powered = True
+
+        result, sends, took = attempt(modem.set_group(1, 146.565, 146.565, 3))
+        group = uart.responder.group
+        check("group set", result == 0 and group is not None, f"{result!r}, {group}")
+        result, sends, took = attempt(modem.set_group(3, 146.565, 146.565, 3))
+        check("bad group refused", isinstance(result, SA868Error) and result.code == 1
+              and uart.responder.group == group, f"{result}")
+
+        modem.power_down()
+        result, sends, took = attempt(modem.connect(retries=0))
+        check("powered down", isinstance(result, SA868Error) and not modem.powered, f"{result}")
+        modem.power_up()
+        result, sends, took = attempt(modem.connect(retries=0))
+        check("still waking up", isinstance(result, SA868Error), f"{result}")
+        result, sends, took = attempt(modem.connect())
+        check("awake, settings kept", result == 0 and uart.responder.group == group,
+              f"{result!r} after {len(sends)} tries, group {uart.responder.group}")
+
+        uart.inject(b"+DMOREADY:0\r\n")
+        result, sends, took = attempt(modem.connect())
+        lines = modem.drain()
+        check("unsolicited line kept", result == 0 and lines == [b"+DMOREADY:0"], f"{lines}")
+    return failed
+
+
+def parse_console(entries):
+    """ "95=stop" -> (95 s in ns, "stop\\n") """
+    script = []
+    for entry in entries:
+        seconds, _, text = entry.partition("=")
+        script.append((int(float(seconds) * 1e9), text + "\n"))
+    return script
+
+
+def parse_costs(entries):
+    costs = {}
+    for entry in entries:
+        name, _, value = entry.partition("=")
+        costs[name.strip()] = float(value)
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--firmware", default=os.path.join(HERE, "fox.py"), help="firmware to run (default fox.py)")
+    parser.add_argument("--hours", type=float, default=0)
+    parser.add_argument("--minutes", type=float, default=0)
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a top level setting in the firmware, e.g. transmit_delay=5000")
+    parser.add_argument("--console", action="append", default=[], metavar="SECONDS=TEXT",
+                        help="type a console command at a virtual time, e.g. 95=stop")
+    parser.add_argument("--cost", action="append", default=[], metavar="KIND=US",
+                        help="modelled cost of a peripheral call in microseconds, e.g. pwm_init=500")
+    parser.add_argument("--events", action="store_true", help="include every raw event in the trace")
+    parser.add_argument("--echo", action="store_true", help="show the firmware's console output")
+    parser.add_argument("-o", "--output", help="write the JSON trace here (default stdout)")
+    parser.add_argument("--selftest", action="store_true",
+                        help="check sa868.py's replies, retries, backoff and errors against the stand-in modem, "
+                             "exit 1 on a failure")
+    args = parser.parse_args()
+
+    if args.selftest:
+        failed = sa868_selftest()
+        print(f"{failed} checks failed" if failed else "all checks passed")
+        sys.exit(1 if failed else 0)
+
+    seconds = args.hours * 3600 + args.minutes * 60 or 3600
+    namespace, trace, output, wall = run_firmware(args.firmware, int(seconds * 1e9), args.set,
+                                                  parse_console(args.console), parse_costs(args.cost),
+                                                  args.echo)
+    cycles, summary = analyze(namespace, trace)
+    summary["simulated_s"] = seconds
+    summary["wall_s"] = wall
+
+    result = {"firmware": args.firmware, "settings": args.set, "summary": summary, "cycles": cycles}
+    if args.events:
+        result["events"] = [{"t_ns": t, "kind": kind, **details} for t, kind, details in trace.events]
+        result["console"] = [{"t_ns": t, "text": text} for t, text in output]
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=1)
+        print(f"{summary['transmissions']} transmissions, {summary['airtime_s']:.1f} s airtime in "
+              f"{seconds:.0f} simulated s, {wall:.2f} s wall clock -> {args.output}", file=sys.stderr)
+    else:
+        json.dump(result, sys.stdout, indent=1)
+        print()
+
+
+if __name__ == "__main__":
+    main()
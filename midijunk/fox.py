@@ -38,17 +38,49 @@
     at 9600 baud.
 '''
 
+import os
+import sys
 import time
+import gc
 import math
+import asyncio
+from array import array
 import board
 import busio
 import digitalio
 import pwmio
+import supervisor
+try:
+    import alarm
+except ImportError:
+    alarm = None			# no light sleep on this board, low_power_idle only powers the modem down
+from sa868 import SA868, SA868Error
+from morse import compile_morse, morse_schedule, schedule_us
+from afsk import afsk_schedule, address_callsign, compile_afsk, ui_frame, schedule_us as afsk_schedule_us
+from tdma import SlotPlan, WallClock
 
 
 callmessage = "VE6MOG/W4 DECOY DECOY VE6MOG/W4"	#; // your callsign goes here
 frequency = 146.565			#; // 146.565 is the normal TX frequency for foxes
 transmit_delay = 30000		#; // delay between transmissions in milliseconds
+modem_check_interval = 10	#; // seconds between SA868 checks while not transmitting
+morse_wpm = 12				#; // Morse ID character speed
+morse_farnsworth_wpm = 0	#; // overall Morse speed with Farnsworth spacing, 0 for standard spacing
+morse_tone = 800			#; // Morse tone in Hz
+id_mode = "morse"			#; // "afsk" sends the ID as a 1200 baud AX.25 packet instead, see afsk.py
+afsk_destination = "ID"		#; // AX.25 destination of the AFSK ID, e.g. "APRS"
+persistent_tone = True		#; // keep one PWM running for the whole transmission instead of one per note
+ptt_lead_in = 750			#; // ms keyed before the ID starts (radio and receivers settling)
+id_song_gap = 750			#; // ms between the ID and the song
+profile = False				#; // print where each transmission's time and heap went (console: profile on/off)
+tdma = False				#; // take turns with other foxes on the frequency in time slots, see tdma.py
+fox_index = 0				#; // this fox's slot, its place in tdma_callmessages
+tdma_callmessages = [callmessage]	#; // every fox's callmessage in slot order, the same list on every fox
+tdma_epoch = 1767225600		#; // unix time the slots are counted from, the same on every fox
+tdma_guard = 1000			#; // ms between one fox keying down and the next keying up (clock differences)
+low_power_idle = False		#; // power the SA868 down and light sleep between transmissions, see doze()
+modem_wake_ms = 100			#; // ms from raising PD until the SA868 is ready to key up
+sleep_wake_margin = 50		#; // ms woken early on top of modem_wake_ms, for the light sleep wake up itself
 bandwidth = 1				#; // Bandwidth, 0=12.5k, 1=25K
 squelch = 3					#; // Squelch 0-8, 0 is listen/open
 volume = 5					#; // Volume 1-8
@@ -60,127 +92,11 @@ RX_Pin = board.D7 			# // GPIO20 | D7 on XIAO
 TX_Pin = board.D6			# // GPIO21 | D6 on XIAO
 MIC_Pin = board.D1			# // GPOI03 | D1 on XIAO
 
-morse_map = {
-    'a': ".-",
-    'b': "-...",
-    'c': "-.-.",
-    'd': "-..",
-    'e': ".",
-    'f': "..-.",
-    'g': "--.",
-    'h': "....",
-    'i': "..",
-    'j': ".---",
-    'k': "-.-",
-    'l': ".-..",
-    'm': "--",
-    'n': "-.",
-    'o': "---",
-    'p': ".--.",
-    'q': "--.-",
-    'r': ".-.",
-    's': "...",
-    't': "-",
-    'u': "..-",
-    'v': "...-",
-    'w': ".--",
-    'x': "-..-",
-    'y': "-.--",
-    'z': "--..", 
-    '0': "-----",
-    '1': ".----",
-    '2': "..---",
-    '3': "...--",
-    '4': "....-",
-    '5': ".....",
-    '6': "-....",
-    '7': "--...",
-    '8': "---..",
-    '9': "----.",
-    '.': ".-.-.-",
-    ',': "--..--",
-    '?': "..--..",
-    "'": ".----.",
-    '!': "-.-.--",
-    '/': "-..-.",
-    '(': "-.--.",
-    ')': "-.--.-",
-    '&': ".-...",
-    ':': "---...",
-    ';': "-.-.-.",
-    '=': "-...-",
-    '+': ".-.-.",
-    '-': "-....-",
-    '_': "..--.-",
-    '"': ".-..-.",
-    '$': "...-..-",
-    '@': ".--.-."
-}
-
-# each tuple is a midi note number and the number of 32nd-ths duration: 2/32 = 16th, 8/32 = 1/4, 32/32 = whole, etc
-# a dotted note is 1.5 times the duration
-midi_music = [
-  (69,2), (71,2), (74,2), (71,2), (78,6), (78,6), (76,12),
-  (69,2), (71,2), (74,2), (71,2), (76,6), (76,6), (74,6), 
-  (73,2), (71,6), (69,2), (71,2), (74,2), (71,2),
-  (74,8), (76,4), (73,6), (71,2), (69,4), (69,4), (69,4), 
-  (76,8), (74,16), (69,2), (71,2), (74,2), (71,2),
-  (78,6), (78,6), (76,12), (69,2), (71,2), (74,2), (71,2),
-  (81,8), (73,4), (74,6), (73,2), (71,4), (69,2), (71,2), (74,2), (71,2),
-  (74,8), (76,4), (73,6), (71,2), (69,8), (69,4), (76,8), (74,16), (0,8)
-]
-
-o_canada_melody = [
-    (79, 8), (82, 4), (0, 2), (82, 2), (75, 12), (77, 4), (79, 4),
-    (80, 4), (82, 4), (84, 4), (77, 12), (0, 4), (79, 8), (81, 4),
-    (0, 2), (81, 2), (82, 12), (84, 4), (86, 4), (86, 4), (84, 4),
-    (84, 4), (82, 12), (77, 3), (79, 1), (80, 6), (79, 2), (77, 4),
-    (79, 3), (80, 1), (82, 6), (80, 2), (79, 4), (80, 3), (82, 1),
-    (84, 4), (82, 4), (80, 4), (79, 4), (77, 12), (77, 3), (79, 1),
-    (80, 6), (79, 2), (77, 4), (79, 3), (80, 1), (82, 6), (80, 2),
-    (79, 4), (79, 4), (77, 4), (82, 4), (82, 2), (81, 2), (79, 2),
-    (81, 2), (82, 8), (0, 8), (79, 8), (82, 6), (82, 2), (75, 8),
-    (0, 8), (80, 8), (84, 4), (0, 2), (84, 2), (77, 8), (0, 8),
-    (82, 8), (83, 4), (0, 2), (83, 2), (84, 4), (80, 4), (79, 4),
-    (77, 4), (75, 8), (77, 8), (79, 8), (0, 8), (82, 8), (87, 4),
-    (0, 2), (87, 2), (84, 4), (80, 4), (79, 4), (77, 4), (82, 8),
-    (74, 8), (75, 16),
-]
-
-topgun_melody = [
-    (0, 4), (61, 8), (68, 8), (68, 8), (66, 4), (65, 4), (66, 4),
-    (65, 4), (63, 8), (63, 8), (61, 4), (63, 4), (65, 8), (63, 4),
-    (65, 4), (66, 8), (65, 4), (61, 4), (65, 8), (63, 32), (61, 8),
-    (68, 8), (68, 8), (66, 4), (65, 4), (66, 4), (65, 4), (63, 8),
-    (63, 8), (61, 4), (63, 4), (65, 8), (63, 4), (65, 4), (66, 8),
-    (65, 4), (61, 4), (68, 32),
-]
-
-
-god_save_the_king = [
-    (91, 8), (91, 8), (93, 8), (90, 12), (91, 4), (93, 8), (95, 8),
-    (95, 8), (96, 8), (95, 12), (93, 4), (91, 8), (93, 8), (91, 8),
-    (90, 8), (91, 8),
-]
-
-final_countdown = [
-    (0, 8), (0, 4), (83, 2), (81, 2), (83, 8), (76, 8), (0, 8),
-    (0, 4), (84, 2), (83, 2), (84, 4), (83, 4), (81, 8), (0, 8),
-    (0, 4), (84, 2), (83, 2), (84, 8), (76, 8), (0, 8), (0, 4),
-    (81, 2), (79, 2), (81, 4), (79, 4), (78, 4), (81, 4), (79, 12),
-    (78, 2), (79, 2), (81, 12), (79, 2), (81, 2), (83, 4), (81, 4),
-    (79, 4), (78, 4), (76, 8), (84, 8), (83, 24), (83, 2), (84, 2),
-    (83, 2), (81, 2), (83, 32),
-]
-
-wannabe_melody = [
-    (79, 2), (79, 2), (79, 2), (79, 2), (79, 4), (81, 4), (79, 4),
-    (76, 4), (0, 4),   (72, 2), (74, 2), (72, 2), (74, 4), (74, 4),
-    (72, 4), (76, 8), (0, 8),   (79, 4), (79, 4), (79, 4), (81, 4),
-    (79, 4), (76, 4), (0, 4),   (84, 8), (84, 4), (83, 4), (79, 4),
-    (81, 4), (83, 2), (81, 2), (79, 8),
-]
+MELODY_DIR = "/melodies"	# packed melodies (*.bin from rtttl.py --bin-dir) played after the built in songs
 
+# the songs live in the songs package (the songs directory next to this file on the badge),
+# one module per song holding its name, melody and tempo. see song_table
+SONG_DIR = "/songs"
 
 
 def init_pin(pin, default=False):
@@ -188,30 +104,180 @@ def init_pin(pin, default=False):
     rtn.direction = digitalio.Direction.OUTPUT
     rtn.value = default
     return rtn
-    
-def delay(ms):
-    seconds = ms / 1000
-    #print(f"delay for {seconds:.2f} seconds")
-    time.sleep(seconds)
-
-def serial_out(message, ms=100):
-    global uart
-    #print(f"sending command:   '{message}'")
-    uart.write(bytes(f"{message}\r\n", 'ascii'))
-    delay(ms)
-    response = uart.read(64)
-    if not response:
-        print(f"no response to '{message}'")
-    else:
-        #print(f"received response: '{response.decode().strip()}'")
-        pass
+
+class Scheduler:
+    '''
+    absolute deadlines for everything sent in one transmission. every note, Morse
+    element and gap is placed a fixed time after start() on time.monotonic_ns(),
+    and only the time left until its deadline is slept, so the time spent in
+    tone_on/tone_off, print and the like never accumulates over a transmission.
+
+    it also counts, per transmission, the steps that were reached after their
+    deadline had already passed (overruns) and how late each wake up was.
+    '''
+    def __init__(self):
+        self.start()
+
+    def start(self, at=None):
+        ''' begin a new transmission, at a monotonic_ns() time or now '''
+        self.deadline = time.monotonic_ns() if at is None else at
+        self.started = self.deadline
+        self.steps = 0
+        self.overruns = 0
+        self.overrun_ns = 0
+        self.max_late_ns = 0
+        self.total_late_ns = 0
+
+    async def sleep(self, ms):
+        ''' wait until ms after the previous deadline, other tasks run meanwhile '''
+        self.deadline += int(ms * 1000000)
+        await self._wait()
+
+    async def sleep_us(self, us):
+        ''' sleep() for an integer number of microseconds '''
+        self.deadline += us * 1000
+        await self._wait()
+
+    def spin_us(self, us):
+        '''
+        sleep_us() by busy waiting, for steps finer than asyncio sleeps can time (a millisecond).
+        no other task runs meanwhile, so only for short stretches
+        '''
+        self.deadline += us * 1000
+        self.steps += 1
+        now = time.monotonic_ns()
+        if now > self.deadline:
+            self.overruns += 1
+            self.overrun_ns += now - self.deadline
+        while now < self.deadline:
+            now = time.monotonic_ns()
+        self._late(now)
+
+    async def _wait(self):
+        self.steps += 1
+        remaining = self.deadline - time.monotonic_ns()
+        if remaining > 0:
+            await asyncio.sleep(remaining / 1000000000)
+        else:
+            self.overruns += 1
+            self.overrun_ns -= remaining
+        self._late(time.monotonic_ns())
+
+    def _late(self, now):
+        late = now - self.deadline
+        if late > 0:
+            self.total_late_ns += late
+            if late > self.max_late_ns:
+                self.max_late_ns = late
+
+    async def idle_until(self, deadline, wake):
+        '''
+        wait between transmissions until a monotonic_ns() deadline (transmit_delay after the
+        previous one, the start of a TDMA slot) or until the wake event is set, then start the
+        next transmission from that moment
+        '''
+        self.deadline = deadline
+        remaining = self.deadline - time.monotonic_ns()
+        if remaining > 0:
+            try:
+                await asyncio.wait_for(wake.wait(), remaining / 1000000000)
+            except asyncio.TimeoutError:
+                pass
+        wake.clear()
+        self.start(at=min(self.deadline, time.monotonic_ns()))
+
+    def report(self):
+        ''' one line of timing statistics for the transmission so far '''
+        scheduled = (self.deadline - self.started) // 1000000
+        actual = (time.monotonic_ns() - self.started) // 1000000
+        mean_late = self.total_late_ns // self.steps if self.steps else 0
+        return (f"timing: {self.steps} steps, {scheduled} ms scheduled, {actual} ms actual, "
+                f"{self.overruns} overruns ({self.overrun_ns // 1000} us), "
+                f"late max {self.max_late_ns // 1000} us mean {mean_late // 1000} us")
+
+scheduler = Scheduler()
+
+# phases of a transmit cycle, in the order the profiler sees them start
+PREPARE, IDLE, SLEEP, WAKE, KEY_UP, PRE_ID, MORSE_ID, GAP, SONG, KEY_DOWN, END = range(11)
+PHASE_NAMES = ("prepare", "idle", "light sleep", "wake", "key up", "pre ID", "ID", "gap", "song", "key down", "end")
+# time spent in calls within the phases
+PWM, CONSOLE = range(2)
+COST_NAMES = ("pwm", "console")
+
+class Profiler:
+    '''
+    where the time and heap of a transmit cycle go. mark() stamps the start of each phase into
+    preallocated ring buffers (phase, microseconds since begin(), gc.mem_free()), charge() adds
+    up the time spent in PWM and console calls. nothing is allocated while recording, and the
+    call sites check the profile setting first, so with profiling off each costs a global lookup
+    '''
+    def __init__(self, size=32):
+        self.size = size
+        self.phases = array('B', bytes(size))
+        self.times = array('L', [0] * size)
+        self.heap = array('l', [0] * size)
+        self.cost_us = array('L', [0] * len(COST_NAMES))
+        self.cost_calls = array('L', [0] * len(COST_NAMES))
+        self.mem_free = getattr(gc, "mem_free", None)	# CircuitPython only
+        self.begin()
+
+    def begin(self):
+        ''' start recording a new cycle '''
+        self.origin = time.monotonic_ns()
+        self.count = 0
+        for i in range(len(COST_NAMES)):
+            self.cost_us[i] = 0
+            self.cost_calls[i] = 0
+
+    def mark(self, phase):
+        i = self.count % self.size
+        self.phases[i] = phase
+        self.times[i] = (time.monotonic_ns() - self.origin) // 1000
+        self.heap[i] = self.mem_free() if self.mem_free else -1
+        self.count += 1
+
+    def charge(self, cost, started_ns):
+        ''' add the time since started_ns (a monotonic_ns() value) to a cost '''
+        self.cost_us[cost] += (time.monotonic_ns() - started_ns) // 1000
+        self.cost_calls[cost] += 1
+
+    def report(self):
+        ''' two lines: the time of each phase, then the call costs and the free heap '''
+        first = max(0, self.count - self.size)
+        phases = []
+        heap = {}
+        for n in range(first, self.count):
+            i = n % self.size
+            heap[self.phases[i]] = self.heap[i]
+            if n + 1 < self.count:
+                j = (n + 1) % self.size
+                phases.append(f"{PHASE_NAMES[self.phases[i]]} {(self.times[j] - self.times[i]) / 1000:.1f} ms")
+        lines = "profile: " + ", ".join(phases)
+        if first:
+            lines += f" ({first} older marks overwritten)"
+        costs = [f"{COST_NAMES[c]} {self.cost_calls[c]} calls {self.cost_us[c] / 1000:.1f} ms"
+                 for c in range(len(COST_NAMES))]
+        lines += "\nprofile: " + ", ".join(costs)
+        if not self.mem_free:
+            return lines + ", free heap not available"
+        lowest = min(self.heap[n % self.size] for n in range(first, self.count)) if self.count else -1
+        lines += f", free heap {heap.get(PREPARE, -1)} before the song, {lowest} lowest"
+        if PREPARE in heap and IDLE in heap:
+            lines += f", prepared transmission {heap[PREPARE] - heap[IDLE]} bytes"
+        return lines
+
+profiler = Profiler()
 
 sound_pwm = None
+sound_frequency = 0
+tone_held = False	# True while tone_start() holds the PWM for a whole transmission
 
 def tone_on(frequency:float=440.0):
-    global mic, sound_pwm
+    global mic, sound_pwm, sound_frequency
     ''' produce the given sound for the given amount of time '''
     #print(f"Tone On ({frequency:f})")
+    if profile:
+        started = time.monotonic_ns()
     frequency = int(frequency)
     if mic:
         mic.deinit()
@@ -219,22 +285,52 @@ def tone_on(frequency:float=440.0):
     # create the pwm ourput if it doesn't exist; otherwise, just change the frequency
     if not sound_pwm:
         sound_pwm = pwmio.PWMOut(MIC_Pin, frequency=frequency, variable_frequency=True)
-        sound_pwm.duty_cycle = (65535 // 2) #0x8000
-    else:
+        sound_frequency = frequency
+    elif frequency != sound_frequency:
         sound_pwm.frequency = frequency
+        sound_frequency = frequency
+    sound_pwm.duty_cycle = (65535 // 2) #0x8000
+    if profile:
+        profiler.charge(PWM, started)
 
 def tone_off():
     global mic, sound_pwm
     ''' stop producing sound '''
     #print("Tone Off")
-    if sound_pwm:
-        sound_pwm.deinit()
-        sound_pwm = None
-    mic = init_pin(MIC_Pin, False)
-    
-def tone(frequency:float=440.0, duration:int=0.5):
-    tone_on(frequency)
-    delay(duration)
+    if profile:
+        started = time.monotonic_ns()
+    if tone_held:
+        # keep the PWM running, just silent
+        sound_pwm.duty_cycle = 0
+    else:
+        if sound_pwm:
+            sound_pwm.deinit()
+            sound_pwm = None
+        mic = init_pin(MIC_Pin, False)
+    if profile:
+        profiler.charge(PWM, started)
+
+def tone_start():
+    global mic, sound_pwm, sound_frequency, tone_held
+    '''
+    hold one variable frequency PWM on the MIC pin for a whole transmission.
+    notes then only change its frequency and duty cycle, silence is a duty cycle of 0,
+    so there is no PWM / DigitalInOut allocation and teardown per note
+    '''
+    if mic:
+        mic.deinit()
+        mic = None
+    if not sound_pwm:
+        sound_frequency = 440
+        sound_pwm = pwmio.PWMOut(MIC_Pin, frequency=sound_frequency, duty_cycle=0, variable_frequency=True)
+    else:
+        sound_pwm.duty_cycle = 0
+    tone_held = True
+
+def tone_stop():
+    global tone_held
+    ''' release the PWM from tone_start() and hand the MIC pin back to the idle output '''
+    tone_held = False
     tone_off()
 
 def midi_to_frequency(note:int):
@@ -245,117 +341,195 @@ def frequency_to_midi(frequency:float):
     ''' convert a frequency to a note '''
     return 69 + (12 * (math.log(frequency / 440.0) / math.log(2)))
 
-def play_midi_song():
-    global midi_music
-    print(f"playing music: ", end='')
-    TEMP = 140
-    THIRTYSECOND = 60000 * 5 // (TEMP * 32)
-    
-    for note, duration in midi_music:
-        if note == 0:
-            delay(duration * THIRTYSECOND)
-        else:
-            tone(midi_to_frequency(note), (duration * THIRTYSECOND))
-            
-def play_o_canada():
-    global o_canada_melody
-    print(f"playing music: ", end='')
-    TEMP = 140
-    THIRTYSECOND = 60000 * 5 // (TEMP * 32)
-    
-    for note, duration in o_canada_melody:
-        if note == 0:
-            delay(duration * THIRTYSECOND)
-        else:
-            tone(midi_to_frequency(note), (duration * THIRTYSECOND))
-            
-def play_topgun():
-    global topgun_melody
-    print(f"playing music: ", end='')
-    TEMP = 140
-    THIRTYSECOND = 60000 * 5 // (TEMP * 32)
-    
-    for note, duration in topgun_melody:
-        if note == 0:
-            delay(duration * THIRTYSECOND)
-        else:
-            tone(midi_to_frequency(note), (duration * THIRTYSECOND))
-            
-def play_finalcountdown():
-    global final_countdown
-    print(f"playing music: ", end='')
-    TEMP = 140
-    THIRTYSECOND = 60000 * 5 // (TEMP * 32)
-    
-    for note, duration in final_countdown:
-        if note == 0:
-            delay(duration * THIRTYSECOND)
-        else:
-            tone(midi_to_frequency(note), (duration * THIRTYSECOND))
-            
-def play_wannabe():
-    global wannabe_melody
-    print(f"playing music: ", end='')
-    TEMP = 140
-    THIRTYSECOND = 60000 * 5 // (TEMP * 32)
-    
-    for note, duration in wannabe_melody:
-        if note == 0:
-            delay(duration * THIRTYSECOND)
-        else:
-            tone(midi_to_frequency(note), (duration * THIRTYSECOND))
-            
-def play_god_save_the_king():
-    global god_Save_the_king
-    print(f"playing music: ", end='')
-    TEMP = 140
-    THIRTYSECOND = 60000 * 5 // (TEMP * 32)
-    
-    for note, duration in god_save_the_king:
-        if note == 0:
-            delay(duration * THIRTYSECOND)
+# integer PWM frequency for every MIDI note (0 is a rest), worked out once at boot
+# so the play loops never do the floating point 2 ** math
+NOTE_FREQUENCIES = array('H', [0] + [int(midi_to_frequency(note)) for note in range(1, 128)])
+
+# a table entry with this frequency refers to a phrase of the shared phrase table
+# (rtttl.py --phrases), its duration slot holding the phrase index
+PHRASE = 0xFFFF
+
+def compile_melody(melody, tempo, phrases=None, phrase_tables=None):
+    '''
+    resolve a melody into a flat array of frequency, milliseconds pairs (a frequency of 0 is a rest).
+    takes a list of (note, duration) tuples or a packed melody (note byte, duration byte per event),
+    and the tempo as the RTTTL b= value: quarter notes per minute, so a 32nd note is 7500 / tempo ms.
+    phrase references in a packed melody (a note byte with the high bit set) stay references to
+    the shared phrases; each phrase the melody uses is compiled once into phrase_tables
+    '''
+    table = array('H')
+    if isinstance(melody, list):
+        for note, duration in melody:
+            table.append(NOTE_FREQUENCIES[note])
+            table.append(min(duration * 7500 // tempo, 65535))
+    else:
+        events = memoryview(melody)
+        for i in range(0, len(events) - 1, 2):
+            note = events[i]
+            if note & 0x80:
+                index = ((note & 0x7F) << 8) | events[i + 1]
+                if index not in phrase_tables:
+                    phrase_tables[index] = compile_melody(phrases[index], tempo)
+                table.append(PHRASE)
+                table.append(index)
+            else:
+                table.append(NOTE_FREQUENCIES[note])
+                table.append(min(events[i + 1] * 7500 // tempo, 65535))
+    return table
+
+async def play_table(table, phrase_tables=None):
+    ''' play a table from compile_melody, timed by the transmission scheduler. phrases are played from their own tables '''
+    for i in range(0, len(table) - 1, 2):
+        frequency = table[i]
+        if frequency == PHRASE:
+            await play_table(phrase_tables[table[i + 1]])
+        elif frequency:
+            tone_on(frequency)
+            await scheduler.sleep(table[i + 1])
+            tone_off()
         else:
-            tone(midi_to_frequency(note), (duration * THIRTYSECOND))
+            await scheduler.sleep(table[i + 1])
 
-def play_morse(message=callmessage):
+def load_melody(path):
     '''
-    /*
-       * short mark, dot or "dit" (.): "dot duration" is one time unit long      
-       * longer mark, dash or "dah" (-): three time units long
-       * inter-element gap between the dots and dashes within a character: one dot duration or one unit long
-       * short gap (between letters): three time units long      
-       * medium gap (between words): seven time units long
-    */
+    read a packed melody file written by rtttl.py --bin-dir: the tempo as two
+    big endian bytes, then a note byte and a duration byte per event.
+    returns (tempo, events) with the events as a single byte array, no per-note objects.
+    the buffer is allocated once at the file's size and read into, not read then copied
     '''
-    print(f"transmitting '{message}': ", end='')
-    
-    WPM = 12
-    TONE = 800
-    DURATION = 60000 / (WPM*50)
-    
-    for c in message:
-        if c == ' ':
-            delay(DURATION*(7-3))	# we already delayed 3 after the character
-            print(' // ',end='')
-            continue
-        
-        c = c.lower()
-        morse = morse_map.get(c, None)
-        if morse == None:
-            continue
+    data = bytearray(os.stat(path)[6])
+    with open(path, "rb") as f:
+        f.readinto(data)
+    return (data[0] << 8) | data[1], memoryview(data)[2:]
 
-        print(morse, end='')
-        for mark in morse:
-            if mark == '.':
-                tone(TONE, DURATION)
-            else: # == '-'
-                tone(TONE, DURATION*3)
-            delay(DURATION)
-            
-        delay(DURATION*(3-1))		# we already delayed 1 after the last mark
-        print(' ', end='')
-    print()
+def song_table(song):
+    '''
+    resolve an entry of the song rotation into its frequency/duration table and the tables of the
+    shared phrases it uses. an entry is the path of a packed melody file or the name of a module in
+    the songs package; the module (and the phrase table) is imported for this and forgotten again,
+    so only one song is ever resident
+    '''
+    phrase_tables = {}
+    if song.endswith(".bin"):
+        tempo, melody = load_melody(song)
+        return compile_melody(melody, tempo), phrase_tables
+    module = f"songs.{song}"
+    __import__(module)
+    data = sys.modules[module]
+    table = compile_melody(data.melody, data.tempo, getattr(data, "phrases", None), phrase_tables)
+    del data
+    for name in (song, "phrases"):
+        sys.modules.pop(f"songs.{name}", None)
+        try:
+            delattr(sys.modules["songs"], name)
+        except (KeyError, AttributeError):
+            pass
+    return table, phrase_tables
+
+async def play_song(song, compiled):
+    ''' play one entry of the song rotation from its song_table, see songs below '''
+    if profile:
+        started = time.monotonic_ns()
+    print(f"playing {song}: ", end='')
+    if profile:
+        profiler.charge(CONSOLE, started)
+    await play_table(*compiled)
+
+def song_modules(directory=SONG_DIR):
+    ''' the song modules on the board (.py or .mpy), in name order '''
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    modules = set()
+    for name in names:
+        module, _, suffix = name.rpartition(".")
+        if suffix in ("py", "mpy") and module not in ("__init__", "phrases"):
+            modules.add(module)
+    return sorted(modules)
+
+def melody_files(directory=MELODY_DIR):
+    ''' the packed melody files on the board, in name order '''
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return []
+    return [f"{directory}/{name}" for name in names if name.endswith(".bin")]
+
+async def play_morse(message=callmessage, schedule=None):
+    '''
+    key the message from its cached keying schedule (see morse.py), so
+    nothing is looked up or worked out per character on each transmission
+    '''
+    if schedule is None:
+        schedule = morse_schedule(message, morse_wpm, morse_farnsworth_wpm)
+    if profile:
+        started = time.monotonic_ns()
+    print(f"transmitting '{message}'")
+    if profile:
+        profiler.charge(CONSOLE, started)
+
+    for i in range(0, len(schedule), 2):
+        if schedule[i]:
+            tone_on(morse_tone)
+            await scheduler.sleep_us(schedule[i])
+            tone_off()
+        await scheduler.sleep_us(schedule[i + 1])
+
+def play_afsk(message=callmessage, schedule=None):
+    '''
+    send the ID as an AX.25 packet from its cached tone schedule (see afsk.py). the PWM is never
+    restarted, only its frequency follows the schedule, so the tones are phase continuous.
+    the 833 us bits are far finer than asyncio sleeps can time, so the scheduler busy waits
+    through the half second or so the frame takes
+    '''
+    if schedule is None:
+        schedule = afsk_schedule(message, destination=afsk_destination)
+    if profile:
+        started = time.monotonic_ns()
+    print(f"transmitting '{message}' as AFSK")
+    if profile:
+        profiler.charge(CONSOLE, started)
+
+    for i in range(0, len(schedule), 2):
+        tone_on(schedule[i])
+        scheduler.spin_us(schedule[i + 1])
+    tone_off()
+
+def id_schedule():
+    ''' the cached schedule of the ID for the id_mode, Morse keying or AFSK tones '''
+    if id_mode == "afsk":
+        return afsk_schedule(callmessage, destination=afsk_destination)
+    return morse_schedule(callmessage, morse_wpm, morse_farnsworth_wpm)
+
+def id_airtime_ms(message):
+    ''' how long the ID of a fox with this callmessage takes, compiled without caching it '''
+    if id_mode == "afsk":
+        schedule = compile_afsk(ui_frame(address_callsign(message), message, afsk_destination))
+        return afsk_schedule_us(schedule) // 1000
+    return schedule_us(compile_morse(message, morse_wpm, morse_farnsworth_wpm)) // 1000
+
+def table_ms(table, phrase_tables):
+    ''' how long a table from compile_melody plays for '''
+    total = 0
+    for i in range(0, len(table) - 1, 2):
+        if table[i] == PHRASE:
+            total += table_ms(phrase_tables[table[i + 1]], None)
+        else:
+            total += table[i + 1]
+    return total
 
+def slot_plan():
+    '''
+    the TDMA slots of every fox in tdma_callmessages, from each one's ID airtime and every
+    song's airtime. the songs are resolved one at a time, only their lengths are kept
+    '''
+    song_ms = []
+    for song in songs:
+        song_ms.append(table_ms(*song_table(song)))
+        gc.collect()
+    id_ms = [id_airtime_ms(message) for message in tdma_callmessages]
+    return SlotPlan(id_ms, song_ms, ptt_lead_in + id_song_gap, tdma_guard, tdma_epoch * 1000)
 
 
 
@@ -365,7 +539,6 @@ def play_morse(message=callmessage):
 print("initializing system ... ", end='')
 
 uart = busio.UART(TX_Pin, RX_Pin, baudrate=9600, timeout=1.0)
-delay(1000)
 
 #print("setting up PTT, Power Down, Power Level, MIC")
 
@@ -374,19 +547,26 @@ pd = init_pin(PD_Pin, True)
 power = init_pin(HL_Pin, False)
 mic = init_pin(MIC_Pin, False)
 
-#print("initializing modem")
-serial_out("AT+DMOCONNECT", ms=500)
+modem = SA868(uart, pd=pd, power=power)
 
-#print("initializing frequency")
-message = f"AT+DMOSETGROUP={bandwidth:d},{frequency:.4f},{frequency:.4f},0000,{squelch:d},0000"
-serial_out(message)
+async def setup_modem():
+    '''
+    handshake with and configure the SA868. the handshake retries with a backoff
+    long enough to cover the module still powering up
+    '''
+    try:
+        #print("initializing modem")
+        await modem.connect(retries=6)
 
-#print("initializing volume")
-volume = 8 if volume > 8 else volume
-message = f"AT+DMOSETVOLUME={volume:d}"
-serial_out(message)
+        #print("initializing frequency")
+        await modem.set_group(bandwidth, frequency, frequency, squelch)
 
-print("ready")
+        #print("initializing volume")
+        await modem.set_volume(volume)
+    except SA868Error as e:
+        print(f"modem: {e}")
+        return False
+    return True
 
 
 
@@ -394,38 +574,321 @@ print("ready")
 if callmessage == "Fox Hunt":
     print(f"** WARNING **  callsign has not been set. Current callsign is '{callmessage}'")
 
-# Songs in my loop
-songs = [
-    play_midi_song,
-    play_o_canada,
-    play_topgun,
-    play_finalcountdown,
-    play_wannabe,
-    play_god_save_the_king
+# compile the ID once, every transmission replays the cached schedule
+id_schedule()
+
+# Songs in my loop, by module name in the songs package; rtttl.py --song-dir writes more of them.
+# any other song module on the board plays after these, then the packed melody files
+SONGS = [
+    "midi_music",
+    "o_canada",
+    "top_gun",
+    "final_countdown",
+    "wannabe",
+    "god_save_the_king",
 ]
 
-# We'll keep an index to track which function to call
+# only the names are kept, every song is imported and resolved when its turn comes
+songs = SONGS + [module for module in song_modules() if module not in SONGS]
+songs.extend(melody_files())
+
+# We'll keep an index to track which song to play
 song_index = 0
 
+tdma_plan = None
+wall_clock = None
+if low_power_idle and not alarm:
+    print("** WARNING **  no alarm module, low_power_idle powers the modem down but can't light sleep")
+
+if tdma:
+    if tdma_callmessages[fox_index] != callmessage:
+        print(f"** WARNING **  tdma_callmessages[{fox_index}] is not this fox's callmessage")
+    tdma_plan = slot_plan()
+    wall_clock = WallClock()
+    print(f"TDMA: fox {fox_index + 1} of {len(tdma_callmessages)}, "
+          f"{tdma_plan.occupancy() * 100:.0f}% of the channel in use")
+
 # begin main loop
 
-while True:
+# the running transmission, the console can cancel it to stop early
+transmission = None
+prepared = None		# the next transmission, from prepare()
+stop_requested = False
+transmit_now = asyncio.Event()
+modem_ok = True
+modem_checked = 0		# monotonic_ns() of the last modem check
+modem_lock = asyncio.Lock()	# held by a modem check, and by doze() from power down to key up
+cycles = 0
+
+def prepare(song):
+    '''
+    everything a transmission needs, worked out in the idle window before it: the song table
+    (and its phrases), the ID schedule, then a garbage collection, so once PTT is
+    asserted there is nothing left to do but key the tones
+    '''
+    compiled = song_table(song)
+    schedule = id_schedule()
+    gc.collect()
+    return song, compiled, schedule
+
+async def transmit(prepared):
+    ''' one keyed transmission from prepare(): the ID then the song. PTT is always released, even when cancelled '''
+    song, compiled, schedule = prepared
+    if profile:
+        profiler.mark(KEY_UP)
     ptt.value = False 		# begin transmit
-    
-    # commented out the callsign, don't tell the FCC
-    delay(750)
-    play_morse()        # transmit the global 'callmessage'
-
-    # playing o canada because I can
-    delay(750)
-    # --- Call the next function in the list ---
-    songs[song_index]()  
-    # ------------------------------------------
-    
-    ptt.value = True 		# Put the SA868 in RX mode
-    
-    delay(transmit_delay)	# wait before next transmission
-    
-    # Move to the next function; wrap around using modulo
-    song_index = (song_index + 1) % len(songs)
+    if persistent_tone:
+        tone_start()
+    try:
+        # commented out the callsign, don't tell the FCC
+        if profile:
+            profiler.mark(PRE_ID)
+        await scheduler.sleep(ptt_lead_in)
+        if profile:
+            profiler.mark(MORSE_ID)
+        if id_mode == "afsk":
+            play_afsk(schedule=schedule)
+        else:
+            await play_morse(schedule=schedule)        # transmit the global 'callmessage'
+
+        # playing o canada because I can
+        if profile:
+            profiler.mark(GAP)
+        await scheduler.sleep(id_song_gap)
+        if profile:
+            profiler.mark(SONG)
+        await play_song(song, compiled)
+    finally:
+        if profile:
+            profiler.mark(KEY_DOWN)
+        ptt.value = True 		# Put the SA868 in RX mode
+        if persistent_tone:
+            tone_stop()			# only give the pin back once PTT is released
+        elif sound_pwm:
+            tone_off()			# cancelled in the middle of a note
+        if profile:
+            profiler.mark(END)
+        print()
+        print(scheduler.report())
+        if profile:
+            print(profiler.report())
+
+def prepare_next():
+    ''' prepare the transmission of songs[song_index], dropping the previous one first '''
+    global prepared
+    prepared = None
+    if profile:
+        profiler.begin()
+        profiler.mark(PREPARE)
+    prepared = prepare(songs[song_index])
+    if profile:
+        profiler.mark(IDLE)
+
+def next_slot():
+    ''' TDMA: pick the song of this fox's next slot, returns the monotonic_ns() time the slot starts '''
+    global song_index
+    frame, start = tdma_plan.next_slot(fox_index, wall_clock.now_ms())
+    song_index = tdma_plan.song(frame, fox_index)
+    return wall_clock.monotonic_ns(start)
+
+def doze(deadline):
+    '''
+    low_power_idle: spend the idle window up to a monotonic_ns() deadline with the SA868 powered
+    down (PD low) and the board in light sleep, waking modem_wake_ms + sleep_wake_margin before
+    it. the SA868 keeps its group and volume through a power down, so waking up is only raising
+    PD again, without a handshake (restore_modem() checks it answers). nothing else runs while
+    asleep: console commands wait for the wake up. without the alarm module the modem is still
+    powered down and the board waits awake. returns whether the modem was powered down
+    '''
+    wake_at = deadline - (modem_wake_ms + sleep_wake_margin) * 1000000
+    if transmit_now.is_set() or wake_at <= time.monotonic_ns():
+        return False
+    if profile:
+        profiler.mark(SLEEP)
+    modem.power_down()
+    if alarm:
+        while True:
+            # the alarm takes a time.monotonic() float, which gets coarser as the uptime grows,
+            # so aim from the current reading and go back to sleep if woken early
+            remaining = wake_at - time.monotonic_ns()
+            if remaining < 1000000:
+                break
+            alarm.light_sleep_until_alarms(alarm.time.TimeAlarm(monotonic_time=time.monotonic() + remaining / 1000000000))
+    else:
+        time.sleep(max(0, wake_at - time.monotonic_ns()) / 1000000000)
+    if profile:
+        profiler.mark(WAKE)
+    modem.power_up()
+    return True
 
+async def restore_modem(deadline):
+    '''
+    after a power down: one AT+DMOCONNECT exchange to see the SA868 answers, and when it doesn't,
+    its group and volume sent again. each is tried once and has to be answered before the
+    monotonic_ns() deadline the transmission keys up at, so a modem slow to come back can't make
+    it late. returns False, with modem_ok cleared, when that fails
+    '''
+    global modem_ok
+    def left():
+        return max(0, deadline - time.monotonic_ns()) / 1e9
+    try:
+        await modem.connect(retries=0, timeout=left())
+        return True
+    except SA868Error:
+        pass
+    try:
+        await modem.set_group(bandwidth, frequency, frequency, squelch, retries=0, timeout=left())
+        await modem.set_volume(volume, retries=0, timeout=left())
+    except SA868Error as e:
+        if modem_ok:
+            print(f"modem: {e} after waking up")
+        modem_ok = False
+        return False
+    if not modem_ok:
+        print("modem: responding")
+    modem_ok = True
+    return True
+
+async def wait_until(deadline):
+    '''
+    the idle window up to the next transmission's monotonic_ns() deadline, or the tx command.
+    with low_power_idle it is slept through by doze(), after a modem check if one is due (the
+    supervisor can't check while the fox sleeps), and PTT goes down no sooner than modem_wake_ms
+    and, woken on time, no later than modem_wake_ms + sleep_wake_margin after PD went up.
+    returns False when the modem couldn't be restored by then, so nothing is to be sent
+    '''
+    if not low_power_idle:
+        await scheduler.idle_until(deadline, transmit_now)
+        return True
+    async with modem_lock:
+        if time.monotonic_ns() - modem_checked >= modem_check_interval * 1000000000:
+            await check_modem()
+        ready = True
+        if doze(deadline):
+            await asyncio.sleep(modem_wake_ms / 1000)
+            ready = await restore_modem(deadline)
+        await scheduler.idle_until(deadline, transmit_now)
+    return ready
+
+async def transmit_scheduler():
+    '''
+    the fox cycle: transmit, prepare the next song, wait out the rest of transmit_delay.
+    in TDMA mode the wait is for this fox's next slot instead, and the slot picks the song
+    '''
+    global transmission, stop_requested, song_index, cycles
+    ready = True
+    if tdma_plan:
+        slot = next_slot()
+        prepare_next()
+        ready = await wait_until(slot)
+    else:
+        prepare_next()
+        scheduler.start()
+    while True:
+        if ready:
+            transmission = asyncio.create_task(transmit(prepared))
+            try:
+                await transmission
+            except asyncio.CancelledError:
+                if not stop_requested:
+                    raise
+                print("transmission stopped")
+                scheduler.start()
+            transmission = None
+            stop_requested = False
+            cycles += 1
+        else:
+            print("modem: not answering, transmission skipped")
+
+        if tdma_plan:
+            slot = next_slot()
+        else:
+            # Move to the next song; wrap around using modulo
+            song_index = (song_index + 1) % len(songs)
+
+        # get the next transmission ready in the idle window, then wait out the rest of it;
+        # the next one keys up on this deadline, not whenever the sleep happens to return
+        prepare_next()
+        if tdma_plan:
+            ready = await wait_until(slot)
+        else:
+            ready = await wait_until(scheduler.deadline + transmit_delay * 1000000)
+
+async def check_modem():
+    ''' report anything unexpected from the SA868 and check it still answers '''
+    global modem_ok, modem_checked
+    for line in modem.drain():
+        print(f"modem: unsolicited {line!r}")
+    try:
+        await modem.connect(retries=1)
+        ok = True
+    except SA868Error as e:
+        ok = False
+        error = e
+    if ok != modem_ok:
+        print("modem: responding" if ok else f"modem: {error}")
+    modem_ok = ok
+    modem_checked = time.monotonic_ns()
+
+async def modem_supervisor():
+    ''' check the SA868 every modem_check_interval between transmissions '''
+    while True:
+        await asyncio.sleep(modem_check_interval)
+        async with modem_lock:
+            if not transmission:
+                await check_modem()
+
+def stop_transmission():
+    global stop_requested
+    if transmission:
+        stop_requested = True
+        transmission.cancel()
+
+async def console():
+    global profile
+    '''
+    commands over the USB serial console, one per line:
+      stop    end the current transmission now
+      tx      start the next transmission without waiting for transmit_delay
+      status  print the fox state
+      profile on / profile off   print where each transmission's time and heap go
+    '''
+    line = ""
+    while True:
+        await asyncio.sleep(0.2)
+        while supervisor.runtime.serial_bytes_available:
+            c = sys.stdin.read(1)
+            if not c:
+                break			# nothing came after all, and "" is in any string
+            if c not in "\r\n":
+                line += c
+                continue
+            command = line.strip().lower()
+            line = ""
+            if command == "stop":
+                stop_transmission()
+            elif command == "tx":
+                transmit_now.set()
+            elif command == "status":
+                state = "transmitting" if transmission else "idle"
+                print(f"status: {state}, cycle {cycles}, next song '{songs[song_index]}', "
+                      f"modem {'ok' if modem_ok else 'NOT RESPONDING'}")
+            elif command in ("profile on", "profile off"):
+                profile = command == "profile on"
+                profiler.begin()
+                print(f"profiling {'on' if profile else 'off'}")
+            elif command:
+                print(f"unknown command '{command}', use stop, tx, status or profile on/off")
+
+async def main():
+    global modem_ok
+    modem_ok = await setup_modem()
+    print("ready")
+
+    await asyncio.gather(
+        transmit_scheduler(),
+        modem_supervisor(),
+        console(),
+    )
+
+asyncio.run(main())
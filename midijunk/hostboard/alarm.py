@@ -0,0 +1,43 @@
+'''
+    Host stand-in for CircuitPython's alarm module, the part fox.py uses:
+    alarm.time.TimeAlarm and light_sleep_until_alarms(). Light sleep moves
+    the clock on to the earliest alarm (the virtual one in the emulator),
+    then takes the modelled light_sleep_wake time, and both ends are
+    recorded in the hostclock trace.
+'''
+
+import time as _time
+import types
+
+import hostclock
+
+
+class TimeAlarm:
+    ''' an alarm at a time.monotonic() or time.time() value '''
+
+    def __init__(self, *, monotonic_time=None, epoch_time=None):
+        if (monotonic_time is None) == (epoch_time is None):
+            raise ValueError("Provide exactly one of monotonic_time and epoch_time")
+        if epoch_time is not None:
+            monotonic_time = _time.monotonic() + epoch_time - _time.time()
+        self.monotonic_time = monotonic_time
+
+
+time = types.SimpleNamespace(TimeAlarm=TimeAlarm)
+
+wake_alarm = None		# the alarm that ended the last sleep
+
+
+def light_sleep_until_alarms(*alarms):
+    ''' sleep until the first of the alarms goes off and return it '''
+    global wake_alarm
+    if not alarms:
+        raise ValueError("No alarms set")
+    first = min(alarms, key=lambda a: a.monotonic_time)
+    hostclock.record("light_sleep", until=first.monotonic_time)
+    remaining = first.monotonic_time - _time.monotonic()
+    if remaining > 0:
+        _time.sleep(remaining)
+    hostclock.record("light_sleep_wake")
+    wake_alarm = first
+    return first
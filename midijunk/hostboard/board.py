@@ -0,0 +1,28 @@
+'''
+    Host stand-in for CircuitPython's board module: the Seeed Studio XIAO
+    ESP32C3 pins. See hostclock.py.
+'''
+
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"board.{self.name}"
+
+    def __str__(self):
+        return self.name
+
+
+D0 = A0 = Pin("D0")
+D1 = A1 = Pin("D1")
+D2 = A2 = Pin("D2")
+D3 = Pin("D3")
+D4 = SDA = Pin("D4")
+D5 = SCL = Pin("D5")
+D6 = TX = Pin("D6")
+D7 = RX = Pin("D7")
+D8 = SCK = Pin("D8")
+D9 = MISO = Pin("D9")
+D10 = MOSI = Pin("D10")
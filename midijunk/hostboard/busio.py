@@ -0,0 +1,172 @@
+'''
+    Host stand-in for CircuitPython's busio, for running the fox code on Linux.
+    Put this directory on sys.path ahead of everything else (emulate.py
+    does this, along with the virtual clock, see hostclock.py):
+
+        PYTHONPATH=hostboard python3 ...
+
+    UART behaves as if an SA868 sits on the other end: every complete
+    "AT+..." command line written to it is answered with the matching
+    "+NAME:code\r\n" line once `latency` seconds have passed on
+    time.monotonic(). Faults can be injected to exercise retries:
+
+        uart.drop = 2                   # ignore the next two commands
+        uart.fail["DMOSETGROUP"] = 1    # answer DMOSETGROUP with code 1
+        uart.powered = False            # powered down modem, no answers
+
+    The modem also follows the badge's PD pin (D4): while it is low nothing
+    is answered, and after it goes high again the modem takes `wake_time`
+    seconds to answer. Its settings are kept through a power down.
+'''
+
+import time
+
+import hostclock
+
+
+class SA868Responder:
+    ''' the modem side of the fake UART '''
+
+    def __init__(self, latency=0.02, pd_pin="D4", wake_time=0.05):
+        self.latency = latency
+        self.pd_pin = pd_pin
+        self.wake_time = wake_time
+        self.powered = True
+        self.drop = 0
+        self.fail = {}
+        self.commands = []		# (monotonic time, command) for everything received
+        self.group = None
+        self.volume = None
+        self.connected = False
+
+    def answer(self, command):
+        ''' the reply line for one command, or None for no reply '''
+        self.commands.append((time.monotonic(), command))
+        if not self.awake() or not command.startswith("AT+"):
+            return None
+        if self.drop:
+            self.drop -= 1
+            return None
+        name, _, args = command[3:].partition("=")
+        code = self.fail.get(name)
+        if code is None:
+            code = self.execute(name, args)
+        if code is None:
+            return None
+        return f"+{name}:{code}"
+
+    def awake(self):
+        ''' powered, and PD neither low nor raised less than wake_time ago '''
+        if not self.powered:
+            return False
+        level, since = hostclock.levels.get(self.pd_pin, (True, None))
+        return level and (since is None or time.monotonic() - since >= self.wake_time)
+
+    def execute(self, name, args):
+        if name == "DMOCONNECT":
+            self.connected = True
+            return 0
+        if name == "DMOSETGROUP":
+            fields = args.split(",")
+            try:
+                bandwidth, tx, rx = int(fields[0]), float(fields[1]), float(fields[2])
+                squelch = int(fields[4])
+            except (IndexError, ValueError):
+                return 1
+            if bandwidth not in (0, 1) or not 0 <= squelch <= 8 or len(fields) != 6:
+                return 1
+            if not (134 <= tx <= 174 or 400 <= tx <= 480) or not (134 <= rx <= 174 or 400 <= rx <= 480):
+                return 1
+            self.group = fields
+            return 0
+        if name == "DMOSETVOLUME":
+            try:
+                volume = int(args)
+            except ValueError:
+                return 1
+            if not 1 <= volume <= 8:
+                return 1
+            self.volume = volume
+            return 0
+        return None
+
+
+class UART:
+    def __init__(self, tx=None, rx=None, *, baudrate=9600, timeout=1.0, latency=0.02, responder=None):
+        self.tx = tx
+        self.rx = rx
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.responder = responder or SA868Responder(latency)
+        self.written = []		# (monotonic time, bytes) of every write
+        self._line = bytearray()
+        self._pending = []		# (ready at, bytes) replies not yet readable
+        self._rx = bytearray()
+
+    # fault injection goes straight to the modem side
+    @property
+    def powered(self):
+        return self.responder.powered
+
+    @powered.setter
+    def powered(self, value):
+        self.responder.powered = value
+
+    @property
+    def drop(self):
+        return self.responder.drop
+
+    @drop.setter
+    def drop(self, value):
+        self.responder.drop = value
+
+    @property
+    def fail(self):
+        return self.responder.fail
+
+    def write(self, data):
+        now = time.monotonic()
+        self.written.append((now, bytes(data)))
+        hostclock.record("uart_write", data=bytes(data).decode("ascii", "replace"))
+        self._line.extend(data)
+        while True:
+            end = self._line.find(b"\r\n")
+            if end < 0:
+                break
+            command = bytes(self._line[:end]).decode("ascii", "replace").strip()
+            self._line = self._line[end + 2:]
+            reply = self.responder.answer(command)
+            if reply is not None:
+                self._pending.append((now + self.responder.latency, f"{reply}\r\n".encode("ascii")))
+        return len(data)
+
+    def _deliver(self):
+        now = time.monotonic()
+        while self._pending and self._pending[0][0] <= now:
+            self._rx.extend(self._pending.pop(0)[1])
+
+    @property
+    def in_waiting(self):
+        self._deliver()
+        return len(self._rx)
+
+    def read(self, nbytes=None):
+        self._deliver()
+        if not self._rx:
+            return None
+        if nbytes is None:
+            nbytes = len(self._rx)
+        data = bytes(self._rx[:nbytes])
+        self._rx = self._rx[nbytes:]
+        return data
+
+    def reset_input_buffer(self):
+        self._deliver()
+        self._rx = bytearray()
+
+    def inject(self, data):
+        ''' make unsolicited bytes from the modem readable straight away '''
+        self._rx.extend(data)
+
+    def deinit(self):
+        pass
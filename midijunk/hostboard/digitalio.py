@@ -0,0 +1,74 @@
+'''
+    Host stand-in for CircuitPython's digitalio. Every DigitalInOut creation,
+    teardown and level change is recorded in the hostclock trace.
+'''
+
+import time
+
+import hostclock
+
+
+class Direction:
+    INPUT = "INPUT"
+    OUTPUT = "OUTPUT"
+
+
+class Pull:
+    UP = "UP"
+    DOWN = "DOWN"
+
+
+class DriveMode:
+    PUSH_PULL = "PUSH_PULL"
+    OPEN_DRAIN = "OPEN_DRAIN"
+
+
+class DigitalInOut:
+    def __init__(self, pin):
+        hostclock.claim(pin)
+        self._pin = pin
+        self._value = None		# nothing written yet
+        self.direction = Direction.INPUT
+        self.pull = None
+        self.drive_mode = DriveMode.PUSH_PULL
+        self._deinited = False
+        hostclock.record("dio_init", pin=str(pin))
+
+    def _check(self):
+        if self._deinited:
+            raise ValueError("Object has been deinitialized and can no longer be used. Create a new object.")
+
+    @property
+    def value(self):
+        self._check()
+        return bool(self._value)
+
+    @value.setter
+    def value(self, value):
+        self._check()
+        value = bool(value)
+        if value is not self._value:
+            hostclock.levels[str(self._pin)] = (value, None if self._value is None else time.monotonic())
+            self._value = value
+            hostclock.record("pin", pin=str(self._pin), value=value)
+
+    def switch_to_output(self, value=False, drive_mode=DriveMode.PUSH_PULL):
+        self.direction = Direction.OUTPUT
+        self.drive_mode = drive_mode
+        self.value = value
+
+    def switch_to_input(self, pull=None):
+        self.direction = Direction.INPUT
+        self.pull = pull
+
+    def deinit(self):
+        if not self._deinited:
+            self._deinited = True
+            hostclock.release(self._pin)
+            hostclock.record("dio_deinit", pin=str(self._pin))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.deinit()
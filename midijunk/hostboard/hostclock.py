@@ -0,0 +1,142 @@
+'''
+    Shared state for the host stand-ins in this directory: the virtual clock
+    the emulator (emulate.py) runs the firmware on, the trace every
+    peripheral call is recorded into, the modelled cost of those calls, and
+    which pins are in use.
+
+    Outside the emulator nothing is installed: the stand-ins run on the real
+    clock and record nothing.
+'''
+
+import math
+
+
+class EmulationFinished(Exception):
+    ''' the virtual clock reached the end of the emulated run '''
+
+
+class VirtualClock:
+    ''' nanoseconds since the emulated board booted, moved on only by sleeps and modelled costs '''
+
+    def __init__(self, limit_ns=None, epoch=1700000000):
+        self.now_ns = 0
+        self.limit_ns = limit_ns
+        self.epoch = epoch			# what time.time() reads at boot
+        self.finished = False
+
+    def monotonic_ns(self):
+        # reading the clock takes time too, which is what moves a busy wait along
+        self.now_ns += COSTS["clock_read"] * 1000
+        return self.now_ns
+
+    def monotonic(self):
+        return self.now_ns / 1000000000
+
+    def time(self):
+        return self.epoch + self.now_ns // 1000000000
+
+    def advance(self, ns):
+        if ns > 0:
+            self.now_ns += ns
+
+    def sleep(self, seconds):
+        self.advance(math.ceil(seconds * 1000000000))
+        self.check()
+
+    def check(self):
+        ''' raises EmulationFinished the first time the clock passes the limit '''
+        if not self.finished and self.limit_ns is not None and self.now_ns >= self.limit_ns:
+            self.finished = True
+            raise EmulationFinished
+
+
+class Trace:
+    ''' timestamped peripheral events: (time in ns, kind, details) '''
+
+    def __init__(self):
+        self.events = []
+        self.counts = {}
+
+    def record(self, kind, **details):
+        self.events.append((clock.now_ns, kind, details))
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+
+# modelled time in microseconds each peripheral operation takes on the ESP32C3.
+# rough figures; the point is that churn shows up as time, emulate.py --cost overrides them
+COSTS = {
+    "pwm_init": 300,
+    "pwm_deinit": 100,
+    "pwm_frequency": 20,
+    "pwm_duty": 5,
+    "dio_init": 50,
+    "dio_deinit": 20,
+    "pin": 2,
+    "uart_write": 50,
+    "console_char": 10,
+    "gc_collect": 10000,
+    "clock_read": 5,
+    "light_sleep_wake": 1000,
+}
+
+clock = None
+trace = None
+
+
+def install(new_clock, new_trace, costs=None):
+    global clock, trace
+    clock = new_clock
+    trace = new_trace
+    levels.clear()		# a fresh board, nothing driven yet
+    if costs:
+        COSTS.update(costs)
+
+
+def record(kind, **details):
+    ''' note a peripheral event and spend its modelled time, when the emulator is running '''
+    if trace is not None:
+        trace.record(kind, **details)
+        clock.advance(COSTS.get(kind, 0) * 1000)
+
+
+# pins are exclusive, like on the board: using a pin that is still in use is an error
+_claimed = set()
+
+# pin name -> (level, time.monotonic() it was set, None for the first level after boot),
+# for the stand-ins of parts wired to the pins (busio's SA868 watches PD)
+levels = {}
+
+
+def claim(pin):
+    if pin in _claimed:
+        raise ValueError(f"{pin} in use")
+    _claimed.add(pin)
+
+
+def release(pin):
+    _claimed.discard(pin)
+
+
+class ConsoleInput:
+    ''' stand-in for sys.stdin on the USB serial console, fed with (time in ns, text) entries '''
+
+    def __init__(self, script=()):
+        self.script = sorted(script)
+        self.buffer = ""
+
+    def _deliver(self):
+        now = clock.now_ns if clock else 0
+        while self.script and self.script[0][0] <= now:
+            self.buffer += self.script.pop(0)[1]
+
+    def available(self):
+        self._deliver()
+        return len(self.buffer)
+
+    def read(self, n=1):
+        self._deliver()
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+
+console = ConsoleInput()
@@ -0,0 +1,65 @@
+'''
+    Host stand-in for CircuitPython's pwmio. PWMOut creation, teardown,
+    frequency and duty cycle changes are recorded in the hostclock trace.
+'''
+
+import hostclock
+
+
+class PWMOut:
+    def __init__(self, pin, *, duty_cycle=0, frequency=500, variable_frequency=False):
+        if not 0 <= duty_cycle <= 65535:
+            raise ValueError("duty_cycle must be 0-65535")
+        if frequency <= 0:
+            raise ValueError("Invalid PWM frequency")
+        hostclock.claim(pin)
+        self._pin = pin
+        self._duty_cycle = duty_cycle
+        self._frequency = int(frequency)
+        self.variable_frequency = variable_frequency
+        self._deinited = False
+        hostclock.record("pwm_init", pin=str(pin), frequency=self._frequency, duty=duty_cycle)
+
+    def _check(self):
+        if self._deinited:
+            raise ValueError("Object has been deinitialized and can no longer be used. Create a new object.")
+
+    @property
+    def duty_cycle(self):
+        self._check()
+        return self._duty_cycle
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        self._check()
+        if not 0 <= value <= 65535:
+            raise ValueError("duty_cycle must be 0-65535")
+        self._duty_cycle = int(value)
+        hostclock.record("pwm_duty", pin=str(self._pin), duty=self._duty_cycle)
+
+    @property
+    def frequency(self):
+        self._check()
+        return self._frequency
+
+    @frequency.setter
+    def frequency(self, value):
+        self._check()
+        if not self.variable_frequency:
+            raise AttributeError("PWM frequency not writable when variable_frequency is False.")
+        if value <= 0:
+            raise ValueError("Invalid PWM frequency")
+        self._frequency = int(value)
+        hostclock.record("pwm_frequency", pin=str(self._pin), frequency=self._frequency)
+
+    def deinit(self):
+        if not self._deinited:
+            self._deinited = True
+            hostclock.release(self._pin)
+            hostclock.record("pwm_deinit", pin=str(self._pin))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.deinit()
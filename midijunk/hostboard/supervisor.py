@@ -0,0 +1,23 @@
+'''
+    Host stand-in for CircuitPython's supervisor: the USB serial console input
+    comes from hostclock.console, which the emulator fills from --console.
+'''
+
+import hostclock
+
+
+class _Runtime:
+    @property
+    def serial_bytes_available(self):
+        return hostclock.console.available()
+
+    @property
+    def serial_connected(self):
+        return True
+
+
+runtime = _Runtime()
+
+
+def reload():
+    raise SystemExit("supervisor.reload()")
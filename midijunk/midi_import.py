@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Converts Standard MIDI Files into the fox melody format, the same
+(midi_note, duration_in_32nds) pairs and <name>_tempo that rtttl.py writes.
+
+    python3 midi_import.py song.mid
+    python3 midi_import.py song.mid --track 2 --packed
+    python3 midi_import.py --batch midi_archive/ -o songs.py --bin-dir melodies -j 8
+
+The file is memory-mapped and its track chunks are decoded as streams
+(running status, meta and sysex events included) and merged in time order,
+so memory stays bounded by the number of tracks and sounding notes, not the
+file size. Tempo changes anywhere in the file are followed when converting
+ticks to time. The polyphony is reduced to one line, the highest sounding
+note by default (drums on channel 10 left out), or only the notes of one
+--track. The result is quantized to 32nds at the file's first tempo, or at
+--tempo.
+"""
+import argparse
+import functools
+import heapq
+import mmap
+import multiprocessing
+import os
+import sys
+
+from rtttl import (format_melody_list, format_packed_melody, make_melody_file,
+                   print_batch_summary, write_batch_module)
+
+MIDI_SUFFIXES = (".mid", ".midi", ".smf", ".kar")
+DRUM_CHANNEL = 9
+DEFAULT_TEMPO_US = 500000		# 120 bpm, until the file says otherwise
+
+# event kinds, in the order events at the same tick are applied
+TEMPO, NOTE_OFF, NOTE_ON = 0, 1, 2
+
+# data bytes following each channel message status (high nibble)
+_DATA_LENGTH = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+
+
+class MidiError(ValueError):
+    """ the file isn't a Standard MIDI File this importer can read """
+
+
+def _read_vlq(data, pos, end):
+    value = 0
+    while pos < end:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+    raise MidiError("truncated variable length quantity")
+
+
+def read_header(data):
+    """ (format, number of tracks, division, offset of the first chunk after the header) """
+    if len(data) < 14 or data[0:4] != b"MThd":
+        raise MidiError("not a Standard MIDI File (no MThd chunk)")
+    length = int.from_bytes(data[4:8], "big")
+    fmt = int.from_bytes(data[8:10], "big")
+    ntracks = int.from_bytes(data[10:12], "big")
+    division = int.from_bytes(data[12:14], "big")
+    return fmt, ntracks, division, 8 + length
+
+
+def iter_track_chunks(data, pos):
+    """ yields (track number, start, end) of every MTrk chunk, skipping unknown chunks """
+    track = 0
+    size = len(data)
+    while pos + 8 <= size:
+        kind = data[pos:pos + 4]
+        length = int.from_bytes(data[pos + 4:pos + 8], "big")
+        start = pos + 8
+        end = min(start + length, size)		# tolerate a truncated last chunk
+        if kind == b"MTrk":
+            yield track, start, end
+            track += 1
+        pos = start + length
+
+
+def iter_track_events(data, start, end, track):
+    """
+    Streams the events of one track chunk as (tick, kind, track, value, channel)
+    where value is the key for notes and microseconds per quarter for tempo.
+    Events nobody here cares about are decoded and skipped.
+    """
+    pos = start
+    tick = 0
+    status = 0
+    while pos < end:
+        delta, pos = _read_vlq(data, pos, end)
+        tick += delta
+        if pos >= end:
+            break
+        byte = data[pos]
+        if byte >= 0x80:
+            pos += 1
+            if byte < 0xF0:
+                status = byte
+        elif not status:
+            raise MidiError(f"track {track}: data byte without a running status at offset {pos}")
+        else:
+            byte = status			# running status, this byte is already data
+
+        if byte == 0xFF:				# meta event
+            status = 0
+            if pos >= end:
+                break
+            meta = data[pos]
+            length, pos = _read_vlq(data, pos + 1, end)
+            if meta == 0x51 and length == 3:
+                yield tick, TEMPO, track, int.from_bytes(data[pos:pos + 3], "big"), None
+            elif meta == 0x2F:
+                return
+            pos += length
+        elif byte in (0xF0, 0xF7):		# sysex
+            status = 0
+            length, pos = _read_vlq(data, pos, end)
+            pos += length
+        elif byte >= 0xF0:
+            # system common / real time messages have no place in a file, skip what we know
+            pos += {0xF1: 1, 0xF2: 2, 0xF3: 1}.get(byte, 0)
+        else:
+            kind = byte >> 4
+            channel = byte & 0x0F
+            count = _DATA_LENGTH[kind]
+            if pos + count > end:
+                break
+            if any(b > 0x7F for b in data[pos:pos + count]):
+                raise MidiError(f"track {track}: status byte where data was expected at offset {pos}")
+            if kind == 0x9 and data[pos + 1]:
+                yield tick, NOTE_ON, track, data[pos], channel
+            elif kind == 0x8 or kind == 0x9:
+                yield tick, NOTE_OFF, track, data[pos], channel
+            pos += count
+
+
+def monophonic_segments(data, track=None, drums=False):
+    """
+    Streams the file as a single line of (start seconds, key) segments, key 0
+    for silence, ending with a (end seconds, None) marker. Keeps the highest
+    sounding key (or the notes of one track), a key struck again starts a new
+    segment. Also returns the first tempo in microseconds per quarter.
+    """
+    fmt, ntracks, division, pos = read_header(data)
+    if division & 0x8000:
+        # SMPTE time: ticks per second rather than per quarter note
+        frames = 256 - (division >> 8)
+        ticks_per_second = frames * (division & 0xFF)
+        ticks_per_quarter = None
+    else:
+        ticks_per_quarter = division
+        if not ticks_per_quarter:
+            raise MidiError("division of 0 ticks per quarter note")
+
+    streams = [iter_track_events(data, start, end, number) for number, start, end in iter_track_chunks(data, pos)]
+    events = heapq.merge(*streams, key=lambda event: (event[0], event[1]))
+
+    tempo = None
+    first_tempo = None
+    last_tick = 0
+    seconds = 0.0
+    sounding = [0] * 128		# note-on count per key
+    top = 0
+    restruck = False
+    segments = []
+
+    def advance(to_tick):
+        nonlocal last_tick, seconds
+        if ticks_per_quarter:
+            seconds += (to_tick - last_tick) * (tempo or DEFAULT_TEMPO_US) / 1e6 / ticks_per_quarter
+        else:
+            seconds += (to_tick - last_tick) / ticks_per_second
+        last_tick = to_tick
+
+    def settle():
+        # after all the events of one tick: what is on top now
+        nonlocal top, restruck
+        new_top = 0
+        for key in range(127, 0, -1):
+            if sounding[key]:
+                new_top = key
+                break
+        if new_top != top or (restruck and new_top):
+            segments.append((seconds, new_top))
+            top = new_top
+        restruck = False
+
+    pending_tick = None
+    for tick, kind, number, value, channel in events:
+        if tick != pending_tick:
+            if pending_tick is not None:
+                settle()
+            advance(tick)
+            pending_tick = tick
+
+        if kind == TEMPO:
+            tempo = value
+            if first_tempo is None:
+                first_tempo = value
+            continue
+        if track is not None and number != track:
+            continue
+        if channel == DRUM_CHANNEL and not drums:
+            continue
+        if kind == NOTE_ON:
+            sounding[value] += 1
+            if value >= top:
+                restruck = restruck or value == top
+        elif sounding[value]:
+            sounding[value] -= 1
+
+    if pending_tick is not None:
+        settle()
+    segments.append((seconds, None))
+    return segments, first_tempo or DEFAULT_TEMPO_US
+
+
+def quantize(segments, bpm):
+    """
+    (start seconds, key) segments to (midi_note, duration_in_32nds) pairs at bpm,
+    without leading or trailing silence. Boundaries are rounded, not durations,
+    so rounding never accumulates; durations over 255 are split for the packed format.
+    """
+    thirtysecond = 7.5 / bpm
+    melody = []
+    for (start, key), (end, _) in zip(segments, segments[1:]):
+        if not melody and not key:
+            continue
+        duration = round(end / thirtysecond) - round(start / thirtysecond)
+        while duration > 0:
+            piece = min(duration, 255)
+            melody.append((key, piece))
+            duration -= piece
+    while melody and melody[-1][0] == 0:
+        melody.pop()
+    return melody
+
+
+def convert_file(path, track=None, drums=False, tempo=None):
+    """ a MIDI file as (melody, bpm) """
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            segments, first_tempo = monophonic_segments(data, track, drums)
+    bpm = tempo or max(1, round(60000000 / first_tempo))
+    return quantize(segments, bpm), bpm
+
+
+def tune_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _convert_one(path, track=None, drums=False, tempo=None, packed=False):
+    """ worker: one file as a rtttl.convert_batch style result, failures returned instead of raised """
+    try:
+        melody, bpm = convert_file(path, track, drums, tempo)
+        if not melody:
+            raise MidiError("no notes")
+        if packed:
+            data = make_melody_file(melody, bpm)
+            value = format_packed_melody(data[2:])
+        else:
+            data = None
+            value = format_melody_list(melody)
+    except (ValueError, OSError) as e:
+        return path, None, None, None, None, str(e)
+    except Exception as e:  # a bug in one file must not take the whole run down
+        return path, None, None, None, None, f"{type(e).__name__}: {e}"
+    return path, tune_name(path), value, bpm, data, None
+
+
+def iter_midi_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(MIDI_SUFFIXES):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def convert_batch(paths, jobs=None, chunksize=4, **options):
+    """ converts MIDI files over a process pool, yielding results in input order """
+    convert = functools.partial(_convert_one, **options)
+    if jobs == 1:
+        yield from map(convert, iter_midi_files(paths))
+        return
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(convert, iter_midi_files(paths), chunksize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", metavar="PATH", help="MIDI files, or directories with --batch")
+    parser.add_argument("--batch", action="store_true", help="convert everything into one module over a process pool")
+    parser.add_argument("--track", type=int, help="take the melody from this track only (0 is the first)")
+    parser.add_argument("--drums", action="store_true", help="don't leave out channel 10")
+    parser.add_argument("--tempo", type=int, help="quantize at this b= tempo instead of the file's first tempo")
+    parser.add_argument("--packed", action="store_true", help="emit packed bytes instead of tuple lists")
+    parser.add_argument("--bin-dir", help="also write each melody to <dir>/<name>.bin (implies --packed)")
+    parser.add_argument("-o", "--output", help="module to write to (default stdout)")
+    parser.add_argument("-j", "--jobs", type=int, default=None)
+    args = parser.parse_args()
+
+    options = {"track": args.track, "drums": args.drums, "tempo": args.tempo,
+               "packed": args.packed or bool(args.bin_dir)}
+    if args.bin_dir:
+        os.makedirs(args.bin_dir, exist_ok=True)
+    jobs = args.jobs if args.batch else 1
+    results = convert_batch(args.paths, jobs=jobs, **options)
+    if args.output and args.output != "-":
+        with open(args.output, "w", encoding="utf-8") as out:
+            converted, failures = write_batch_module(results, out, args.bin_dir)
+    else:
+        converted, failures = write_batch_module(results, sys.stdout, args.bin_dir)
+    print_batch_summary(converted, failures)
+    sys.exit(0 if converted or not failures else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# Morse code for the fox ID, shared by fox.py on the badge and the host tools
+# copy this next to fox.py on the badge
+
+'''
+    /*
+       * short mark, dot or "dit" (.): "dot duration" is one time unit long      
+       * longer mark, dash or "dah" (-): three time units long
+       * inter-element gap between the dots and dashes within a character: one dot duration or one unit long
+       * short gap (between letters): three time units long      
+       * medium gap (between words): seven time units long
+    */
+
+    A message is compiled once into a keying schedule: an array of
+    alternating key down / key up durations in microseconds, starting with
+    key down (0 when the message starts with a gap). Consecutive gaps are
+    merged, so playing it back is one tone_on/tone_off and two sleeps per
+    element. The unit is 1200 / wpm ms (the PARIS standard word).
+
+    With Farnsworth timing the characters are sent at `wpm` but the gaps
+    between letters and words are stretched so the overall speed is
+    `farnsworth_wpm` (ARRL formula).
+'''
+
+from array import array
+
+morse_map = {
+    'a': ".-",
+    'b': "-...",
+    'c': "-.-.",
+    'd': "-..",
+    'e': ".",
+    'f': "..-.",
+    'g': "--.",
+    'h': "....",
+    'i': "..",
+    'j': ".---",
+    'k': "-.-",
+    'l': ".-..",
+    'm': "--",
+    'n': "-.",
+    'o': "---",
+    'p': ".--.",
+    'q': "--.-",
+    'r': ".-.",
+    's': "...",
+    't': "-",
+    'u': "..-",
+    'v': "...-",
+    'w': ".--",
+    'x': "-..-",
+    'y': "-.--",
+    'z': "--..", 
+    '0': "-----",
+    '1': ".----",
+    '2': "..---",
+    '3': "...--",
+    '4': "....-",
+    '5': ".....",
+    '6': "-....",
+    '7': "--...",
+    '8': "---..",
+    '9': "----.",
+    '.': ".-.-.-",
+    ',': "--..--",
+    '?': "..--..",
+    "'": ".----.",
+    '!': "-.-.--",
+    '/': "-..-.",
+    '(': "-.--.",
+    ')': "-.--.-",
+    '&': ".-...",
+    ':': "---...",
+    ';': "-.-.-.",
+    '=': "-...-",
+    '+': ".-.-.",
+    '-': "-....-",
+    '_': "..--.-",
+    '"': ".-..-.",
+    '$': "...-..-",
+    '@': ".--.-."
+}
+
+
+def unit_us(wpm):
+    ''' the length of a dot in microseconds '''
+    return (1200000 + wpm // 2) // wpm
+
+
+def gaps_us(wpm, farnsworth_wpm=0):
+    ''' (letter gap, word gap) in microseconds, stretched for Farnsworth timing when it is slower '''
+    unit = unit_us(wpm)
+    if not farnsworth_wpm or farnsworth_wpm >= wpm:
+        return 3 * unit, 7 * unit
+    # total extra delay per standard word, spread 3:7 over the 19 units of spacing it holds
+    delay = (60 * wpm - 37.2 * farnsworth_wpm) / (wpm * farnsworth_wpm) * 1000000
+    return int(3 * delay / 19), int(7 * delay / 19)
+
+
+def compile_morse(message, wpm=12, farnsworth_wpm=0):
+    ''' the keying schedule for a message, see above. characters without a Morse code are skipped '''
+    unit = unit_us(wpm)
+    letter_gap, word_gap = gaps_us(wpm, farnsworth_wpm)
+    schedule = array('L')
+
+    for c in message:
+        if c == ' ':
+            gap = word_gap - letter_gap		# we already waited a letter gap after the character
+            if schedule:
+                schedule[-1] += gap
+            else:
+                schedule.append(0)
+                schedule.append(gap)
+            continue
+
+        morse = morse_map.get(c.lower(), None)
+        if morse is None:
+            continue
+
+        for mark in morse:
+            schedule.append(unit if mark == '.' else 3 * unit)
+            schedule.append(unit)
+        schedule[-1] += letter_gap - unit		# we already waited a unit after the last mark
+
+    return schedule
+
+
+def schedule_us(schedule):
+    ''' the total length of a keying schedule in microseconds '''
+    total = 0
+    for duration in schedule:
+        total += duration
+    return total
+
+
+_cache = {}
+
+def morse_schedule(message, wpm=12, farnsworth_wpm=0):
+    ''' compile_morse, but each message is only compiled once '''
+    key = (message, wpm, farnsworth_wpm)
+    schedule = _cache.get(key)
+    if schedule is None:
+        schedule = _cache[key] = compile_morse(message, wpm, farnsworth_wpm)
+    return schedule
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Renders melodies and the Morse ID to WAV on the host, to preview tunes
+without flashing a badge and keying a radio.
+
+    python3 render.py "Wannabe:d=4,o=5,b=125:16g,16g,..." -o wannabe.wav
+    python3 render.py --morse "VE6MOG/W4 DECOY" -o id.wav
+    python3 render.py --afsk "VE6MOG/W4 DECOY" -o packet.wav
+    python3 render.py --batch ringtones.txt --out-dir wavs -j 8
+
+The sound is the same model as tone_on in fox.py: a 50% duty square wave at
+the integer PWM frequency of each note, silence for rests, timed the way
+fox.py times songs (a 32nd note is 7500 / tempo ms). --attack / --release
+add a linear envelope to each note to take the clicks off. The AFSK ID keeps
+one PWM running and only changes its frequency, so its phase carries on
+from one tone to the next.
+
+The whole tune is synthesized at once with NumPy, no per-sample Python loop.
+"""
+import argparse
+import functools
+import multiprocessing
+import os
+import sys
+import wave
+
+import numpy as np
+
+from afsk import afsk_schedule
+from morse import compile_morse
+from rtttl import iter_sources, melody_var_name, rttl_to_midi_tuples
+
+RATE = 22050
+
+# the integer PWM frequency of every MIDI note, as fox.py's NOTE_FREQUENCIES
+NOTE_FREQUENCIES = np.array([0] + [int(440.0 * (2 ** ((note - 69) / 12.0))) for note in range(1, 128)])
+
+
+def render_events(frequencies, durations, rate=RATE, attack=0.0, release=0.0, amplitude=0.5, continuous=False):
+    """
+    Synthesizes a sequence of square wave tones as float32 samples.
+
+    frequencies (Hz, 0 for silence) and durations (seconds) are equal length
+    sequences. Note boundaries are placed on the rounded running total, so
+    the length of the whole piece doesn't drift with rounding. With
+    continuous the phase runs on across tones instead of restarting.
+    """
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+    boundaries = np.rint(np.concatenate(([0.0], np.cumsum(durations))) * rate).astype(np.int64)
+    counts = np.diff(boundaries)
+    total = int(boundaries[-1])
+    if total <= 0:
+        return np.zeros(0, dtype=np.float32)
+
+    # per sample: its note's frequency, and the sample's position within its note
+    frequency = np.repeat(frequencies, counts)
+    position = np.arange(total, dtype=np.int64) - np.repeat(boundaries[:-1], counts)
+
+    if continuous:
+        phase = np.mod(np.cumsum(frequency / rate) - frequency / rate, 1.0)
+    else:
+        # the phase starts over at every tone. a simplification: fox.py keeps one PWM running
+        # through a song (persistent_tone) and where its period is at a frequency change depends
+        # on the PWM hardware, which makes a click at most and is not modelled here
+        phase = np.mod(position * frequency / rate, 1.0)
+    samples = np.where(phase < 0.5, amplitude, -amplitude)
+    samples[frequency == 0] = 0.0
+
+    if attack > 0 or release > 0:
+        length = np.repeat(counts, counts)
+        envelope = np.ones(total)
+        if attack > 0:
+            envelope = np.minimum(envelope, (position + 1) / (attack * rate))
+        if release > 0:
+            envelope = np.minimum(envelope, (length - position) / (release * rate))
+        samples *= envelope
+
+    return samples.astype(np.float32)
+
+
+def melody_events(melody, tempo):
+    """ (frequencies, durations in seconds) for (midi_note, duration_in_32nds) pairs """
+    melody = np.asarray(melody, dtype=np.int64).reshape(-1, 2)
+    frequencies = NOTE_FREQUENCIES[melody[:, 0]]
+    durations = (melody[:, 1] * 7500 // tempo) / 1000.0
+    return frequencies, durations
+
+
+def morse_events(message, wpm=12, farnsworth_wpm=0, tone=800):
+    """ (frequencies, durations in seconds) for the keying of a Morse message """
+    schedule = np.asarray(compile_morse(message, wpm, farnsworth_wpm), dtype=np.float64)
+    frequencies = np.zeros(len(schedule))
+    frequencies[0::2] = tone
+    return frequencies, schedule / 1e6
+
+
+def afsk_events(message, **frame):
+    """ (frequencies, durations in seconds) for the AFSK ID frame of a message, see afsk.py """
+    schedule = np.asarray(afsk_schedule(message, **frame), dtype=np.float64)
+    return schedule[0::2], schedule[1::2] / 1e6
+
+
+def render_melody(melody, tempo, rate=RATE, **shape):
+    return render_events(*melody_events(melody, tempo), rate=rate, **shape)
+
+
+def render_morse(message, wpm=12, farnsworth_wpm=0, tone=800, rate=RATE, **shape):
+    return render_events(*morse_events(message, wpm, farnsworth_wpm, tone), rate=rate, **shape)
+
+
+def render_afsk(message, rate=RATE, **frame):
+    return render_events(*afsk_events(message, **frame), rate=rate, continuous=True)
+
+
+def write_wav(path, samples, rate=RATE):
+    """ writes float samples in -1..1 as a mono 16 bit WAV file """
+    pcm = np.clip(np.asarray(samples) * 32767.0, -32768, 32767).astype("<i2")
+    with open(path, "wb") as out, wave.open(out, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(pcm.tobytes())
+
+
+def read_wav(path):
+    """ a mono 16 bit WAV file as (float samples in -1..1, rate) """
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16 bit WAV files are supported")
+        channels = f.getnchannels()
+        rate = f.getframerate()
+        data = np.frombuffer(f.readframes(f.getnframes()), dtype="<i2")
+    if channels > 1:
+        data = data.reshape(-1, channels).mean(axis=1)
+    return data.astype(np.float32) / 32768.0, rate
+
+
+def _render_one(item, out_dir, rate, shape):
+    """ worker: render one tune to <out_dir>/<index>_<name>.wav, returning the failure instead of raising it """
+    index, (location, rttl_string) = item
+    try:
+        parsed, tune_name, d, o, b = rttl_to_midi_tuples(rttl_string)
+        samples = render_melody(parsed, b, rate=rate, **shape)
+        name = "".join(c if c.isalnum() or c in "_-" else "_" for c in melody_var_name(tune_name)) or "tune"
+        path = os.path.join(out_dir, f"{index:05d}_{name}.wav")
+        write_wav(path, samples, rate)
+    except (ValueError, OSError) as e:
+        return location, None, str(e)
+    return location, path, None
+
+
+def render_batch(paths, out_dir, jobs=None, chunksize=8, rate=RATE, **shape):
+    """ renders every tune in the collections over a process pool, returns (rendered, failures) """
+    os.makedirs(out_dir, exist_ok=True)
+    render = functools.partial(_render_one, out_dir=out_dir, rate=rate, shape=shape)
+    rendered = 0
+    failures = []
+    if jobs == 1:
+        results = map(render, enumerate(iter_sources(paths)))
+    else:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap(render, enumerate(iter_sources(paths)), chunksize)
+    try:
+        for location, path, error in results:
+            if error is None:
+                rendered += 1
+            else:
+                failures.append((location, error))
+    finally:
+        if jobs != 1:
+            pool.close()
+            pool.join()
+    return rendered, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("rttl", nargs="?", help="an RTTTL string to render")
+    parser.add_argument("--morse", metavar="MESSAGE", help="render the Morse keying of a message instead")
+    parser.add_argument("--afsk", metavar="MESSAGE", help="render the AFSK ID frame of a message instead")
+    parser.add_argument("--wpm", type=int, default=12)
+    parser.add_argument("--farnsworth-wpm", type=int, default=0)
+    parser.add_argument("--tone", type=int, default=800, help="Morse tone in Hz")
+    parser.add_argument("--batch", nargs="+", metavar="PATH", help="render every tune in these collections")
+    parser.add_argument("--out-dir", default="wavs", help="where --batch writes its WAV files")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes for --batch")
+    parser.add_argument("-o", "--output", default="out.wav")
+    parser.add_argument("--rate", type=int, default=RATE, help="sample rate")
+    parser.add_argument("--attack", type=float, default=0.0, help="note attack in seconds")
+    parser.add_argument("--release", type=float, default=0.0, help="note release in seconds")
+    args = parser.parse_args()
+    shape = {"attack": args.attack, "release": args.release}
+
+    if args.batch:
+        rendered, failures = render_batch(args.batch, args.out_dir, args.jobs, rate=args.rate, **shape)
+        print(f"rendered {rendered} of {rendered + len(failures)} tunes into {args.out_dir}, "
+              f"{len(failures)} failed", file=sys.stderr)
+        for location, error in failures:
+            print(f"  FAILED {location}: {error}", file=sys.stderr)
+        sys.exit(0 if rendered or not failures else 1)
+
+    if args.afsk:
+        samples = render_afsk(args.afsk, rate=args.rate)
+    elif args.morse:
+        samples = render_morse(args.morse, args.wpm, args.farnsworth_wpm, args.tone, rate=args.rate, **shape)
+    elif args.rttl:
+        parsed, tune_name, d, o, b = rttl_to_midi_tuples(args.rttl)
+        samples = render_melody(parsed, b, rate=args.rate, **shape)
+    else:
+        parser.print_usage()
+        sys.exit(1)
+
+    write_wav(args.output, samples, args.rate)
+    print(f"{args.output}: {len(samples) / args.rate:.2f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
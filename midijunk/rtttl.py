@@ -1,7 +1,48 @@
 #!/usr/bin/env python3
+import argparse
+import ast
+import functools
+import hashlib
+import heapq
+import multiprocessing
+import os
 import re
+import shutil
+import sqlite3
+import subprocess
 import sys
 
+import morse
+
+# RTTTL standard durations -> 32nd ticks
+DURATION_MAP = {
+    1: 32,  # whole
+    2: 16,  # half
+    4: 8,   # quarter
+    8: 4,   # eighth
+    16: 2,  # sixteenth
+    32: 1   # thirty-second
+}
+
+# semitone offset from C for the note letters a..g, indexed by ord(letter) - ord('a')
+_SEMITONES = (9, 11, 0, 2, 4, 5, 7)
+
+_DEFAULT_D_RE = re.compile(r'd\s*=\s*(\d+)')
+_DEFAULT_O_RE = re.compile(r'o\s*=\s*(\d+)')
+_DEFAULT_B_RE = re.compile(r'b\s*=\s*(\d+)')
+
+# One note token and its separator. Example: "16g", "4p", "a6.", "8c#6", "2f#."
+# Anything after the recognised part of a token is ignored up to the next comma,
+# and a token that doesn't start with a note leaves the note group unset.
+_TOKEN_RE = re.compile(r'\s*'
+                       r'(?:(\d*)'     # optional leading duration
+                       r'([a-gp])'     # note letter or 'p'
+                       r'(#|b)?'       # optional sharp(#) or flat(b)
+                       r'(\d*)'        # optional octave
+                       r'(\.)?)?'      # optional dotted
+                       r'[^,]*'        # rest of the token
+                       r'(,)?')        # separator, missing on the last token
+
 def generate_midi_name_dict():
     """
     Returns a dict mapping all note names (with sharps and flats) to MIDI numbers,
@@ -43,15 +84,11 @@ def rttl_to_midi_tuples(rttl_string, name_to_midi=None):
       "MyTune:d=4,o=5,b=120:16g,8p,c6.,a"
     returning a list of (midi_note, duration_in_32nds).
     
-    If name_to_midi is provided, it uses that for note lookups (covering sharps/flats).
-    Otherwise, it will generate a basic partial dictionary for octave 4 only.
+    MIDI numbers are computed arithmetically and accept exactly the names that
+    generate_midi_name_dict() knows about (C0..G9, sharps and flats). The
+    name_to_midi argument is only kept so existing callers don't break.
     """
 
-    # If not provided, generate the full name->MIDI map
-    # (But if you know you only need limited octaves, you could hard-code.)
-    if name_to_midi is None:
-        name_to_midi = generate_midi_name_dict()
-
     # 1) Split into sections: Name, defaults string (d=..., o=..., b=...), note sequence
     parts = rttl_string.strip().split(':', 2)
     if len(parts) < 3:
@@ -67,9 +104,9 @@ def rttl_to_midi_tuples(rttl_string, name_to_midi=None):
     tempo = 120
 
     # We'll do quick regex searches for d=, o=, b=
-    match_d = re.search(r'd\s*=\s*(\d+)', defs_part)
-    match_o = re.search(r'o\s*=\s*(\d+)', defs_part)
-    match_b = re.search(r'b\s*=\s*(\d+)', defs_part)
+    match_d = _DEFAULT_D_RE.search(defs_part)
+    match_o = _DEFAULT_O_RE.search(defs_part)
+    match_b = _DEFAULT_B_RE.search(defs_part)
 
     if match_d:
         default_duration = int(match_d.group(1))
@@ -78,111 +115,1065 @@ def rttl_to_midi_tuples(rttl_string, name_to_midi=None):
     if match_b:
         tempo = int(match_b.group(1))
 
-    # RTTTL standard durations -> 32nd ticks
-    duration_map = {
-        1: 32,  # whole
-        2: 16,  # half
-        4: 8,   # quarter
-        8: 4,   # eighth
-        16: 2,  # sixteenth
-        32: 1   # thirty-second
-    }
+    duration_map = DURATION_MAP
     default_dur_32 = duration_map.get(default_duration, 8)
 
-    # 3) Parse the notes (comma-separated)
-    tokens = [x.strip().lower() for x in notes_str.split(',')]
+    # 3) Parse the notes (comma-separated) in a single pass over the string.
+    # Each scanner match consumes one token plus its trailing comma, so there
+    # is no intermediate token list and no per-note name lookup.
+    notes_str = notes_str.lower()
+    scan = _TOKEN_RE.match
+    semitones = _SEMITONES
     result = []
+    append = result.append
+    pos = 0
 
-    for token in tokens:
-        # Pattern: optional digits (duration), note/rest (a-g or p), optional #/b, optional octave, optional dot (.)
-        # Example: "16g", "4p", "a6.", "8c#6", "c6.", "2f#."
-        m = re.match(r'^(\d*)'      # optional leading duration
-                     r'([a-gp])'    # note letter or 'p'
-                     r'(#|b)?'      # optional sharp(#) or flat(b)
-                     r'(\d*)'       # optional octave
-                     r'(\.)?',      # optional dotted
-                     token, re.IGNORECASE)
+    while True:
+        m = scan(notes_str, pos)
+        dur_str, note_char, accidental, octave_str, dot_str, comma = m.groups()
 
-        if not m:
-            raise ValueError(f"Unrecognized token: {token}")
-
-        dur_str, note_char, accidental, octave_str, dot_str = m.groups()
+        if note_char is None:
+            token = m.group(0)
+            if comma:
+                token = token[:-1]
+            raise ValueError(f"Unrecognized token: {token.strip()}")
 
         # A) duration in 32nds
         if dur_str:
-            dur_val = int(dur_str)
-            base_dur_32 = duration_map.get(dur_val, 8)
+            base_dur_32 = duration_map.get(int(dur_str), 8)
         else:
             base_dur_32 = default_dur_32
 
-        is_dotted = (dot_str == '.')
-        if is_dotted:
-            # dotted => multiply by 1.5 => must be integer after that
-            base_dur_32 = int(base_dur_32 * 1.5)
-
-        # B) octave
-        if octave_str:
-            octave = int(octave_str)
-        else:
-            octave = default_octave
+        if dot_str:
+            # dotted => multiply by 1.5, rounded down like int(x * 1.5)
+            base_dur_32 += base_dur_32 >> 1
 
-        # C) pitch
+        # B) pitch, computed straight from the letter, accidental and octave
         if note_char == 'p':
             # rest
             midi_note = 0
         else:
-            # e.g. note_char='g' + accidental='#' => "g#"
-            full_note_name = note_char
+            octave = int(octave_str) if octave_str else default_octave
+            midi_note = (octave + 1) * 12 + semitones[ord(note_char) - 97]
             if accidental:
-                full_note_name += accidental
-            # e.g. "g#" => "g#4" => "g#4"
-            full_note_name += str(octave)
+                if accidental == '#':
+                    valid = note_char in 'cdfga'
+                    midi_note += 1
+                else:
+                    valid = note_char in 'degab'
+                    midi_note -= 1
+            else:
+                valid = True
+            if not valid or midi_note > 127:
+                raise ValueError(f"Note name not found in dictionary: "
+                                 f"{note_char}{accidental or ''}{octave}")
 
-            if full_note_name not in name_to_midi:
-                raise ValueError(f"Note name not found in dictionary: {full_note_name}")
-            midi_note = name_to_midi[full_note_name]
+        append((midi_note, base_dur_32))
 
-        result.append((midi_note, base_dur_32))
+        if not comma:
+            break
+        pos = m.end()
 
     return result, tune_name, default_duration, default_octave, tempo
 
 
-def make_circuitpython_snippet(rttl_string):
+def melody_var_name(tune_name):
+    """ the variable name prefix used for a tune, sanitized for code """
+    return tune_name.lower().replace(" ", "_").replace("-", "_")
+
+
+def python_name(tune_name):
+    """ melody_var_name, made a valid identifier (and module name) whatever the tune is called """
+    name = melody_var_name(tune_name) or "tune"
+    if not name.isidentifier():
+        name = re.sub(r'\W', '_', name)
+        if not name.isidentifier():
+            name = "_" + name
+    return name
+
+
+def pack_melody(parsed):
+    """
+    Packs (midi_note, duration_in_32nds) pairs into the compact melody format:
+    two bytes per event, the MIDI note (0 = rest) followed by the duration.
+    """
+    data = bytearray(2 * len(parsed))
+    for i, (note, dur) in enumerate(parsed):
+        if not 0 <= note <= 127 or not 0 < dur <= 255:
+            raise ValueError(f"Event does not fit the packed format: ({note}, {dur})")
+        data[2 * i] = note
+        data[2 * i + 1] = dur
+    return bytes(data)
+
+
+def unpack_melody(data):
+    """ packed melody bytes back into (midi_note, duration_in_32nds) pairs """
+    return [(data[i], data[i + 1]) for i in range(0, len(data) - 1, 2)]
+
+
+def melody_file_header(tempo):
+    """ the two byte header of a packed melody file: the tempo (RTTTL b= value), big endian """
+    if not 0 < tempo <= 0xFFFF:
+        raise ValueError(f"Tempo does not fit the melody file header: {tempo}")
+    return bytes((tempo >> 8, tempo & 0xFF))
+
+
+def make_melody_file(parsed, tempo):
+    """
+    The contents of a packed melody file (.bin): the tempo (RTTTL b= value)
+    as two big endian bytes, followed by the packed events.
+    """
+    return melody_file_header(tempo) + pack_melody(parsed)
+
+
+def format_melody_list(parsed):
+    """ the list of tuples form of a melody, as used in fox.py """
+    lines = ["["]
+    for (note, dur) in parsed:
+        lines.append(f"    ({note}, {dur}),")
+    lines.append("]")
+    return "\n".join(lines)
+
+
+def format_packed_melody(data, events_per_line=16):
+    """ a bytes literal of a packed melody, wrapped over several lines """
+    step = 2 * events_per_line
+    lines = ["("]
+    for i in range(0, len(data), step):
+        lines.append(f"    {data[i:i + step]!r}")
+    if len(lines) == 1:
+        lines.append("    b''")
+    lines.append(")")
+    return "\n".join(lines)
+
+
+def format_song_module(tune_name, value, tempo, phrased=False):
+    """
+    The source of a song module: one tune on its own, as fox.py imports
+    from its songs package when the tune's turn comes (see write_song_module).
+    A phrased melody refers to the shared phrase table in songs/phrases.py.
+    """
+    source = "# generated by rtttl.py, one song of the fox.py rotation\n"
+    if phrased:
+        source += "from songs.phrases import phrases\n"
+    return source + f"name = {tune_name!r}\nmelody = {value}\ntempo = {tempo}\n"
+
+
+def write_song_module(song_dir, module_name, source, mpy=False):
+    """
+    Writes a song module as <song_dir>/<module_name>.py, or compiles it to
+    <module_name>.mpy with mpy-cross when mpy is True. Returns the path written.
+    """
+    path = os.path.join(song_dir, f"{module_name}.py")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source)
+    if not mpy:
+        return path
+    mpy_cross = shutil.which("mpy-cross")
+    if mpy_cross is None:
+        raise OSError("mpy-cross not found on PATH (pip install mpy-cross, matching your CircuitPython version)")
+    mpy_path = os.path.join(song_dir, f"{module_name}.mpy")
+    subprocess.run([mpy_cross, "-o", mpy_path, path], check=True)
+    os.remove(path)
+    return mpy_path
+
+
+def make_circuitpython_snippet(rttl_string, var_name=None, packed=False, module=False):
     """
     Generates a Python snippet assigning the parsed RTTTL as
-    a list of (midi_note, duration_in_32nds).
+    a list of (midi_note, duration_in_32nds), or as a packed bytes
+    literal (see pack_melody) when packed is True, followed by the
+    tune's tempo (the b= value) so the player can keep it.
+
+    With module=True the snippet is instead a whole song module
+    (name, melody and tempo) for the songs package of fox.py.
     
     Example usage:
         snippet = make_circuitpython_snippet("Wannabe:d=4,o=5,b=125:...")
         print(snippet)
     """
-    name_to_midi = generate_midi_name_dict()
-    parsed, tune_name, d, o, b = rttl_to_midi_tuples(rttl_string, name_to_midi)
+    parsed, tune_name, d, o, b = rttl_to_midi_tuples(rttl_string)
+    return format_snippet(parsed, tune_name, b, var_name, packed, module)
+
 
+def format_snippet(parsed, tune_name, tempo, var_name=None, packed=False, module=False):
+    """ make_circuitpython_snippet for a melody already parsed, see there """
     # Build a Python code snippet
     # We'll use a variable named from the tune_name, but sanitized for code
-    var_name = tune_name.lower().replace(" ", "_").replace("-", "_")
-    lines = [f"{var_name}_melody = ["]
+    if var_name is None:
+        var_name = melody_var_name(tune_name)
+    if packed:
+        value = format_packed_melody(pack_melody(parsed))
+    else:
+        value = format_melody_list(parsed)
+    if module:
+        return format_song_module(tune_name, value, tempo)
+    return f"{var_name}_melody = {value}\n{var_name}_tempo = {tempo}"
 
-    for (note, dur) in parsed:
-        lines.append(f"    ({note}, {dur}),")
 
-    lines.append("]")
+# ---------------------------------------------------------------------------
+# melodies back to RTTTL
+#
+# A token is [duration][letter][#][octave][.], the duration and octave left
+# out when they equal the d= and o= defaults. Each token's length depends only
+# on its own duration and octave, so the shortest string comes from picking the
+# best d= and the best o= independently over the melody's histograms.
+
+_NOTE_NAMES = ("c", "c#", "d", "d#", "e", "f", "f#", "g", "g#", "a", "a#", "b")
+
+# every length in 32nds one token can hold, and the (RTTTL duration, dotted) ways to write it
+_TOKEN_DURATIONS = {}
+for _d, _ticks in DURATION_MAP.items():
+    _TOKEN_DURATIONS.setdefault(_ticks, []).append((_d, False))
+    _TOKEN_DURATIONS.setdefault(_ticks + (_ticks >> 1), []).append((_d, True))
+
+
+@functools.lru_cache(maxsize=None)
+def split_duration(duration):
+    """
+    The fewest token lengths (longest first) adding up to a duration in 32nds.
+    A note longer than 48 or of a length no token holds (5, 7, 9, ...) becomes
+    several tokens of the same note.
+    """
+    if duration < 1:
+        raise ValueError(f"Duration can't be written in RTTTL: {duration}")
+    fewest = [()] + [None] * duration
+    for total in range(1, duration + 1):
+        for ticks in sorted(_TOKEN_DURATIONS, reverse=True):
+            if ticks <= total and fewest[total - ticks] is not None:
+                pieces = (ticks,) + fewest[total - ticks]
+                if fewest[total] is None or len(pieces) < len(fewest[total]):
+                    fewest[total] = pieces
+    return fewest[duration]
+
+
+@functools.lru_cache(maxsize=None)
+def _duration_text(ticks, default):
+    """ (digits, dot) of the shortest way to write a token length with d=default """
+    best = None
+    for d, dotted in _TOKEN_DURATIONS[ticks]:
+        text = ("" if d == default else str(d), "." if dotted else "")
+        if best is None or len(text[0]) + len(text[1]) < len(best[0]) + len(best[1]):
+            best = text
+    return best
+
+
+def split_melody(parsed):
+    """ (midi_note, duration_in_32nds) pairs with every duration split into token lengths, see split_duration """
+    events = []
+    for note, duration in parsed:
+        if note and not 12 <= note <= 127:
+            raise ValueError(f"Note can't be written in RTTTL: {note}")
+        for ticks in split_duration(duration):
+            events.append((note, ticks))
+    return events
+
+
+def midi_tuples_to_rttl(parsed, tune_name="tune", tempo=120):
+    """
+    The shortest RTTTL string that rttl_to_midi_tuples parses back into
+    split_melody(parsed), which is parsed itself when every duration fits
+    one token. d=, o= and b= are always written, other firmwares don't all
+    share this parser's defaults.
+    """
+    events = split_melody(parsed)
+    if not events:
+        raise ValueError("An RTTTL tune needs at least one note")
+    if not 0 < tempo:
+        raise ValueError(f"Tempo can't be written in RTTTL: {tempo}")
+    tune_name = tune_name.replace(":", "").strip()
+
+    lengths = {}
+    octaves = {}
+    for note, ticks in events:
+        lengths[ticks] = lengths.get(ticks, 0) + 1
+        if note:
+            octave = note // 12 - 1
+            octaves[octave] = octaves.get(octave, 0) + 1
+
+    def duration_cost(d):
+        return len(str(d)) + sum(count * sum(map(len, _duration_text(ticks, d))) for ticks, count in lengths.items())
+
+    def octave_cost(o):
+        return sum(count for octave, count in octaves.items() if octave != o)
+
+    # ties go to the usual d=4, o=5
+    d = min(DURATION_MAP, key=lambda d: (duration_cost(d), d != 4))
+    o = min(range(10), key=lambda o: (octave_cost(o), o != 5))
+
+    tokens = []
+    for note, ticks in events:
+        digits, dot = _duration_text(ticks, d)
+        if note:
+            octave = note // 12 - 1
+            tokens.append(f"{digits}{_NOTE_NAMES[note % 12]}{'' if octave == o else octave}{dot}")
+        else:
+            tokens.append(f"{digits}p{dot}")
+    return f"{tune_name}:d={d},o={o},b={tempo}:" + ",".join(tokens)
+
+
+def read_melody(path, phrases=None):
+    """ (name, events, tempo) of a song module or a packed melody file (.bin) """
+    if path.endswith(".bin"):
+        with open(path, "rb") as f:
+            data = f.read()
+        return os.path.splitext(os.path.basename(path))[0], unpack_melody(data[2:]), (data[0] << 8) | data[1]
+    return read_song_module(path, phrases)
+
+
+def iter_melody_paths(paths):
+    """ (path, phrase table) of every song module and melody file in the paths, directories in name order """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path, None
+            continue
+        phrases = None
+        phrase_path = os.path.join(path, "phrases.py")
+        if os.path.exists(phrase_path):
+            with open(phrase_path, encoding="utf-8") as f:
+                phrases = ast.literal_eval(f.read().split("=", 1)[1].strip())
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".bin") or (name.endswith(".py") and name not in ("__init__.py", "phrases.py")):
+                yield os.path.join(path, name), phrases
+
+
+# ---------------------------------------------------------------------------
+# fitting songs into an airtime budget
+#
+# A fox.py transmission is the PTT lead in, the Morse ID, the ID to song gap
+# and the song, and the badge plays each event for duration * 7500 // tempo
+# whole ms. A song that makes the transmission longer than the budget is
+# played faster, by raising its b= tempo up to max_speedup times the original;
+# past that it keeps its tempo and is cut at the last phrase boundary that
+# fits. It is all done here, the firmware plays the result like any other song.
+
+def melody_ms(parsed, tempo):
+    """ how long the badge plays a melody for, every event cut to whole ms like fox.py's compile_melody """
+    return sum(min(duration * 7500 // tempo, 65535) for note, duration in parsed)
+
+
+def id_airtime_ms(callmessage, wpm=12, farnsworth_wpm=0):
+    """ how long fox.py's Morse ID of the callmessage takes, in ms """
+    return morse.schedule_us(morse.compile_morse(callmessage, wpm, farnsworth_wpm)) // 1000
+
+
+def song_budget_ms(max_airtime_ms, id_ms, overhead_ms=1500):
+    """ what a transmission of at most max_airtime_ms leaves for the song, after the ID and the lead in and gap """
+    budget = max_airtime_ms - id_ms - overhead_ms
+    if budget <= 0:
+        raise ValueError(f"The ID and the lead in and gap alone take {id_ms + overhead_ms} ms "
+                         f"of the {max_airtime_ms} ms airtime")
+    return budget
+
+
+def phrase_ends(parsed):
+    """
+    The event counts a melody can be cut after without stopping mid-phrase:
+    before or after a rest, after a note held at least twice the median note
+    length, and the end.
+    """
+    lengths = sorted(duration for note, duration in parsed if note)
+    held = 2 * lengths[len(lengths) // 2] if lengths else 0
+    ends = []
+    for i in range(1, len(parsed)):
+        note, duration = parsed[i - 1]
+        if not note or not parsed[i][0] or duration >= held:
+            ends.append(i)
+    ends.append(len(parsed))
+    return ends
+
+
+def fit_airtime(parsed, tempo, budget_ms, max_speedup=1.25):
+    """
+    (parsed, tempo) of a melody made to play in at most budget_ms: as it is
+    when it already does, else at the lowest tempo up to max_speedup times
+    its own that does, else at its own tempo cut at the last phrase boundary
+    that fits (the last note that does when no phrase is short enough), with
+    trailing rests dropped. Raises ValueError when not even a note fits.
+    """
+    if melody_ms(parsed, tempo) <= budget_ms:
+        return parsed, tempo
+    fastest = int(tempo * max_speedup)
+    if fastest > tempo and melody_ms(parsed, fastest) <= budget_ms:
+        # melody_ms only falls as the tempo rises: too long at slow, fits at fast
+        slow, fast = tempo, fastest
+        while fast - slow > 1:
+            middle = (slow + fast) // 2
+            if melody_ms(parsed, middle) <= budget_ms:
+                fast = middle
+            else:
+                slow = middle
+        return parsed, fast
+
+    elapsed = [0]
+    for note, duration in parsed:
+        elapsed.append(elapsed[-1] + min(duration * 7500 // tempo, 65535))
+    end = max((end for end in phrase_ends(parsed) if elapsed[end] <= budget_ms), default=0)
+    if not any(note for note, duration in parsed[:end]):
+        end = max((end for end in range(len(parsed) + 1) if elapsed[end] <= budget_ms), default=0)
+    cut = parsed[:end]
+    while cut and not cut[-1][0]:
+        cut.pop()
+    if not cut:
+        raise ValueError(f"Not even the first note fits in {budget_ms} ms")
+    return cut, tempo
+
+
+def describe_fit(tune_name, parsed, tempo, fitted, fitted_tempo):
+    """ one line on what fit_airtime did to a tune """
+    change = (f"b={tempo} -> {fitted_tempo}" if fitted_tempo != tempo
+              else f"cut after {len(fitted)} of {len(parsed)} events")
+    return (f"fit: {tune_name} {melody_ms(parsed, tempo) / 1000:.1f} s -> "
+            f"{melody_ms(fitted, fitted_tempo) / 1000:.1f} s, {change}")
+
+
+def fit_results(results, fit, out=sys.stderr):
+    """
+    Batch results (see convert_batch) with every melody passed through fit,
+    a function of (parsed, tempo) returning them fitted to an airtime budget
+    (see fit_airtime); a tune that can't be fitted becomes a failure. Reports
+    every tune that was changed.
+    """
+    fitted = []
+    changed = 0
+    for result in results:
+        location, tune_name, value, tempo, data, error = result
+        if error is not None:
+            fitted.append(result)
+            continue
+        melody = ast.literal_eval(value)
+        packed = not isinstance(melody, list)
+        parsed = unpack_melody(melody) if packed else melody
+        try:
+            new, new_tempo = fit(parsed, tempo)
+        except ValueError as e:
+            fitted.append((location, None, None, None, None, str(e)))
+            continue
+        if new_tempo != tempo or len(new) != len(parsed):
+            changed += 1
+            print(describe_fit(tune_name, parsed, tempo, new, new_tempo), file=out)
+            value = format_packed_melody(pack_melody(new)) if packed else format_melody_list(new)
+            if data is not None:
+                data = make_melody_file(new, new_tempo)
+        fitted.append((location, tune_name, value, new_tempo, data, None))
+    print(f"fit: {changed} of {len(fitted)} tunes changed to fit the airtime", file=out)
+    return fitted
+
+
+# ---------------------------------------------------------------------------
+# shared phrase compression of a whole melody library
+#
+# Repeated runs of events (a chorus, a figure that recurs across tunes) are
+# stored once in a phrase table and replaced by a two byte reference in the
+# packed melodies: a first byte with the high bit set, which no MIDI note has,
+# carrying the top 7 bits of the phrase index and a second byte with the low 8.
+# Phrases don't nest, so the player only ever expands one level.
+
+MAX_PHRASES = 0x8000
+PHRASE_OVERHEAD = 4		# rough flash cost of one more entry in the phrase table, in bytes
+_REF_BASE = 0x10000		# events are code points note * 256 + dur, below this; references above
+_SONG_BREAK = "\uffff"	# between songs, never an event or a reference
+
+
+def _events_to_str(events):
+    return "".join(chr((note << 8) | dur) for note, dur in events)
+
+
+def _pack_tokens(tokens):
+    data = bytearray()
+    for c in tokens:
+        code = ord(c)
+        if code >= _REF_BASE:
+            index = code - _REF_BASE
+            data += bytes((0x80 | (index >> 8), index & 0xFF))
+        else:
+            data += bytes((code >> 8, code & 0xFF))
+    return bytes(data)
+
+
+def compress_library(melodies, min_length=2, max_length=16, max_phrases=MAX_PHRASES):
+    """
+    Finds event sequences repeated within and across melodies and moves them
+    into a shared phrase table.
+
+    melodies is a list of (midi_note, duration_in_32nds) lists. Returns
+    (phrases, packed) where phrases is a list of packed phrase bytes and packed
+    the melodies as packed bytes with phrase references (see above).
+
+    Candidates are every sequence of min_length..max_length events occurring
+    at least twice (longer ones only grow from repeated shorter ones). They are
+    taken greedily by the bytes they save, each one's saving recounted on the
+    library as compressed so far before it is accepted.
+    """
+    for events in melodies:
+        pack_melody(events)		# same limits as the packed format
+    library = _SONG_BREAK.join(_events_to_str(events) for events in melodies)
+    songs = library.split(_SONG_BREAK)
+
+    # every repeated sequence, from the repeated sequences one shorter
+    counts = {}
+    frequent = None
+    for length in range(min_length, max_length + 1):
+        current = {}
+        for song in songs:
+            for i in range(len(song) - length + 1):
+                gram = song[i:i + length]
+                if frequent is None or gram[:-1] in frequent:
+                    current[gram] = current.get(gram, 0) + 1
+        frequent = {gram for gram, count in current.items() if count > 1}
+        if not frequent:
+            break
+        for gram in frequent:
+            counts[gram] = current[gram]
+
+    def saving(gram, count):
+        return count * (2 * len(gram) - 2) - (2 * len(gram) + PHRASE_OVERHEAD)
+
+    heap = [(-saving(gram, count), gram) for gram, count in counts.items() if saving(gram, count) > 0]
+    heapq.heapify(heap)
+    phrases = []
+    while heap and len(phrases) < max_phrases:
+        estimate, gram = heapq.heappop(heap)
+        actual = saving(gram, library.count(gram))
+        if actual <= 0:
+            continue
+        if heap and actual < -heap[0][0]:
+            heapq.heappush(heap, (-actual, gram))	# no longer the best, look again later
+            continue
+        library = library.replace(gram, chr(_REF_BASE + len(phrases)))
+        phrases.append(gram)
+
+    return [_pack_tokens(gram) for gram in phrases], [_pack_tokens(song) for song in library.split(_SONG_BREAK)]
+
+
+def has_phrase_refs(data):
+    """ whether packed melody bytes refer to the phrase table """
+    return any(data[i] & 0x80 for i in range(0, len(data) - 1, 2))
+
+
+def format_phrase_table(phrases):
+    """ the phrase table as code: a tuple of packed bytes literals, indexed by the references """
+    lines = ["("]
+    for data in phrases:
+        lines.append(f"    {data!r},")
+    lines.append(")")
     return "\n".join(lines)
 
 
+def phrase_table_size(phrases):
+    return sum(len(data) for data in phrases) + PHRASE_OVERHEAD * len(phrases)
+
+
+def print_compression_report(original, phrases, packed, out=sys.stderr):
+    """ original and packed are byte counts of the melodies before and after, phrases the table """
+    table = phrase_table_size(phrases)
+    compressed = packed + table
+    ratio = original / compressed if compressed else 1.0
+    print(f"phrases: {len(phrases)} shared phrases ({table} bytes), melodies {original} -> {packed} bytes, "
+          f"{original} -> {compressed} bytes in total, ratio {ratio:.2f}:1", file=out)
+
+
+# ---------------------------------------------------------------------------
+# batch conversion of whole ringtone collections
+
+COLLECTION_SUFFIXES = (".rtx", ".rtttl", ".rtl", ".txt", ".nok")
+
+# a line that starts a tune: "Name:" followed by a defaults section and ':'
+_TUNE_START_RE = re.compile(r'^[^:,]*:\s*(?:[a-z]\s*=\s*\d+\s*,?\s*)*:', re.IGNORECASE)
+
+
+def iter_collection(lines, source="<stdin>"):
+    """
+    Yields (location, rttl_string) for every tune in a ringtone collection.
+
+    Handles the formats the usual archives come in: one tune per line,
+    Nokia style .txt dumps with blank lines, comments ('#', ';', '//') and
+    quoted or ';'-terminated tunes, and .rtx files where a long tune is
+    wrapped over several lines (continuation lines don't start with a
+    "Name:defaults:" header and are appended to the tune before them).
+    """
+    current = None
+    start_line = 0
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip().lstrip("\ufeff").strip()
+        if not line or line.startswith(("#", ";", "//")):
+            continue
+        line = line.rstrip(";").strip().strip('"').strip()
+        if not line:
+            continue
+
+        if current is not None and not _TUNE_START_RE.match(line):
+            # wrapped tune, e.g. ".rtx" files broken at 80 columns
+            joiner = "" if current.endswith(",") or line.startswith(",") else ","
+            current = current + joiner + line
+            continue
+
+        if current is not None:
+            yield f"{source}:{start_line}", current
+        current = line
+        start_line = line_no
+
+    if current is not None:
+        yield f"{source}:{start_line}", current
+
+
+def iter_sources(paths):
+    """ yields (location, rttl_string) for files, directories of collections, or '-' for stdin """
+    for path in paths:
+        if path == "-":
+            yield from iter_collection(sys.stdin)
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(COLLECTION_SUFFIXES):
+                        yield from iter_sources([os.path.join(root, name)])
+        else:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                yield from iter_collection(f, source=path)
+
+
+def _convert_one(item, packed=False, with_parsed=False):
+    """
+    worker: convert one tune, returning the failure instead of raising it.
+    with_parsed adds the parsed tuples, packed, to the result for the conversion cache
+    """
+    location, rttl_string = item
+    parsed = None
+    try:
+        parsed, tune_name, d, o, b = rttl_to_midi_tuples(rttl_string)
+        if packed:
+            data = make_melody_file(parsed, b)
+            value = format_packed_melody(data[2:])
+        else:
+            data = None
+            value = format_melody_list(parsed)
+    except ValueError as e:
+        result = location, None, None, None, None, str(e)
+    except Exception as e:  # a bug in one tune must not take the whole run down
+        result = location, None, None, None, None, f"{type(e).__name__}: {e}"
+    else:
+        result = location, tune_name, value, b, data, None
+    if with_parsed:
+        return result + (None if result[5] is not None else data[2:] if packed else pack_melody(parsed),)
+    return result
+
+
+def _convert_all(tunes, jobs, chunksize, convert):
+    if jobs == 1:
+        yield from map(convert, tunes)
+        return
+
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(convert, tunes, chunksize)
+
+
+def convert_batch(tunes, jobs=None, chunksize=64, packed=False, cache=None):
+    """
+    Converts an iterable of (location, rttl_string) over a process pool.
+
+    Yields (location, tune_name, value, tempo, data, error) in input order,
+    where value is the code for the melody, data the melody file contents
+    (packed mode only) and error is None on success. Work is handed to the workers in
+    chunks of `chunksize` tunes so the per-task overhead is paid once per
+    chunk rather than once per tune.
+
+    With a ConversionCache, tunes converted before are answered from it and
+    only the rest go to the workers; no pool is started when nothing missed.
+    """
+    if cache is None:
+        yield from _convert_all(tunes, jobs, chunksize, functools.partial(_convert_one, packed=packed))
+        return
+
+    tunes = list(tunes)
+    keys = [cache.key(rttl_string) for location, rttl_string in tunes]
+    cached = [cache.get(key) for key in keys]
+    misses = [tune for tune, entry in zip(tunes, cached) if entry is None]
+    fresh = _convert_all(misses, jobs, chunksize, functools.partial(_convert_one, packed=packed, with_parsed=True))
+    for (location, rttl_string), key, entry in zip(tunes, keys, cached):
+        if entry is None:
+            *result, events = next(fresh)
+            cache.put(key, result, events, packed)
+            yield tuple(result)
+        else:
+            yield cache.result(key, entry, location, packed)
+
+
+def write_batch_module(results, out, bin_dir=None, song_dir=None, mpy=False, phrases=None):
+    """
+    Writes every converted tune as a snippet into one module and returns
+    (converted, failures) where failures is a list of (location, error).
+
+    Tunes whose names sanitize to the same variable get a numeric suffix.
+    With bin_dir, packed melodies are also written there as <name>.bin,
+    with song_dir each tune also gets its own song module <name>.py
+    (or .mpy, see write_song_module). phrases is the shared phrase table
+    of melodies from compress_results, written as `phrases` and as the
+    songs/phrases.py module.
+    """
+    used = {"phrases"} if song_dir else set()
+    converted = 0
+    failures = []
+    out.write("# generated by rtttl.py, each melody is a list of (midi_note, duration_in_32nds)\n"
+              "# or packed bytes of the same pairs, a note byte followed by a duration byte\n")
+    if phrases is not None:
+        table = format_phrase_table(phrases)
+        out.write(f"\n# shared phrases, referenced from the melodies\nphrases = {table}\n")
+        if song_dir:
+            write_song_module(song_dir, "phrases", f"# generated by rtttl.py, the phrases shared by the songs\n"
+                                                   f"phrases = {table}\n", mpy)
+    for location, tune_name, value, tempo, data, error in results:
+        if error is not None:
+            failures.append((location, error))
+            continue
+
+        base = python_name(tune_name)
+        var_name = base
+        suffix = 2
+        while var_name in used:
+            var_name = f"{base}_{suffix}"
+            suffix += 1
+        used.add(var_name)
+
+        out.write(f"\n# {location}: {tune_name}\n{var_name}_melody = {value}\n{var_name}_tempo = {tempo}\n")
+        if bin_dir and data is not None:
+            with open(os.path.join(bin_dir, f"{var_name}.bin"), "wb") as f:
+                f.write(data)
+        if song_dir:
+            phrased = phrases is not None and has_phrase_refs(ast.literal_eval(value))
+            try:
+                write_song_module(song_dir, var_name, format_song_module(tune_name, value, tempo, phrased), mpy)
+            except (OSError, subprocess.CalledProcessError) as e:
+                failures.append((location, str(e)))
+                continue
+        converted += 1
+    return converted, failures
+
+
+def compress_results(results, max_length=16):
+    """
+    Shared phrase compression of packed batch results (see compress_library).
+    Returns (results, phrases): the results with each melody value now
+    referring to the phrase table, and the table. The .bin data is left as
+    it is, melody files stay self contained. Reports the compression ratio.
+    """
+    results = list(results)
+    converted = [i for i, result in enumerate(results) if result[5] is None]
+    melodies = [unpack_melody(results[i][4][2:]) for i in converted]
+    phrases, packed = compress_library(melodies, max_length=max_length)
+    for i, data in zip(converted, packed):
+        location, tune_name, value, tempo, melody_file, error = results[i]
+        results[i] = (location, tune_name, format_packed_melody(data), tempo, melody_file, error)
+    print_compression_report(sum(2 * len(events) for events in melodies), phrases, sum(map(len, packed)))
+    return results, phrases
+
+
+def read_song_module(path, phrases=None):
+    """ (name, events, tempo) of a song module written by rtttl.py, phrase references expanded """
+    values = {}
+    with open(path, encoding="utf-8") as f:
+        for node in ast.parse(f.read(), path).body:
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+                values[node.targets[0].id] = ast.literal_eval(node.value)
+    melody = values["melody"]
+    if isinstance(melody, list):
+        return values["name"], melody, values["tempo"]
+    events = []
+    for note, dur in unpack_melody(melody):
+        if note & 0x80:
+            events.extend(unpack_melody(phrases[((note & 0x7F) << 8) | dur]))
+        else:
+            events.append((note, dur))
+    return values["name"], events, values["tempo"]
+
+
+def compress_song_dir(song_dir, max_length=16):
+    """
+    Rewrites the song modules (.py) in a songs package with one shared phrase
+    table, songs/phrases.py. Songs that already use an older table are expanded
+    first, so running it again after adding songs recompresses the whole library.
+    """
+    phrase_path = os.path.join(song_dir, "phrases.py")
+    phrases = None
+    if os.path.exists(phrase_path):
+        with open(phrase_path, encoding="utf-8") as f:
+            phrases = ast.literal_eval(f.read().split("=", 1)[1].strip())
+    modules = sorted(name[:-3] for name in os.listdir(song_dir)
+                     if name.endswith(".py") and name not in ("__init__.py", "phrases.py"))
+    songs = [read_song_module(os.path.join(song_dir, f"{module}.py"), phrases) for module in modules]
+
+    table, packed = compress_library([events for name, events, tempo in songs], max_length=max_length)
+    write_song_module(song_dir, "phrases", f"# generated by rtttl.py, the phrases shared by the songs\n"
+                                           f"phrases = {format_phrase_table(table)}\n")
+    for module, (name, events, tempo), data in zip(modules, songs, packed):
+        write_song_module(song_dir, module, format_song_module(name, format_packed_melody(data), tempo,
+                                                                has_phrase_refs(data)))
+    print_compression_report(sum(2 * len(events) for name, events, tempo in songs), table, sum(map(len, packed)))
+    return table
+
+
+# ---------------------------------------------------------------------------
+# on disk conversion cache
+
+# bump whenever the generated code changes, it invalidates every cache entry
+CONVERTER_VERSION = 1
+
+
+def normalize_rttl(rttl_string):
+    """
+    The form of a tune its cache key is made from: whitespace around the
+    sections and the commas and the case of the notes don't change what
+    rttl_to_midi_tuples makes of it, so they don't make a different tune.
+    """
+    parts = rttl_string.strip().split(':', 2)
+    if len(parts) < 3:
+        return rttl_string.strip()
+    notes = parts[2].lower()
+    if " " in notes or "\t" in notes:
+        notes = ",".join([token.strip() for token in notes.split(",")])
+    return f"{parts[0].strip()}:{parts[1].strip()}:{notes.strip()}"
+
+
+def default_cache_path():
+    root = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(root, "midijunk", "rtttl.sqlite")
+
+
+class ConversionCache:
+    """
+    Content addressed cache of converted tunes, one SQLite file.
+
+    Entries are keyed by a hash of the normalized tune and CONVERTER_VERSION
+    and hold the tune name, tempo, parsed tuples (packed, see pack_melody) or
+    the parse error, and the generated code of each output format asked for
+    so far. Every lookup marks its entry as used; on close the least recently
+    used entries are evicted until the cache is within max_bytes again.
+    """
+    FORMATS = ("list_code", "packed_code")
+
+    def __init__(self, path=None, max_bytes=64 * 1024 * 1024):
+        self.path = path or default_cache_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, name TEXT, tempo INTEGER, "
+                        "error TEXT, events BLOB, list_code TEXT, packed_code TEXT, "
+                        "size INTEGER NOT NULL, used INTEGER NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self.clock = self.db.execute("SELECT MAX(used) FROM entries").fetchone()[0] or 0
+        self.used = []			# (clock, key) of the hits, written back on close
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @staticmethod
+    def key(rttl_string):
+        text = f"{CONVERTER_VERSION}\0{normalize_rttl(rttl_string)}"
+        return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+    def get(self, key):
+        """ the entry for key as (name, tempo, error, events, list_code, packed_code), or None """
+        row = self.db.execute("SELECT name, tempo, error, events, list_code, packed_code FROM entries "
+                              "WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.clock += 1
+        self.used.append((self.clock, key))
+        return row
+
+    def put(self, key, result, events, packed):
+        """ stores a fresh convert_batch result and its packed events """
+        location, tune_name, value, tempo, data, error = result
+        code = self.FORMATS[packed]
+        size = len(value or "") + len(events or b"") + len(error or "") + 100
+        self.clock += 1
+        # an entry holding the other format already keeps it, only this format's code is added
+        self.db.execute(f"INSERT INTO entries (key, name, tempo, error, events, {code}, size, used) "
+                        f"VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                        f"ON CONFLICT(key) DO UPDATE SET {code} = excluded.{code}, used = excluded.used, "
+                        f"size = entries.size - COALESCE(LENGTH(entries.{code}), 0) "
+                        f"+ COALESCE(LENGTH(excluded.{code}), 0)",
+                        (key, tune_name, tempo, error, events, value, size, self.clock))
+
+    def result(self, key, entry, location, packed):
+        """ a cached entry as a convert_batch result for this location, adding the code for a new format """
+        tune_name, tempo, error, events, list_code, packed_code = entry
+        if error is not None:
+            return location, None, None, None, None, error
+        try:
+            data = melody_file_header(tempo) + events if packed else None
+        except ValueError as e:
+            return location, None, None, None, None, str(e)
+        value = packed_code if packed else list_code
+        if value is None:
+            value = format_packed_melody(events) if packed else format_melody_list(unpack_melody(events))
+            code = self.FORMATS[packed]
+            self.db.execute(f"UPDATE entries SET {code} = ?, size = size + ? WHERE key = ?", (value, len(value), key))
+        return location, tune_name, value, tempo, data, None
+
+    def evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in self.db.execute("SELECT key, size FROM entries ORDER BY used"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self.db.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        self.evicted += len(doomed)
+
+    def close(self):
+        self.db.executemany("UPDATE entries SET used = ? WHERE key = ?", self.used)
+        self.used = []
+        self.evict()
+        self.db.commit()
+        self.db.close()
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return (f"cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), "
+                f"{self.evicted} evicted, {self.path}")
+
+
+def print_batch_summary(converted, failures, out=sys.stderr):
+    total = converted + len(failures)
+    print(f"converted {converted} of {total} tunes, {len(failures)} failed", file=out)
+    for location, error in failures:
+        print(f"  FAILED {location}: {error}", file=out)
+
+
+def run_batch(paths, output=None, jobs=None, chunksize=64, packed=False, bin_dir=None, song_dir=None, mpy=False,
+              phrases=False, cache=None, fit=None):
+    for directory in (bin_dir, song_dir):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    results = convert_batch(iter_sources(paths), jobs=jobs, chunksize=chunksize, packed=packed or phrases, cache=cache)
+    if fit is not None:
+        results = fit_results(results, fit)
+    table = None
+    if phrases:
+        results, table = compress_results(results)
+    try:
+        if output and output != "-":
+            with open(output, "w", encoding="utf-8") as out:
+                converted, failures = write_batch_module(results, out, bin_dir, song_dir, mpy, table)
+        else:
+            converted, failures = write_batch_module(results, sys.stdout, bin_dir, song_dir, mpy, table)
+    finally:
+        if cache is not None:
+            cache.close()
+    print_batch_summary(converted, failures)
+    if cache is not None:
+        print(cache.report(), file=sys.stderr)
+    return converted, failures
+
+
 def main():
     # If you run the script with an RTTTL string as an argument, e.g.:
-    #   python rttl_to_circuitpython.py "Wannabe:d=4,o=5,b=125:16g,16g,..."
+    #   python rtttl.py "Wannabe:d=4,o=5,b=125:16g,16g,..."
     # it will print the snippet.
-    if len(sys.argv) < 2:
-        print("Usage: python rttl_to_circuitpython.py \"<RTTTL_STRING>\"")
+    #
+    # Whole collections are converted with --batch, e.g.:
+    #   python rtttl.py --batch ringtones.txt more_tunes/ -o songs.py
+    parser = argparse.ArgumentParser(description="convert RTTTL ringtones into CircuitPython melodies")
+    parser.add_argument("rttl", nargs="?", help="a single RTTTL string to convert")
+    parser.add_argument("--batch", nargs="+", metavar="PATH",
+                        help="collection files or directories (.rtx, .txt, ...) to convert, '-' for stdin")
+    parser.add_argument("-o", "--output", help="module to write the batch snippets to (default stdout)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunksize", type=int, default=64, help="tunes per work unit sent to a worker")
+    parser.add_argument("--packed", action="store_true",
+                        help="emit melodies as packed bytes (note byte, duration byte) instead of tuple lists")
+    parser.add_argument("--bin-dir", help="also write each packed melody to <dir>/<name>.bin (implies --packed)")
+    parser.add_argument("--song-dir", help="also write each tune as its own song module <dir>/<name>.py "
+                                           "for the fox.py songs package (implies --packed)")
+    parser.add_argument("--mpy", action="store_true", help="compile the song modules to .mpy with mpy-cross")
+    parser.add_argument("--phrases", action="store_true",
+                        help="batch: move phrases repeated across the collection into one shared table (implies --packed)")
+    parser.add_argument("--compress-songs", metavar="DIR",
+                        help="rewrite the song modules in DIR around one shared phrase table")
+    parser.add_argument("--cache", metavar="FILE", help=f"batch: conversion cache (default {default_cache_path()})")
+    parser.add_argument("--cache-size", type=int, default=64, metavar="MB",
+                        help="evict the least recently used cache entries beyond this size")
+    parser.add_argument("--no-cache", action="store_true", help="batch: convert every tune from scratch")
+    parser.add_argument("--to-rtttl", nargs="+", metavar="PATH",
+                        help="write song modules, .bin melody files or directories of them back as the shortest "
+                             "RTTTL, one tune per line")
+    parser.add_argument("--max-airtime", type=float, metavar="SECONDS",
+                        help="speed up or cut every tune so a fox.py transmission (lead in, Morse ID, gap, song) "
+                             "takes at most this long")
+    parser.add_argument("--max-speedup", type=float, default=1.25,
+                        help="--max-airtime: the most a tune is sped up before it is cut instead")
+    parser.add_argument("--callmessage", default="VE6MOG/W4 DECOY DECOY VE6MOG/W4",
+                        help="--max-airtime: fox.py callmessage, sent as the Morse ID")
+    parser.add_argument("--wpm", type=int, default=12, help="--max-airtime: fox.py morse_wpm")
+    parser.add_argument("--farnsworth-wpm", type=int, default=0, help="--max-airtime: fox.py morse_farnsworth_wpm")
+    parser.add_argument("--id-ms", type=int, help="--max-airtime: the ID's airtime in ms instead (e.g. an AFSK ID)")
+    parser.add_argument("--overhead-ms", type=int, default=1500,
+                        help="--max-airtime: fox.py ptt_lead_in + id_song_gap")
+    args = parser.parse_args()
+    packed = args.packed or bool(args.bin_dir) or bool(args.song_dir)
+
+    fit = None
+    if args.max_airtime:
+        id_ms = args.id_ms if args.id_ms is not None else id_airtime_ms(args.callmessage, args.wpm,
+                                                                         args.farnsworth_wpm)
+        try:
+            budget = song_budget_ms(int(args.max_airtime * 1000), id_ms, args.overhead_ms)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"fit: {id_ms / 1000:.1f} s ID, {budget / 1000:.1f} s left for each song", file=sys.stderr)
+        fit = functools.partial(fit_airtime, budget_ms=budget, max_speedup=args.max_speedup)
+
+    if args.compress_songs:
+        compress_song_dir(args.compress_songs)
+        sys.exit(0)
+
+    if args.to_rtttl:
+        for path, phrases in iter_melody_paths(args.to_rtttl):
+            name, events, tempo = read_melody(path, phrases)
+            print(midi_tuples_to_rttl(events, name, tempo))
+        sys.exit(0)
+
+    if args.batch:
+        converted, failures = run_batch(args.batch, args.output, args.jobs, args.chunksize,
+                                        packed=packed, bin_dir=args.bin_dir, song_dir=args.song_dir, mpy=args.mpy,
+                                        phrases=args.phrases,
+                                        cache=None if args.no_cache else ConversionCache(args.cache,
+                                                                                         args.cache_size << 20),
+                                        fit=fit)
+        sys.exit(0 if converted or not failures else 1)
+
+    if not args.rttl:
+        parser.print_usage()
         print("Example:")
-        print("   python rttl_to_circuitpython.py \"Wannabe:d=4,o=5,b=125:16g,16g,16g...\"")
+        print("   python rtttl.py \"Wannabe:d=4,o=5,b=125:16g,16g,16g...\"")
         sys.exit(1)
 
-    rttl_input = sys.argv[1]
-    snippet = make_circuitpython_snippet(rttl_input)
+    parsed, tune_name, d, o, b = rttl_to_midi_tuples(args.rttl)
+    if fit is not None:
+        try:
+            fitted, fitted_tempo = fit(parsed, b)
+        except ValueError as e:
+            parser.error(f"{tune_name}: {e}")
+        if fitted_tempo != b or len(fitted) != len(parsed):
+            print(describe_fit(tune_name, parsed, b, fitted, fitted_tempo), file=sys.stderr)
+        parsed, b = fitted, fitted_tempo
+    snippet = format_snippet(parsed, tune_name, b, packed=packed)
+    if args.bin_dir:
+        os.makedirs(args.bin_dir, exist_ok=True)
+        with open(os.path.join(args.bin_dir, f"{melody_var_name(tune_name)}.bin"), "wb") as f:
+            f.write(make_melody_file(parsed, b))
+    if args.song_dir:
+        os.makedirs(args.song_dir, exist_ok=True)
+        path = write_song_module(args.song_dir, python_name(tune_name),
+                                 format_snippet(parsed, tune_name, b, packed=True, module=True), args.mpy)
+        print(f"wrote {path}", file=sys.stderr)
     print("Generated CircuitPython snippet:\n")
     print(snippet)
 
@@ -0,0 +1,142 @@
+# CircuitPython client for the NiceRF SA868 AT command interface
+# copy this next to fox.py on the badge
+
+'''
+    The SA868 answers every "AT+<NAME>..." command with a single
+    "+<NAME>:<code>\r\n" line, where a code of 0 means success.
+
+    Instead of writing a command, sleeping a fixed time and reading whatever
+    arrived, the client reads until the reply line shows up or a deadline
+    passes, checks the result code and retries with a growing backoff.
+    All waiting is done with asyncio.sleep so other tasks keep running.
+'''
+
+import time
+import asyncio
+
+
+class SA868Error(Exception):
+    ''' the modem didn't answer, or answered with a non-zero result code '''
+
+    def __init__(self, command, code=None):
+        self.command = command
+        self.code = code
+        if code is None:
+            super().__init__(f"no response to '{command}'")
+        else:
+            super().__init__(f"'{command}' failed with result code {code}")
+
+
+class SA868:
+    POLL = 0.002			# seconds between UART checks while waiting for a reply
+
+    def __init__(self, uart, pd=None, power=None, timeout=0.5, retries=3, backoff=0.05):
+        '''
+        uart is a busio.UART (or anything with write, read and in_waiting),
+        pd and power the DigitalInOut outputs driving the PD and H/L pins
+        '''
+        self.uart = uart
+        self.pd = pd
+        self.power = power
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.unsolicited = []	# lines received that weren't the reply being waited for
+        self._buffer = bytearray()
+
+    async def readline(self, timeout):
+        ''' the next "\r\n" terminated line (without the terminator), or None after timeout seconds '''
+        deadline = time.monotonic_ns() + int(timeout * 1000000000)
+        while True:
+            end = self._buffer.find(b"\r\n")
+            if end >= 0:
+                line = bytes(self._buffer[:end])
+                self._buffer = self._buffer[end + 2:]
+                return line
+            pending = self.uart.in_waiting
+            if pending:
+                self._buffer.extend(self.uart.read(pending))
+                continue
+            if time.monotonic_ns() >= deadline:
+                return None
+            await asyncio.sleep(self.POLL)
+
+    async def _exchange(self, command, name, timeout):
+        ''' send one command and wait for its "+NAME:code" reply, returns the code or None '''
+        self.uart.write(bytes(f"{command}\r\n", 'ascii'))
+        deadline = time.monotonic_ns() + int(timeout * 1000000000)
+        prefix = b"+" + name + b":"
+        while True:
+            remaining = (deadline - time.monotonic_ns()) / 1000000000
+            if remaining <= 0:
+                return None
+            line = await self.readline(remaining)
+            if line is None:
+                return None
+            line = line.strip()
+            if line.startswith(prefix):
+                try:
+                    return int(line[len(prefix):])
+                except ValueError:
+                    return None
+            if line:
+                self.unsolicited.append(line)
+
+    async def command(self, command, timeout=None, retries=None):
+        '''
+        send an AT command and return its result code (0). retries with a doubling
+        backoff on no reply or a failure code, then raises SA868Error
+        '''
+        name = command[3:].split("=", 1)[0].encode()	# "AT+DMOSETGROUP=..." -> b"DMOSETGROUP"
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        code = None
+        for attempt in range(retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff * (1 << (attempt - 1)))
+            code = await self._exchange(command, name, timeout)
+            if code == 0:
+                return code
+        raise SA868Error(command, code)
+
+    def drain(self):
+        ''' unsolicited lines received so far, plus anything still waiting in the UART '''
+        pending = self.uart.in_waiting
+        if pending:
+            self._buffer.extend(self.uart.read(pending))
+        lines = self.unsolicited
+        self.unsolicited = []
+        if self._buffer:
+            lines.append(bytes(self._buffer))
+            self._buffer = bytearray()
+        return lines
+
+    async def connect(self, retries=None, timeout=None):
+        ''' AT+DMOCONNECT handshake '''
+        return await self.command("AT+DMOCONNECT", timeout, retries)
+
+    async def set_group(self, bandwidth, tx_frequency, rx_frequency, squelch, tx_ctcss="0000", rx_ctcss="0000",
+                        retries=None, timeout=None):
+        ''' AT+DMOSETGROUP: bandwidth 0=12.5k 1=25k, frequencies in MHz, squelch 0-8 '''
+        return await self.command(f"AT+DMOSETGROUP={bandwidth:d},{tx_frequency:.4f},{rx_frequency:.4f},"
+                                  f"{tx_ctcss},{squelch:d},{rx_ctcss}", timeout, retries)
+
+    async def set_volume(self, volume, retries=None, timeout=None):
+        ''' AT+DMOSETVOLUME, volume 1-8 '''
+        volume = 8 if volume > 8 else 1 if volume < 1 else volume
+        return await self.command(f"AT+DMOSETVOLUME={volume:d}", timeout, retries)
+
+    def power_down(self):
+        ''' PD low puts the module in its power down state, its group and volume settings are kept '''
+        self.pd.value = False
+
+    def power_up(self):
+        self.pd.value = True
+
+    @property
+    def powered(self):
+        return self.pd is None or self.pd.value
+
+    def set_high_power(self, high):
+        ''' H/L pin: high for the high power output, low for the low power one '''
+        self.power.value = bool(high)
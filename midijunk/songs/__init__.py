@@ -0,0 +1,2 @@
+# the fox.py song library, one module per song (name, melody, tempo), written by
+# rtttl.py --song-dir. fox.py imports a song only when its turn comes
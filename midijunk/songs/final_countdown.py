@@ -0,0 +1,8 @@
+# generated by rtttl.py, one song of the fox.py rotation
+name = 'final countdown'
+melody = (
+    b'\x00\x08\x00\x04S\x02Q\x02S\x08L\x08\x00\x08\x00\x04T\x02S\x02T\x04S\x04Q\x08\x00\x08\x00\x04T\x02'
+    b'S\x02T\x08L\x08\x00\x08\x00\x04Q\x02O\x02Q\x04O\x04N\x04Q\x04O\x0cN\x02O\x02Q\x0cO\x02'
+    b'Q\x02S\x04Q\x04O\x04N\x04L\x08T\x08S\x18S\x02T\x02S\x02Q\x02S '
+)
+tempo = 112
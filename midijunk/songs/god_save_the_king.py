@@ -0,0 +1,6 @@
+# generated by rtttl.py, one song of the fox.py rotation
+name = 'god save the king'
+melody = (
+    b'[\x08[\x08]\x08Z\x0c[\x04]\x08_\x08_\x08`\x08_\x0c]\x04[\x08]\x08[\x08Z\x08[\x08'
+)
+tempo = 112
@@ -0,0 +1,9 @@
+# generated by rtttl.py, one song of the fox.py rotation
+from songs.phrases import phrases
+name = 'midi music'
+melody = (
+    b'\x80\x01N\x06N\x06L\x0c\x80\x01L\x06L\x06J\x06I\x02G\x06\x80\x01J\x08L\x04I\x06G\x02E\x04'
+    b'E\x04E\x04L\x08J\x10\x80\x01N\x06N\x06L\x0c\x80\x01Q\x08I\x04J\x06I\x02G\x04\x80\x01J\x08'
+    b'L\x04I\x06G\x02E\x08E\x04L\x08J\x10\x00\x08'
+)
+tempo = 112
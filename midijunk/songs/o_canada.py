@@ -0,0 +1,11 @@
+# generated by rtttl.py, one song of the fox.py rotation
+from songs.phrases import phrases
+name = 'o canada'
+melody = (
+    b'O\x08R\x04\x00\x02R\x02K\x0cM\x04O\x04P\x04R\x04T\x04M\x0c\x00\x04O\x08Q\x04\x00\x02Q\x02'
+    b'R\x0cT\x04V\x04V\x04T\x04T\x04R\x0c\x80\x02P\x03R\x01T\x04R\x04P\x04O\x04M\x0c\x80\x02'
+    b'O\x04M\x04R\x04R\x02Q\x02O\x02Q\x02R\x08\x00\x08O\x08R\x06R\x02K\x08\x00\x08P\x08T\x04'
+    b'\x00\x02T\x02M\x08\x00\x08R\x08S\x04\x00\x02S\x02T\x04P\x04O\x04M\x04K\x08M\x08O\x08\x00\x08'
+    b'R\x08W\x04\x00\x02W\x02T\x04P\x04O\x04M\x04R\x08J\x08K\x10'
+)
+tempo = 112
@@ -0,0 +1,7 @@
+# generated by rtttl.py, the phrases shared by the songs
+phrases = (
+    b'=\x08D\x08D\x08B\x04A\x04B\x04A\x04?\x08?\x08=\x04?\x04A\x08?\x04A\x04B\x08A\x04',
+    b'E\x02G\x02J\x02G\x02',
+    b'M\x03O\x01P\x06O\x02M\x04O\x03P\x01R\x06P\x02O\x04',
+    b'O\x04Q\x04O\x04L\x04\x00\x04',
+)
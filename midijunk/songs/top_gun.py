@@ -0,0 +1,7 @@
+# generated by rtttl.py, one song of the fox.py rotation
+from songs.phrases import phrases
+name = 'top gun'
+melody = (
+    b'\x00\x04\x80\x00=\x04A\x08? \x80\x00=\x04D '
+)
+tempo = 112
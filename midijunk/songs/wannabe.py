@@ -0,0 +1,8 @@
+# generated by rtttl.py, one song of the fox.py rotation
+from songs.phrases import phrases
+name = 'wannabe'
+melody = (
+    b'O\x02O\x02O\x02O\x02\x80\x03H\x02J\x02H\x02J\x04J\x04H\x04L\x08\x00\x08O\x04O\x04\x80\x03'
+    b'T\x08T\x04S\x04O\x04Q\x04S\x02Q\x02O\x08'
+)
+tempo = 125
@@ -0,0 +1,123 @@
+# time slots for several foxes on one frequency, shared by fox.py on the badge and tdma_sim.py
+# copy this next to fox.py on the badge
+
+'''
+    Foxes that each run their own transmit / transmit_delay cycle on the
+    same frequency drift into each other, and while they are waiting the
+    channel is idle. In TDMA mode the foxes take turns instead: time since
+    a shared epoch is cut into frames, and every frame holds one slot per
+    fox, in fox index order, back to back.
+
+    A slot is exactly as long as its fox's transmission (PTT lead in, the
+    ID, the gap, the song) plus a guard time for the key down and for the
+    foxes' clocks not agreeing exactly. In frame n fox i plays song
+    (n + i) % len(songs) of the rotation, so every fox can work out every
+    other fox's slots from the same settings and nothing is sent between
+    them: all the foxes need the same callmessage list, song rotation,
+    timing settings and epoch, and clocks set to the same time.
+
+    The slot lengths only depend on the frame number through the song
+    rotation, so the frames repeat every len(songs) frames and finding the
+    slot for any time is a division and a short walk.
+'''
+
+import time
+
+
+class SlotPlan:
+    '''
+    the slots of every fox. id_ms holds each fox's ID airtime, song_ms each song of the rotation's
+    airtime, overhead_ms the rest of a transmission (PTT lead in and the ID to song gap); all in
+    milliseconds, as is epoch_ms, the wall clock time frame 0 starts
+    '''
+    def __init__(self, id_ms, song_ms, overhead_ms, guard_ms, epoch_ms=0):
+        if not id_ms or not song_ms:
+            raise ValueError("a slot plan needs at least one fox and one song")
+        self.id_ms = list(id_ms)
+        self.song_ms = list(song_ms)
+        self.overhead_ms = overhead_ms
+        self.guard_ms = guard_ms
+        self.epoch_ms = epoch_ms
+        # the start of every frame of one turn of the song rotation, and the length of the turn
+        self.frame_offsets = []
+        offset = 0
+        for frame in range(len(self.song_ms)):
+            self.frame_offsets.append(offset)
+            offset += self.frame_ms(frame)
+        self.cycle_ms = offset
+
+    def song(self, frame, fox):
+        ''' the index in the song rotation fox plays in frame '''
+        return (frame + fox) % len(self.song_ms)
+
+    def airtime_ms(self, frame, fox):
+        ''' how long fox transmits for in frame '''
+        return self.overhead_ms + self.id_ms[fox] + self.song_ms[self.song(frame, fox)]
+
+    def slot_ms(self, frame, fox):
+        return self.airtime_ms(frame, fox) + self.guard_ms
+
+    def frame_ms(self, frame):
+        total = 0
+        for fox in range(len(self.id_ms)):
+            total += self.slot_ms(frame, fox)
+        return total
+
+    def frame_start(self, frame):
+        ''' wall clock milliseconds frame starts at '''
+        turn, frame_in_turn = divmod(frame, len(self.song_ms))
+        return self.epoch_ms + turn * self.cycle_ms + self.frame_offsets[frame_in_turn]
+
+    def slot_start(self, frame, fox):
+        start = self.frame_start(frame)
+        for other in range(fox):
+            start += self.slot_ms(frame, other)
+        return start
+
+    def frame_at(self, wall_ms):
+        ''' the frame wall_ms falls in (negative before the epoch) '''
+        turn, into = divmod(wall_ms - self.epoch_ms, self.cycle_ms)
+        frame = turn * len(self.song_ms)
+        for offset in self.frame_offsets[1:]:
+            if into < offset:
+                break
+            frame += 1
+        return frame
+
+    def next_slot(self, fox, wall_ms):
+        ''' (frame, start) of fox's first slot starting at or after wall_ms '''
+        frame = self.frame_at(wall_ms)
+        start = self.slot_start(frame, fox)
+        if start < wall_ms:
+            frame += 1
+            start = self.slot_start(frame, fox)
+        return frame, start
+
+    def occupancy(self):
+        ''' the share of the time some fox is transmitting '''
+        keyed = 0
+        for frame in range(len(self.song_ms)):
+            for fox in range(len(self.id_ms)):
+                keyed += self.airtime_ms(frame, fox)
+        return keyed / self.cycle_ms
+
+
+class WallClock:
+    '''
+    time.time() in milliseconds, counted on time.monotonic_ns(). time.time() only has whole
+    seconds on CircuitPython, so this waits (up to a second) for it to tick over and counts
+    from that moment
+    '''
+    def __init__(self):
+        second = time.time()
+        while time.time() == second:
+            time.sleep(0.001)
+        self.origin_ns = time.monotonic_ns()
+        self.origin_ms = (second + 1) * 1000
+
+    def now_ms(self):
+        return self.origin_ms + (time.monotonic_ns() - self.origin_ns) // 1000000
+
+    def monotonic_ns(self, wall_ms):
+        ''' the time.monotonic_ns() value of a wall clock time in milliseconds '''
+        return self.origin_ns + (wall_ms - self.origin_ms) * 1000000
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Simulates several foxes sharing one frequency over a day and reports how
+much of the time the channel carries a fox and how many transmissions
+collide, for the free running transmit / transmit_delay cycle and for the
+TDMA slots of tdma.py.
+
+    python3 tdma_sim.py
+    python3 tdma_sim.py --foxes 2,4,8 --hours 6 --ppm 10 --skew-ms 300
+    python3 tdma_sim.py --foxes 4 --id afsk --guard 500
+
+Every transmission is as long as fox.py makes it: PTT lead in, the ID
+(morse.py or afsk.py), the ID to song gap and the song, from the songs
+package in the rotation order, timed the way fox.py times them.
+
+Free running foxes are switched on at random times within --boot-spread
+seconds and each runs its cycle on its own clock. TDMA foxes have their
+clocks set to within --skew-ms of each other. Either way every fox's clock
+runs up to --ppm fast or slow, so slots drift apart over the day unless the
+guard time covers it: two foxes drift up to 2 * ppm apart, 1.7 s a day at
+10 ppm, on top of the skew.
+"""
+import argparse
+import random
+
+from afsk import address_callsign, compile_afsk, schedule_us as afsk_schedule_us, ui_frame
+from morse import compile_morse, schedule_us
+from rtttl import iter_melody_paths, melody_ms, read_melody
+from tdma import SlotPlan
+
+CALLMESSAGE = "VE6MOG/W4 DECOY DECOY VE6MOG/W4"
+
+
+def song_airtimes(paths):
+    """ (name, milliseconds) of every song in the paths, each note cut to whole ms like fox.py's compile_melody """
+    songs = []
+    for path, phrases in iter_melody_paths(paths):
+        name, melody, tempo = read_melody(path, phrases)
+        songs.append((name, melody_ms(melody, tempo)))
+    return songs
+
+
+def id_airtime_ms(message, id_mode="morse", wpm=12, farnsworth_wpm=0, destination="ID"):
+    """ fox.py's id_airtime_ms """
+    if id_mode == "afsk":
+        return afsk_schedule_us(compile_afsk(ui_frame(address_callsign(message), message, destination))) // 1000
+    return schedule_us(compile_morse(message, wpm, farnsworth_wpm)) // 1000
+
+
+def free_running(id_ms, song_ms, overhead_ms, transmit_delay, seconds, boot_spread_s, ppm, rng):
+    """
+    (start, end, fox) in ms of every transmission of foxes running fox.py's own cycle: transmit,
+    then transmit_delay after the end of it, the song rotation starting over at every boot
+    """
+    transmissions = []
+    for fox, id_time in enumerate(id_ms):
+        boot = rng.uniform(0, boot_spread_s * 1000)
+        rate = 1 + rng.uniform(-ppm, ppm) / 1e6
+        local = 0.0
+        song = 0
+        while True:
+            start = boot + local / rate
+            if start >= seconds * 1000:
+                break
+            airtime = overhead_ms + id_time + song_ms[song]
+            transmissions.append((start, start + airtime / rate, fox))
+            local += airtime + transmit_delay
+            song = (song + 1) % len(song_ms)
+    return transmissions
+
+
+def tdma(plan, seconds, skew_ms, ppm, rng):
+    """ (start, end, fox) in ms of every transmission of foxes keying up at their slots on their own clocks """
+    transmissions = []
+    for fox in range(len(plan.id_ms)):
+        offset = rng.uniform(-skew_ms / 2, skew_ms / 2)
+        rate = 1 + rng.uniform(-ppm, ppm) / 1e6
+        # the fox's clock reads true time * rate + offset, with the simulation starting at the epoch
+        frame, slot = plan.next_slot(fox, plan.epoch_ms)
+        while True:
+            start = (slot - plan.epoch_ms - offset) / rate
+            if start >= seconds * 1000:
+                break
+            if start >= 0:
+                end = start + plan.airtime_ms(frame, fox) / rate
+                transmissions.append((start, end, fox))
+            frame += 1
+            slot = plan.slot_start(frame, fox)
+    return transmissions
+
+
+def channel_stats(transmissions, seconds):
+    """
+    (share of the time some fox is keyed, share of transmissions overlapping another,
+    seconds two or more are keyed, ms the first collision starts at or None)
+    """
+    spans = sorted((max(start, 0.0), min(end, seconds * 1000)) for start, end, fox in transmissions)
+    spans = [(start, end) for start, end in spans if end > start]
+    collided = set()
+    first = None
+    keyed = []			# (end, index) of the transmissions keyed at the current start
+    for i, (start, end) in enumerate(spans):
+        keyed = [(e, j) for e, j in keyed if e > start]
+        if keyed:
+            if first is None:
+                first = start
+            collided.add(i)
+            collided.update(j for e, j in keyed)
+        keyed.append((end, i))
+
+    edges = sorted([(start, 1) for start, end in spans] + [(end, -1) for start, end in spans])
+    busy = overlap = 0.0
+    count = 0
+    previous = 0.0
+    for t, step in edges:
+        if count >= 1:
+            busy += t - previous
+        if count >= 2:
+            overlap += t - previous
+        count += step
+        previous = t
+    return busy / (seconds * 1000), len(collided) / max(1, len(spans)), overlap / 1000, first
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--foxes", default="1,2,3,4,6,8", help="comma separated numbers of foxes to simulate")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--song-dir", default="songs", help="songs package for the rotation")
+    parser.add_argument("--callmessage", default=CALLMESSAGE, help="every fox's callmessage")
+    parser.add_argument("--id", choices=("morse", "afsk"), default="morse", help="fox.py id_mode")
+    parser.add_argument("--wpm", type=int, default=12, help="fox.py morse_wpm")
+    parser.add_argument("--transmit-delay", type=int, default=30000, help="fox.py transmit_delay, ms")
+    parser.add_argument("--lead-in", type=int, default=750, help="fox.py ptt_lead_in, ms")
+    parser.add_argument("--gap", type=int, default=750, help="fox.py id_song_gap, ms")
+    parser.add_argument("--guard", type=int, default=1000, help="fox.py tdma_guard, ms")
+    parser.add_argument("--boot-spread", type=float, default=60, help="free running foxes are switched on within this many s")
+    parser.add_argument("--skew-ms", type=float, default=200, help="spread of the TDMA foxes' clock settings, ms")
+    parser.add_argument("--ppm", type=float, default=10, help="clock rate error of every fox, up to +/- this")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    songs = song_airtimes([args.song_dir])
+    if not songs:
+        raise SystemExit(f"no songs in {args.song_dir}")
+    song_ms = [ms for name, ms in songs]
+    seconds = args.hours * 3600
+    overhead_ms = args.lead_in + args.gap
+    id_time = id_airtime_ms(args.callmessage, args.id, args.wpm)
+    print(f"{len(songs)} songs of {min(song_ms) / 1000:.1f} to {max(song_ms) / 1000:.1f} s, "
+          f"{args.id} ID {id_time / 1000:.1f} s, {args.hours:g} hours, clocks +/-{args.ppm:g} ppm")
+    print(f"{'foxes':>5}  {'mode':<12} {'tx/hour':>8} {'occupancy':>10} {'collided':>9} {'overlap s':>10} "
+          f"{'first collision':>16}")
+    for count in (int(n) for n in args.foxes.split(",")):
+        id_ms = [id_time] * count
+        plan = SlotPlan(id_ms, song_ms, overhead_ms, args.guard)
+        rng = random.Random(args.seed)
+        runs = [
+            ("free running", free_running(id_ms, song_ms, overhead_ms, args.transmit_delay, seconds,
+                                          args.boot_spread, args.ppm, rng)),
+            ("tdma", tdma(plan, seconds, args.skew_ms, args.ppm, rng)),
+        ]
+        for mode, transmissions in runs:
+            occupancy, collided, overlap, first = channel_stats(transmissions, seconds)
+            first = "none" if first is None else f"{first / 3600000:.2f} h"
+            print(f"{count:>5}  {mode:<12} {len(transmissions) / args.hours:>8.1f} {occupancy * 100:>9.1f}% "
+                  f"{collided * 100:>8.1f}% {overlap:>10.1f} {first:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Transcribes a recording of a monophonic tune (a WAV file, the badge through
+a receiver, a buzzer, a whistle) into the fox melody format: the same
+(midi_note, duration_in_32nds) pairs rttl_to_midi_tuples gives.
+
+    python3 transcribe.py recording.wav --tempo 112
+    python3 transcribe.py recording.wav --rtttl --name "Fox Tune"
+    python3 transcribe.py --selftest
+
+Pitch: the recording is cut into 40 ms frames every 5 ms and the
+autocorrelation of every frame comes from one batch of FFTs (in blocks, so
+memory stays bounded on long recordings). The first autocorrelation peak,
+after the zero lag lobe, within 70% of the highest is the period, and
+frequency_to_midi (fox.py's) gives the note. A second pass with 10 ms
+frames places the edges of notes from 220 Hz up, which 40 ms frames blur.
+Notes from 60 Hz up to about a sixth of the sample rate are found; notes
+under 220 Hz shorter than a frame, between two other notes without a gap,
+can be lost.
+
+Onsets: a note starts where the pitch changes, where sound starts after
+silence, and where the level dips between two notes of the same pitch.
+Sound and silence come from a 2 ms level, not the frames.
+
+Quantizing: each note's length is rounded to 32nds in turn, carrying what
+the notes before it gained or lost, against fox.py's timing (every note cut
+to whole milliseconds) rather than an exact grid. Without --tempo every b=
+is tried and the slowest one whose note starts stay as close to the
+recording as the best one's sets the grid. Any multiple of it plays the
+same with proportionally more 32nds, and of those the one nearest 120 is
+taken, the tempo a tune is most likely written at.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from rtttl import format_melody_list, format_packed_melody, midi_tuples_to_rttl, pack_melody, read_melody
+from render import read_wav, render_melody
+
+FRAME_S = 0.040
+SHORT_FRAME_S = 0.010	# for notes from SHORT_FREQUENCY up, whose edges a 40 ms frame blurs
+SHORT_FREQUENCY = 220.0
+HOP_S = 0.005
+MIN_FREQUENCY = 60.0
+PEAK_RATIO = 0.7		# the first autocorrelation peak this close to the highest is the period
+VOICED = 0.5			# normalized autocorrelation a pitched frame reaches
+SILENCE = 0.25			# short time level, against the loudest, below which a hop is a rest
+DIP = 0.5				# level, against the note around it, that splits a note in two
+CONVENTIONAL_TEMPO = 120	# b= picked nearest to among tempos that play a recording the same
+
+
+def frequency_to_midi(frequency):
+    """ fox.py's frequency_to_midi, for arrays """
+    return 69 + 12 * np.log2(np.asarray(frequency, dtype=np.float64) / 440.0)
+
+
+def pitch_track(samples, rate, frame_s=FRAME_S, hop_s=HOP_S, block=512):
+    """
+    (frequency, level) of every frame, frame k centred on sample k * hop + frame / 2.
+    frequency is 0 where the frame has no clear pitch, level is its RMS
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    frame = int(frame_s * rate)
+    hop = max(1, int(hop_s * rate))
+    if len(samples) < frame:
+        samples = np.concatenate((samples, np.zeros(frame - len(samples))))
+    frames = sliding_window_view(samples, frame)[::hop]
+    nfft = 1 << (2 * frame - 1).bit_length()		# no wrap around in the autocorrelation
+    max_lag = min(frame // 2, int(np.ceil(rate / MIN_FREQUENCY))) + 2
+
+    frequency = np.zeros(len(frames))
+    level = np.zeros(len(frames))
+    for start in range(0, len(frames), block):
+        x = frames[start:start + block]
+        x = x - x.mean(axis=1, keepdims=True)
+        spectrum = np.fft.rfft(x, nfft)
+        acf = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, nfft)[:, :max_lag]
+        energy = acf[:, 0]
+        rows = np.arange(len(x))
+        level[start:start + len(x)] = np.sqrt(energy / frame)
+        acf = acf / np.where(energy > 0, energy, 1.0)[:, None]
+
+        # only lags after the autocorrelation first falls off from lag 0 count
+        past_lobe = np.cumsum(acf < 0.3, axis=1) > 0
+        inner = acf[:, 1:-1]
+        peaks = (inner > acf[:, :-2]) & (inner >= acf[:, 2:]) & past_lobe[:, 1:-1]
+        highest = np.where(peaks, inner, -1.0).max(axis=1)
+        peaks &= inner >= PEAK_RATIO * highest[:, None]
+        first = np.argmax(peaks, axis=1) + 1
+        voiced = peaks.any(axis=1) & (highest >= VOICED)
+
+        # parabolic interpolation around the peak
+        a, b, c = acf[rows, first - 1], acf[rows, first], acf[rows, first + 1]
+        denominator = a - 2 * b + c
+        offset = np.where(denominator < 0, 0.5 * (a - c) / np.where(denominator < 0, denominator, -1.0), 0.0)
+        frequency[start:start + len(x)] = np.where(voiced, rate / (first + offset), 0.0)
+    return frequency, level
+
+
+def level_dips(samples, rate, count, frame_s=FRAME_S, hop_s=HOP_S, window_s=0.002):
+    """
+    the quietest and loudest short time level (window_s RMS) within each of the count
+    hops, centred like pitch_track's frames, to find the gaps between repeated notes
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    frame = int(frame_s * rate)
+    hop = max(1, int(hop_s * rate))
+    window = max(1, int(window_s * rate))
+    power = np.concatenate(([0.0], np.cumsum(samples * samples)))
+    envelope = np.sqrt(np.maximum(power[window:] - power[:-window], 0.0) / window)
+    # envelope[i] is centred on sample i + window / 2, hop k on frame k's centre
+    envelope = envelope[max(0, frame // 2 - hop // 2 - window // 2):]
+    padded = np.zeros(count * hop)
+    length = min(len(envelope), len(padded))
+    padded[:length] = envelope[:length]
+    hops = padded.reshape(count, hop)
+    return hops.min(axis=1), hops.max(axis=1)
+
+
+def note_segments(samples, rate, frame_s=FRAME_S, hop_s=HOP_S, shortest_s=0.02, short_frame_s=SHORT_FRAME_S):
+    """
+    (start seconds, midi note or 0) of every note and rest, ending with an (end seconds, None)
+    marker. anything shorter than shortest_s is the edge of a note (frames that hear two notes
+    at once, a gap between repeated notes) and goes to the note after it
+    """
+    frequency, _ = pitch_track(samples, rate, frame_s, hop_s)
+    if not len(frequency):
+        return [(0.0, None)]
+    if short_frame_s:
+        # the same hops, centred the same. the short frames hear every note from SHORT_FREQUENCY
+        # up, so a high note they don't hear is one the long frame still hears after it ended
+        skip = int(frame_s * rate) // 2 - int(short_frame_s * rate) // 2
+        short = pitch_track(samples[skip:], rate, short_frame_s, hop_s)[0][:len(frequency)]
+        long = frequency[:len(short)]
+        long[:] = np.where(short >= SHORT_FREQUENCY, short, np.where(long >= SHORT_FREQUENCY, 0.0, long))
+
+    # sound and silence from the short time level: a 40 ms frame hears a note 20 ms either side of it
+    quietest, loudest = level_dips(samples, rate, len(frequency), frame_s, hop_s)
+    loud = loudest >= SILENCE * loudest.max() if loudest.max() > 0 else np.zeros(len(loudest), dtype=bool)
+    pitched = np.flatnonzero(frequency > 0)
+    if not len(pitched):
+        return [(0.0, 0), (len(samples) / rate, None)]
+    # a sounding frame without a clear pitch hears two notes at once: it takes the nearest pitched frame's note
+    frames = np.arange(len(frequency))
+    after = np.clip(np.searchsorted(pitched, frames), 0, len(pitched) - 1)
+    before = np.clip(after - 1, 0, None)
+    nearest = np.where(np.abs(frames - pitched[before]) <= np.abs(pitched[after] - frames), before, after)
+    notes = np.clip(np.rint(frequency_to_midi(frequency[pitched])), 1, 127).astype(np.int64)
+    notes = np.where(loud, notes[nearest], 0)
+    # frames straddling two notes can come out as a third, a 3 frame median irons them out
+    if len(notes) >= 3:
+        notes[1:-1] = np.median(np.stack((notes[:-2], notes[1:-1], notes[2:])), axis=0).astype(np.int64)
+
+    around = np.maximum(np.concatenate(([0.0] * 3, loudest[:-3])), np.concatenate((loudest[3:], [0.0] * 3)))
+    dip = (quietest < DIP * around) & (notes > 0)
+    # one onset per dip: where it is deepest
+    dip &= np.concatenate(([True], quietest[1:] <= quietest[:-1])) & np.concatenate((quietest[:-1] < quietest[1:], [True]))
+
+    hop = max(1, int(hop_s * rate))
+    centre = int(frame_s * rate) / 2
+    starts = np.flatnonzero(np.concatenate(([True], notes[1:] != notes[:-1])) | dip)
+    segments = []
+    for k in starts:
+        start = (k * hop + centre) / rate if segments else 0.0
+        if segments and start - segments[-1][0] < shortest_s:
+            segments[-1] = (segments[-1][0], int(notes[k]))
+        else:
+            segments.append((start, int(notes[k])))
+    segments.append((len(samples) / rate, None))
+    return segments
+
+
+def segment_lengths(segments):
+    """ (midi note, seconds) of every segment, leading and trailing rests dropped """
+    lengths = [(key, end - start) for (start, key), (end, _) in zip(segments, segments[1:])]
+    while lengths and not lengths[0][0]:
+        lengths.pop(0)
+    while lengths and not lengths[-1][0]:
+        lengths.pop()
+    return lengths
+
+
+def estimate_tempo(lengths, low=25, high=600, outliers=0.05):
+    """
+    the b= the lengths were played at. every b= quantizes the lengths the way quantize_lengths
+    does and the one whose note starts stay closest to the recording's wins; a b= that is off
+    drifts against the recording note by note. of b= that fit about as well the slowest sets
+    the grid; every multiple of it plays the same with more 32nds, and the one nearest
+    CONVENTIONAL_TEMPO is taken, so a tune played at b=112 doesn't come back as b=28 in whole notes
+    """
+    seconds = np.array([length for key, length in lengths])
+    if not len(seconds):
+        return 120
+    tempos = np.arange(low, high + 1)
+    thirtysecond = 7.5 / tempos
+    carry = np.zeros(len(tempos))
+    drift = np.zeros(len(tempos))
+    misfits = np.zeros(len(tempos))
+    for length in seconds:
+        ticks = np.rint((length + carry) / thirtysecond)
+        misfits += ticks < 1
+        carry += length - (ticks * 7500 // tempos) / 1000
+        drift += np.abs(carry)
+    fitting = np.flatnonzero(misfits <= outliers * len(seconds))
+    if not len(fitting):
+        fitting = np.arange(len(tempos))
+    drift = drift[fitting]
+    slowest = int(tempos[fitting[np.argmax(drift <= drift.min() * 1.25)]])
+    return min(range(slowest, high + 1, slowest), key=lambda b: abs(np.log(b / CONVENTIONAL_TEMPO)))
+
+
+def quantize_lengths(lengths, tempo):
+    """
+    (midi note, seconds) to (midi_note, duration_in_32nds) at tempo. each length is rounded with
+    what the notes before it gained or lost against the badge's timing, so one late boundary
+    can't cost two notes a 32nd each. a length that rounds to nothing goes to the next note, over 255 is split for the
+    packed format
+    """
+    thirtysecond = 7.5 / tempo
+    melody = []
+    carry = 0.0
+    for key, length in lengths:
+        ticks = int(round((length + carry) / thirtysecond))
+        carry += length - (ticks * 7500 // tempo) / 1000		# fox.py's whole milliseconds
+        if not ticks:
+            continue
+        if melody and not key and not melody[-1][0]:
+            ticks += melody.pop()[1]
+        while ticks > 0:
+            piece = min(ticks, 255)
+            melody.append((key, piece))
+            ticks -= piece
+    return melody
+
+
+def transcribe(samples, rate, tempo=None):
+    """ a recording as (melody, tempo) """
+    lengths = segment_lengths(note_segments(samples, rate))
+    if tempo is None:
+        tempo = estimate_tempo(lengths)
+    return quantize_lengths(lengths, tempo), tempo
+
+
+def same_timing(melody, tempo, other, other_tempo):
+    """ whether two melodies play the same notes for the same milliseconds on the badge (rests merged) """
+    def timeline(events, b):
+        merged = []
+        for note, duration in events:
+            ms = duration * 7500 // b
+            if merged and not note and not merged[-1][0]:
+                merged[-1][1] += ms
+            else:
+                merged.append([note, ms])
+        return merged
+    ours, theirs = timeline(melody, tempo), timeline(other, other_tempo)
+    return len(ours) == len(theirs) and all(a[0] == b[0] and abs(a[1] - b[1]) <= 2 for a, b in zip(ours, theirs))
+
+
+def audible(melody):
+    """ a melody as a recording can tell it: back to back rests as one, no leading or trailing rests """
+    merged = []
+    for note, duration in melody:
+        if merged and not note and not merged[-1][0]:
+            merged[-1] = (0, merged[-1][1] + duration)
+        else:
+            merged.append((note, duration))
+    while merged and not merged[0][0]:
+        merged.pop(0)
+    while merged and not merged[-1][0]:
+        merged.pop()
+    return merged
+
+
+def merge_repeats(melody):
+    """ a melody as it sounds without gaps between notes: repeated notes run together """
+    merged = []
+    for note, duration in melody:
+        if merged and merged[-1][0] == note:
+            merged[-1] = (note, merged[-1][1] + duration)
+        else:
+            merged.append((note, duration))
+    return merged
+
+
+def random_melodies(count, seed=1234):
+    rng = np.random.default_rng(seed)
+    melodies = []
+    for _ in range(count):
+        tempo = int(rng.choice((63, 90, 112, 125, 160, 200)))
+        melody = []
+        for _ in range(int(rng.integers(20, 80))):
+            # back to back rests sound like one
+            rest = rng.random() < 0.1 and not (melody and not melody[-1][0])
+            note = 0 if rest else int(rng.integers(45, 100))
+            melody.append((note, int(rng.choice((1, 2, 3, 4, 6, 8, 12, 16)))))
+        while melody[0][0] == 0 or melody[-1][0] == 0:
+            melody = [event for event in melody if event[0]] or [(69, 4)]
+        melodies.append((f"random {len(melodies)}", melody, tempo))
+    return melodies
+
+
+def selftest(song_dir, rate):
+    """ transcribes melodies rendered by render.py and compares them with the originals; returns the failures """
+    import os
+    cases = []
+    phrases = None
+    phrase_path = os.path.join(song_dir, "phrases.py")
+    if os.path.exists(phrase_path):
+        import ast
+        with open(phrase_path, encoding="utf-8") as f:
+            phrases = ast.literal_eval(f.read().split("=", 1)[1].strip())
+    for name in sorted(os.listdir(song_dir)):
+        if name.endswith(".py") and name not in ("__init__.py", "phrases.py"):
+            cases.append(read_melody(os.path.join(song_dir, name), phrases))
+    cases += random_melodies(10)
+
+    failed = 0
+    audio_s = 0.0
+    spent = 0.0
+    noise = np.random.default_rng(1)
+    for name, original, tempo in cases:
+        melody = audible(original)
+        # the way a badge sounds through a receiver: short gaps between notes, some hiss
+        shaped = render_melody(melody, tempo, rate=rate, attack=0.002, release=0.004)
+        noisy = shaped + noise.normal(0, 0.05, len(shaped)).astype(np.float32)
+        plain = render_melody(melody, tempo, rate=rate)
+        checks = [
+            ("tempo given", lambda: transcribe(shaped, rate, tempo), lambda got, b: got == melody),
+            ("tempo estimated", lambda: transcribe(shaped, rate),
+             lambda got, b: b == tempo and same_timing(got, b, melody, tempo)),
+            ("noise at -20 dB", lambda: transcribe(noisy, rate, tempo), lambda got, b: got == melody),
+            ("no gaps", lambda: transcribe(plain, rate, tempo),
+             lambda got, b: got == merge_repeats(melody)),
+        ]
+        results = []
+        for label, run, check in checks:
+            started = time.perf_counter()
+            got, b = run()
+            spent += time.perf_counter() - started
+            audio_s += len(shaped) / rate
+            ok = check(got, b)
+            failed += not ok
+            results.append(f"{label} {'ok' if ok else 'FAIL'}" + ("" if label != "tempo estimated" else f" (b={b})"))
+        print(f"{name}: {len(melody)} notes at b={tempo}: " + ", ".join(results))
+    print(f"transcribed {audio_s:.0f} s of audio in {spent:.2f} s, {audio_s / spent:.0f}x real time")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("wav", nargs="?", help="a 16 bit WAV recording of a monophonic tune")
+    parser.add_argument("--tempo", type=int, help="the b= to quantize at, estimated when left out")
+    parser.add_argument("--name", default="transcribed", help="tune name for the output")
+    parser.add_argument("--packed", action="store_true", help="emit packed bytes instead of tuple lists")
+    parser.add_argument("--rtttl", action="store_true", help="emit the shortest RTTTL string instead")
+    parser.add_argument("--selftest", action="store_true",
+                        help="transcribe rendered songs and random melodies, exit 1 on a mismatch")
+    parser.add_argument("--song-dir", default="songs", help="songs package for --selftest")
+    parser.add_argument("--rate", type=int, default=22050, help="sample rate for --selftest")
+    args = parser.parse_args()
+
+    if args.selftest:
+        failed = selftest(args.song_dir, args.rate)
+        print("all melodies transcribed" if not failed else f"{failed} FAILED")
+        sys.exit(1 if failed else 0)
+    if not args.wav:
+        parser.print_usage()
+        sys.exit(1)
+
+    samples, rate = read_wav(args.wav)
+    started = time.perf_counter()
+    melody, tempo = transcribe(samples, rate, args.tempo)
+    elapsed = time.perf_counter() - started
+    print(f"{args.wav}: {len(melody)} notes at b={tempo}, {len(samples) / rate:.1f} s of audio "
+          f"in {elapsed:.2f} s", file=sys.stderr)
+    if not melody:
+        sys.exit(1)
+    if args.rtttl:
+        print(midi_tuples_to_rttl(melody, args.name, tempo))
+        return
+    var_name = "".join(c if c.isalnum() else "_" for c in args.name.lower())
+    value = format_packed_melody(pack_melody(melody)) if args.packed else format_melody_list(melody)
+    print(f"{var_name}_melody = {value}\n{var_name}_tempo = {tempo}")
+
+
+if __name__ == "__main__":
+    main()